@@ -0,0 +1,264 @@
+import pandas as pd
+import random
+import os
+import sys
+# recorded statsapi responses for the benchmarks. Fixtures are kept in a FeedCache
+# directory (gzip JSON keyed by API path), either recorded from the live API with
+# record_fixtures or built offline from the repo's CSVs with build_fixtures, and
+# are replayed by stub_server.StubServer
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+final_data_dir = os.path.join(root, "final_project", "data")
+midterm_data_dir = os.path.join(root, "midterm_project", "data")
+sys.path.insert(0, os.path.join(root, "final_project"))
+from game.cache import FeedCache
+from game.fetch import configure
+from game.game import game_link, season_game_ids
+from game.schedule import schedule_link
+
+skater_stats = ["assists", "goals", "shots", "hits", "powerPlayGoals", "powerPlayAssists", "penaltyMinutes",
+                "faceOffWins", "faceoffTaken", "takeaways", "giveaways", "shortHandedGoals",
+                "shortHandedAssists", "blocked", "plusMinus"]
+# (eventTypeId, share of the play-by-play) for the synthetic plays. Goals are added
+# separately so they match the final score
+play_types = [("FACEOFF", 0.2), ("SHOT", 0.2), ("MISSED_SHOT", 0.1), ("BLOCKED_SHOT", 0.12), ("HIT", 0.2),
+              ("GIVEAWAY", 0.06), ("TAKEAWAY", 0.05), ("PENALTY", 0.03), ("STOP", 0.04)]
+plays_per_game = 320
+stat_types = "statsSingleSeason,goalsByGameSituation"
+
+
+def _clock(seconds):
+    return("%d:%02d" % (seconds // 60, seconds % 60))
+
+
+def _skaters(team_id, team_name, goals, rng):
+    # 18 dressed skaters per team with stats that add up to the team's goals
+    players = {}
+    scorers = [rng.randrange(18) for _ in range(int(goals))]
+    for i in range(18):
+        player_id = 8400000 + int(team_id) * 100 + i
+        toi = rng.randint(600, 1500)
+        stats = {stat: rng.randint(0, 3) for stat in skater_stats}
+        stats.update(goals=scorers.count(i), plusMinus=rng.randint(-2, 2), faceOffPct=None if i > 3 else 50.0,
+                     timeOnIce=_clock(toi), evenTimeOnIce=_clock(toi - 120), powerPlayTimeOnIce=_clock(90),
+                     shortHandedTimeOnIce=_clock(30))
+        position = "D" if i >= 12 else ["C", "L", "R"][i % 3]
+        players["ID%d" % player_id] = {
+            "person": {"id": player_id, "fullName": "Skater %d %s" % (i, team_name),
+                       "link": "/api/v1/people/%d" % player_id},
+            "jerseyNumber": str(i + 2),
+            "position": {"code": position, "name": position, "type": "Defenseman" if position == "D" else "Forward"},
+            "stats": {"skaterStats": stats}}
+    return(players)
+
+
+def _plays(game_id, teams, goals, players, rng):
+    # synthetic play-by-play shaped like liveData.plays.allPlays
+    events = []
+    for side in ["home", "away"]:
+        events += [("GOAL", side)] * int(goals[side])
+    types, weights = zip(*play_types)
+    events += [(event, rng.choice(["home", "away"])) for event in rng.choices(types, weights, k=plays_per_game)]
+    rng.shuffle(events)
+    plays = []
+    for i, (event, side) in enumerate(events):
+        period, seconds = divmod(i * 3600 // len(events), 1200)
+        shooter, goalie = rng.choice(players[side]), rng.choice(players["home" if side == "away" else "away"])
+        plays.append({
+            "result": {"event": event.replace("_", " ").title(), "eventCode": "%s%d" % (game_id[-4:], i),
+                       "eventTypeId": event, "description": "%s by %s" % (event.lower(), shooter["person"]["fullName"])},
+            "about": {"eventIdx": i, "eventId": i + 1, "period": period + 1, "periodType": "REGULAR",
+                      "periodTime": _clock(seconds), "periodTimeRemaining": _clock(1200 - seconds),
+                      "dateTime": "", "goals": {"away": 0, "home": 0}},
+            "coordinates": {"x": rng.randint(-99, 99), "y": rng.randint(-42, 42)},
+            "players": [{"player": shooter["person"], "playerType": "Shooter"},
+                        {"player": goalie["person"], "playerType": "Goalie"}],
+            "team": teams[side]})
+    return(plays)
+
+
+def game_feed(result, team_rows, goalie_rows, officials):
+    """
+    Arguments:
+        result - game_results row. Dictionary.
+        team_rows - The game's two game_team_stats rows. Dictionaries.
+        goalie_rows - The game's game_goalie_stats rows. Dictionaries.
+        officials - The game's game_officials rows. Dictionaries.
+    Returns:
+        Synthetic /feed/live JSON that extracts back to the same rows, with
+        generated skaters and play-by-play so, like a real feed, it's about ten
+        times the size of the game's /boxscore
+    """
+    game_id = str(result["gameID"])
+    rng = random.Random(int(game_id))
+    teams = {side: {"id": int(result[side + "TeamID"]), "name": result[side + "TeamName"],
+                    "link": "/api/v1/teams/%s" % result[side + "TeamID"]} for side in ["home", "away"]}
+    goals = {side: int(result[side + "Goals"]) for side in ["home", "away"]}
+    boxscore_teams, players = {}, {}
+    for row in team_rows:
+        side = row["homeAway"]
+        team_players = _skaters(row["teamID"], row["teamName"], row["goals"], rng)
+        for goalie in goalie_rows:
+            if goalie["homeAway"] == side:
+                team_players["ID%s" % goalie["playerID"]] = {
+                    "person": {"id": int(goalie["playerID"]), "fullName": goalie["fullName"],
+                               "link": "/api/v1/people/%s" % goalie["playerID"]},
+                    "position": {"code": "G", "name": "Goalie", "type": "Goalie"},
+                    "stats": {"goalieStats": {key: (None if pd.isna(value) else value)
+                                              for key, value in list(goalie.items())[7:]}}}
+        players[side] = list(team_players.values())
+        boxscore_teams[side] = {
+            "team": teams[side],
+            "coaches": [{"person": {"fullName": row["headCoach"]}, "position": {"code": "HC"}}],
+            "teamStats": {"teamSkaterStats": {key: row[key] for key in list(row)[7:]}},
+            "players": team_players}
+    periods = int(team_rows[0]["periodsPlayed"])
+    linescore = {
+        "currentPeriod": periods, "currentPeriodOrdinal": "3rd" if periods == 3 else "OT",
+        "currentPeriodTimeRemaining": "Final",
+        "periods": [{"num": i + 1, "home": {"goals": 0}, "away": {"goals": 0}} for i in range(periods)],
+        "teams": {side: {"team": teams[side], "goals": goals[side],
+                         "shotsOnGoal": boxscore_teams[side]["teamStats"]["teamSkaterStats"]["shots"]}
+                  for side in ["home", "away"]}}
+    return({
+        "gamePk": int(game_id),
+        "link": game_link(game_id),
+        "gameData": {
+            "game": {"pk": int(game_id), "season": str(result["season"]), "type": result["gameType"]},
+            "datetime": {"dateTime": result["dateTime"]},
+            "status": {"abstractGameState": "Final", "detailedState": "Final", "statusCode": "7"},
+            "teams": teams,
+            "players": {"ID%s" % player["person"]["id"]: player["person"]
+                        for side in players for player in players[side]},
+            "venue": {"name": result["venue"]}},
+        "liveData": {
+            "plays": {"allPlays": _plays(game_id, teams, goals, players, rng)},
+            "linescore": linescore,
+            "boxscore": {"teams": boxscore_teams,
+                         "officials": [{"official": {"fullName": official["officialName"]},
+                                        "officialType": official["officialType"]} for official in officials]}}})
+
+
+def build_game_fixtures(cache, season, n_games=None):
+    """
+    Arguments:
+        cache - FeedCache to write the fixtures into
+        season - Start of the season, e.g. "2019". Must be in the repo CSVs.
+        n_games - Optional number of games to keep, the first ones of the season
+    Returns:
+        List of the game IDs written. Each game gets its /feed/live, /boxscore
+        and /linescore responses and the season gets its schedule.
+    """
+    results = pd.read_csv(os.path.join(final_data_dir, "game_results_full.csv"))
+    results = results[results.gameID // 1000000 == int(season)].sort_values("gameID")
+    if n_games is not None:
+        results = results.head(n_games)
+    game_ids = set(results.gameID)
+    grouped = {}
+    for name in ["game_team_stats", "game_goalie_stats", "game_officials"]:
+        table = pd.read_csv(os.path.join(final_data_dir, name + "_full.csv"))
+        grouped[name] = {game_id: rows.to_dict("records")
+                         for game_id, rows in table[table.gameID.isin(game_ids)].groupby("gameID")}
+    dates = {}
+    for result in results.to_dict("records"):
+        game_id = result["gameID"]
+        feed = game_feed(result, grouped["game_team_stats"].get(game_id, []),
+                         grouped["game_goalie_stats"].get(game_id, []), grouped["game_officials"].get(game_id, []))
+        cache.put(game_link(game_id), feed)
+        cache.put("/api/v1/game/%s/boxscore" % game_id, dict(feed["liveData"]["boxscore"], copyright="fixture"))
+        cache.put("/api/v1/game/%s/linescore" % game_id, dict(feed["liveData"]["linescore"], copyright="fixture"))
+        dates.setdefault(result["dateTime"][0:10], []).append({
+            "gamePk": int(game_id), "link": game_link(game_id), "gameType": result["gameType"],
+            "season": str(result["season"]), "gameDate": result["dateTime"],
+            "status": {"abstractGameState": "Final"},
+            "teams": {side: {"team": feed["gameData"]["teams"][side]} for side in ["home", "away"]},
+            "venue": {"name": result["venue"]}})
+    cache.put(schedule_link(season), {"dates": [{"date": date, "games": games} for date, games in sorted(dates.items())]})
+    return([str(game_id) for game_id in results.gameID])
+
+
+def build_player_fixtures(cache, season):
+    """
+    Arguments:
+        cache - FeedCache to write the fixtures into
+        season - Season in the player_season.csv format, e.g. "20192020"
+    Returns:
+        Number of players written. Writes the team list, every team's roster and
+        each player's bio + stats responses used by player.get_players_seasons.
+    """
+    players = pd.read_csv(os.path.join(midterm_data_dir, "player_season.csv"))
+    players = players[players.season.astype(str) == str(season)]
+    bio_columns = list(players.columns[2:players.columns.get_loc("season_type")])
+    stat_columns = list(players.columns[players.columns.get_loc("season") + 1:players.columns.get_loc("goalsInFirstPeriod")])
+    goal_columns = [column for column in players.columns if column.startswith("goals") and column != "goals"]
+    teams = [{"id": i + 1, "name": name, "link": "/api/v1/teams/%d" % (i + 1)}
+             for i, name in enumerate(sorted(players.team.unique()))]
+    cache.put("/api/v1/teams", {"teams": teams})
+    for team in teams:
+        roster = players[players.team == team["name"]].drop_duplicates("id")
+        cache.put(team["link"] + "/roster?expand=team.roster&season=%s" % season, {"roster": [
+            {"person": {"id": int(player.id), "fullName": player.fullName, "link": player.link},
+             "position": {"code": player.position}} for player in roster.itertuples()]})
+    for player in players.drop_duplicates("id").to_dict("records"):
+        stats = [{"type": {"displayName": "statsSingleSeason", "gameType": {"id": player["season_type"]}},
+                  "splits": [{"season": str(player["season"]),
+                              "stat": {key: player[key] for key in stat_columns if not pd.isna(player[key])}}]},
+                 {"type": {"displayName": "goalsByGameSituation", "gameType": {"id": player["season_type"]}},
+                  "splits": [{"season": str(player["season"]),
+                              "stat": {key: player[key] for key in goal_columns if not pd.isna(player[key])}}]}]
+        # the two keys get_players drops from the end of the bio
+        bio = dict({key: player[key] for key in bio_columns if not pd.isna(player[key])},
+                   currentTeam={}, primaryPosition={"code": player["position"]})
+        link = player["link"]
+        cache.put(link + "?expand=person.stats&stats=%s&season=%s" % (stat_types, season),
+                  {"people": [dict(bio, stats=stats)]})
+        cache.put(link + "/stats?stats=%s&season=%s" % (stat_types, season), {"stats": stats})
+    return(players.id.nunique())
+
+
+def build_fixtures(directory, season="2019", n_games=None):
+    """
+    Arguments:
+        directory - Fixture directory. Character.
+        season - Start of the season to build, e.g. "2019"
+        n_games - Optional number of games, the first ones of the season
+    Returns:
+        The FeedCache holding the game and player fixtures
+    """
+    cache = FeedCache(directory, ttl=None)
+    build_game_fixtures(cache, season, n_games)
+    build_player_fixtures(cache, str(season) + str(int(season) + 1))
+    return(cache)
+
+
+def record_fixtures(directory, season="2019", n_games=None, base_api="https://statsapi.web.nhl.com"):
+    """
+    Arguments:
+        directory - Fixture directory. Character.
+        season - Start of the season to record, e.g. "2019"
+        n_games - Optional number of games, the first ones of the season
+    Returns:
+        Number of responses recorded. Downloads the schedule and each game's
+        /feed/live, /boxscore and /linescore from the live API into directory.
+    """
+    # the shared fetcher so the schedule season_game_ids downloads is recorded too
+    fetcher = configure(base_api=base_api, max_workers=8, requests_per_second=10, cache=FeedCache(directory, ttl=None))
+    game_ids = season_game_ids(season)[:n_games]
+    links = [link % game_id for game_id in game_ids
+             for link in ["/api/v1/game/%s/feed/live/", "/api/v1/game/%s/boxscore", "/api/v1/game/%s/linescore"]]
+    recorded = sum(error is None for link, data, error in fetcher.get_many(links))
+    fetcher.close()
+    return(recorded + 1)
+
+
+if __name__ == "__main__":
+    # usage: python fixtures.py <fixtures_dir> [season] [n_games] [record]
+    # builds the fixtures from the repo CSVs, or records them from the live API with "record"
+    directory = sys.argv[1]
+    season = sys.argv[2] if len(sys.argv) > 2 else "2019"
+    n_games = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    if len(sys.argv) > 4 and sys.argv[4] == "record":
+        print(record_fixtures(directory, season, n_games), "responses recorded in", directory)
+    else:
+        build_fixtures(directory, season, n_games)
+        print("Fixtures for the", season, "season built in", directory)
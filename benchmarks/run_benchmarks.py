@@ -0,0 +1,265 @@
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import pandas as pd
+from fixtures import root, final_data_dir, build_fixtures, FeedCache
+from stub_server import StubServer
+sys.path.insert(0, os.path.join(root, "midterm_project", "nhl"))
+from game import game, schedule, storage, events
+from game.features import build_prediction_df
+from game.model_building import fit_optimize_season_model
+import player
+
+# repeatable benchmarks of the scraping, extraction, loading, feature and model
+# code. Scrapes run against stub_server.StubServer replaying the fixtures, so the
+# numbers don't depend on the live API, and every result is written as JSON.
+# usage: python run_benchmarks.py results.json [--baseline last_night.json]
+
+
+def _timed(function, repeat, setup=None):
+    # runs function repeat times (calling setup before each run, untimed) with its
+    # prints swallowed, returns the run times and the last result
+    times, result = [], None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = function()
+            times.append(time.perf_counter() - start)
+    return(times, result)
+
+
+def _result(name, times, items, unit, **extra):
+    seconds = statistics.median(times)
+    return(dict({"name": name, "seconds": round(seconds, 6), "min_seconds": round(min(times), 6),
+                 "repeat": len(times), "items": items, "unit": unit,
+                 "items_per_second": round(items / seconds, 3) if seconds else None}, **extra))
+
+
+def bench_scrapes(server, season, workers, repeat):
+    """
+    Full-season scrapes through the season generators and get_season_tables,
+    full and slim feeds, plus the midterm player scrape, each from a cold cache
+    """
+    results = []
+
+    def fresh():
+        game.configure(base_api=server.url, max_workers=workers)
+        schedule._schedules.clear()
+        server.reset_stats()
+
+    scrapes = [
+        ("scrape_get_season_all", lambda: sum(1 for rows in game.get_season_all(season))),
+        ("scrape_get_team_stats_season", lambda: len(list(game.get_team_stats_season(season))) // 2),
+        ("scrape_get_season_tables", lambda: len(game.get_season_tables(season)["game_results"])),
+        ("scrape_get_season_tables_slim", lambda: len(game.get_season_tables(season, slim=True)["game_results"])),
+    ]
+    for name, function in scrapes:
+        times, games = _timed(function, repeat, setup=fresh)
+        results.append(_result(name, times, games, "games", requests=server.stats["requests"],
+                               bytes=server.stats["bytes"]))
+
+    def fresh_players():
+        player.configure(base_api=server.url, max_workers=workers, requests_per_second=None)
+        player._bios.clear()
+        server.reset_stats()
+
+    player_season = season + str(int(season) + 1)
+    times, rows = _timed(lambda: len(list(player.get_players_seasons([player_season]))), repeat, setup=fresh_players)
+    results.append(_result("scrape_get_players_seasons", times, rows, "roster spots",
+                           requests=server.stats["requests"], bytes=server.stats["bytes"]))
+    return(results)
+
+
+def bench_extraction(directory, game_ids, repeat):
+    """
+    Per-feed extraction of every table from feeds already in memory, with the
+    per row dictionaries of extract_tables and the typed columns of TableBuilder,
+    plus the play-by-play EventBuilder and its shot attempt counts
+    """
+    cache = FeedCache(directory, ttl=None)
+    feeds = [cache.get(game.game_link(game_id)) for game_id in game_ids]
+    times, _ = _timed(lambda: [game.extract_tables(feed) for feed in feeds], repeat)
+    results = [_result("extract_tables", times, len(feeds), "feeds",
+                       microseconds_per_feed=round(statistics.median(times) / len(feeds) * 1e6, 1))]
+
+    def build():
+        builder = game.schema.TableBuilder()
+        for feed in feeds:
+            builder.add(feed)
+        return(builder.to_frames())
+    times, _ = _timed(build, repeat)
+    results.append(_result("extract_table_builder", times, len(feeds), "feeds",
+                           microseconds_per_feed=round(statistics.median(times) / len(feeds) * 1e6, 1)))
+
+    def build_events():
+        builder = events.EventBuilder()
+        for feed in feeds:
+            builder.add(feed)
+        return(events.shot_attempts(builder.to_frame()))
+    times, _ = _timed(build_events, repeat)
+    results.append(_result("extract_events", times, len(feeds), "feeds",
+                           microseconds_per_feed=round(statistics.median(times) / len(feeds) * 1e6, 1)))
+    return(results)
+
+
+def bench_loading(repeat):
+    """
+    Loading the scraped tables from the repo CSVs and from the season
+    partitioned Parquet copies (when pyarrow is installed)
+    """
+    names = ["game_results", "game_team_stats", "game_goalie_stats", "game_officials"]
+    paths = {name: os.path.join(final_data_dir, name + "_full.csv") for name in names}
+    times, tables = _timed(lambda: {name: pd.read_csv(path) for name, path in paths.items()}, repeat)
+    rows = sum(len(table) for table in tables.values())
+    results = [_result("load_csv", times, rows, "rows")]
+    try:
+        import pyarrow
+    except ImportError:
+        return(results)
+    with tempfile.TemporaryDirectory() as parquet_dir:
+        for name, path in paths.items():
+            storage.csv_to_parquet(path, name, parquet_dir)
+        times, _ = _timed(lambda: {name: storage.read_table(name, parquet_dir) for name in names}, repeat)
+        results.append(_result("load_parquet", times, rows, "rows"))
+    return(results)
+
+
+def bench_features(repeat):
+    """
+    Building prediction_df, the notebook's modeling dataset, from the repo CSVs
+    """
+    game_results = pd.read_csv(os.path.join(final_data_dir, "game_results_full.csv"))
+    team_stats = pd.read_csv(os.path.join(final_data_dir, "game_team_stats_full.csv"))
+    times, prediction_df = _timed(lambda: build_prediction_df(game_results, team_stats), repeat)
+    return([_result("build_prediction_df", times, len(game_results), "games")], prediction_df)
+
+
+def bench_model(prediction_df, year, repeat):
+    """
+    One fit_optimize_season_model run with a small logistic regression and
+    random forest grid and a soft voting ensemble
+    """
+    from sklearn.compose import ColumnTransformer
+    from sklearn.ensemble import RandomForestClassifier, VotingClassifier
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.metrics import accuracy_score
+    from sklearn.preprocessing import StandardScaler
+    num_scale_vars = prediction_df.drop(columns=["gameID", "season", "homeTeamWin", "venue"]) \
+        .select_dtypes(include=['float64', 'int64']).columns
+    transformer = ColumnTransformer([('numeric', StandardScaler(), num_scale_vars)])
+    models = {
+        "Logistic_Regression": LogisticRegression(max_iter=1000, random_state=42),
+        "Random_Forest": RandomForestClassifier(random_state=42, n_jobs=-1),
+    }
+    params = [{"C": [0.5, 1.0]}, {"max_depth": [5, 9], "n_estimators": [50, 100]}]
+    times, fit_mods = _timed(lambda: fit_optimize_season_model(prediction_df, year, models, transformer, params,
+                                                               accuracy_score, VotingClassifier), repeat)
+    return([_result("fit_optimize_season_model", times, len(fit_mods["y_train"]), "training games",
+                    test_accuracy=[round(float(accuracy), 4) for accuracy in fit_mods["test_accuracy"]])])
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns:
+        List of the benchmarks whose throughput dropped more than tolerance
+        (a fraction) below the baseline run's
+    """
+    previous = {result["name"]: result for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        old = previous.get(result["name"])
+        if old is None or not old.get("items_per_second") or not result["items_per_second"]:
+            continue
+        change = result["items_per_second"] / old["items_per_second"] - 1
+        if change < -tolerance:
+            regressions.append({"name": result["name"], "items_per_second": result["items_per_second"],
+                                "baseline_items_per_second": old["items_per_second"], "change": round(change, 4)})
+    return(regressions)
+
+
+def _git_commit():
+    try:
+        return(subprocess.run(["git", "rev-parse", "HEAD"], cwd=root, capture_output=True, text=True).stdout.strip())
+    except OSError:
+        return(None)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the benchmarks and write the results as JSON.")
+    parser.add_argument("output", help="JSON file to write the results to, - for stdout")
+    parser.add_argument("--fixtures", default=os.path.join(root, "benchmarks", "fixtures"),
+                        help="fixture directory, built from the repo CSVs if it's empty")
+    parser.add_argument("--season", default="2019", help="season the scrape fixtures are for")
+    parser.add_argument("--games", type=int, default=200, help="number of games built into new fixtures")
+    parser.add_argument("--latency", type=float, default=20, help="stub server latency per response in ms")
+    parser.add_argument("--jitter", type=float, default=10, help="extra random latency per response in ms")
+    parser.add_argument("--workers", type=int, default=8, help="fetcher threads")
+    parser.add_argument("--max-in-flight", type=int,
+                        help="concurrent requests above which the stub server answers 429")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="fraction of scrape requests answered with a 5xx")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per benchmark, the median is reported")
+    parser.add_argument("--only", default="scrape,extract,load,features,model",
+                        help="comma separated groups to run")
+    parser.add_argument("--baseline", help="earlier results JSON to check for throughput regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="fraction of throughput that can be lost before it's a regression")
+    args = parser.parse_args()
+    groups = set(args.only.split(","))
+
+    if not os.path.isdir(args.fixtures) or not os.listdir(args.fixtures):
+        print("Building fixtures in", args.fixtures, file=sys.stderr)
+        build_fixtures(args.fixtures, args.season, args.games)
+    with StubServer(args.fixtures) as server:
+        game.configure(base_api=server.url)
+        game_ids = game.season_game_ids(args.season)
+
+        results = []
+        if "scrape" in groups:
+            server.latency, server.jitter = args.latency / 1000, args.jitter / 1000
+            server.max_in_flight, server.error_rate = args.max_in_flight, args.error_rate
+            results += bench_scrapes(server, args.season, args.workers, args.repeat)
+        if "extract" in groups:
+            results += bench_extraction(args.fixtures, game_ids, args.repeat)
+    if "load" in groups:
+        results += bench_loading(args.repeat)
+    if "features" in groups or "model" in groups:
+        feature_results, prediction_df = bench_features(args.repeat)
+        results += feature_results if "features" in groups else []
+        if "model" in groups:
+            results += bench_model(prediction_df, 2018, 1)
+
+    output = {
+        "meta": {"time": datetime.datetime.now().isoformat(), "commit": _git_commit(),
+                 "python": platform.python_version(), "platform": platform.platform(),
+                 "cpus": os.cpu_count(), "pandas": pd.__version__, "season": args.season,
+                 "games": len(game_ids), "latency_ms": args.latency, "jitter_ms": args.jitter,
+                 "workers": args.workers, "max_in_flight": args.max_in_flight, "error_rate": args.error_rate},
+        "results": results,
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            output["regressions"] = compare(results, json.load(f), args.tolerance)
+    text = json.dumps(output, indent=2)
+    if args.output == "-":
+        print(text)
+    else:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    for result in results:
+        print("%-32s %10.3f s %12.1f %s/s" % (result["name"], result["seconds"], result["items_per_second"] or 0,
+                                             result["unit"]), file=sys.stderr)
+    if output.get("regressions"):
+        print("Throughput regressions:", ", ".join(r["name"] for r in output["regressions"]), file=sys.stderr)
+        sys.exit(1)
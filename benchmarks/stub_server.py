@@ -0,0 +1,137 @@
+import gzip
+import random
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+try:
+    from .fixtures import FeedCache
+except ImportError:
+    from fixtures import FeedCache
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # keep-alive so the fetcher's pooled connections get reused like they do against the real API
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server.stub
+        status, headers = server.admit()
+        try:
+            body, status = server.response(self.path) if status == 200 else (b'{"message": "Try again"}', status)
+            delay = server.latency + (random.uniform(0, server.jitter) if server.jitter else 0)
+            if delay:
+                time.sleep(delay)
+        finally:
+            server.leave()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if status == 200 and server.compress and "gzip" in self.headers.get("Accept-Encoding", ""):
+            self.send_header("Content-Encoding", "gzip")
+        else:
+            body = gzip.decompress(body) if status == 200 else body
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        server.count(status, len(body))
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer:
+    """
+    Arguments:
+        directory - Fixture directory, see fixtures.py. Character.
+        latency - Seconds added to every response. Float.
+        jitter - Up to this many extra seconds, drawn uniformly per response
+        compress - Send the gzip fixtures as is with Content-Encoding: gzip when
+                   the client accepts it, like the statsapi does
+        max_in_flight - Optional number of concurrent requests above which the
+                        server answers 429 with a Retry-After, like a rate limited API
+        error_rate - Fraction of requests answered with a random 500/502/503
+        retry_after - Seconds sent in the 429s' Retry-After header
+    Returns:
+        Local statsapi stand-in that replays the fixtures over HTTP on a free
+        port in a background thread. Links that aren't in the fixtures get a 404.
+    Example:
+        with StubServer("fixtures/", latency=0.05) as server:
+            configure(base_api=server.url, max_workers=8)
+            get_season_tables("2019")
+            server.stats
+    """
+    def __init__(self, directory, latency=0.0, jitter=0.0, compress=True, max_in_flight=None, error_rate=0.0,
+                 retry_after=1):
+        self.cache = FeedCache(directory, ttl=None)
+        self.latency = latency
+        self.jitter = jitter
+        self.compress = compress
+        self.max_in_flight = max_in_flight
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self._bodies = {}
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "bytes": 0, "statuses": {}}
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self._thread = None
+
+    @property
+    def url(self):
+        return("http://127.0.0.1:%d" % self._server.server_port)
+
+    def response(self, link):
+        # fixture files are read once and kept compressed in memory so disk reads
+        # don't show up in the benchmarks
+        body = self._bodies.get(link)
+        if body is None:
+            try:
+                with open(self.cache.path(link), "rb") as f:
+                    body = f.read()
+            except FileNotFoundError:
+                return(b'{"message": "Object not found"}', 404)
+            self._bodies[link] = body
+        return(body, 200)
+
+    def admit(self):
+        # decides up front whether a request gets throttled or a server error,
+        # returns the status to answer with (200 for a normal response) and extra headers
+        with self._lock:
+            self.in_flight += 1
+            if self.max_in_flight is not None and self.in_flight > self.max_in_flight:
+                return(429, {"Retry-After": str(self.retry_after)})
+        if self.error_rate and random.random() < self.error_rate:
+            return(random.choice((500, 502, 503)), {})
+        return(200, {})
+
+    def leave(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def count(self, status, size):
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["bytes"] += size
+            self.stats["statuses"][status] = self.stats["statuses"].get(status, 0) + 1
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {"requests": 0, "bytes": 0, "statuses": {}}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return(self)
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return(self.start())
+
+    def __exit__(self, *args):
+        self.stop()
@@ -0,0 +1,157 @@
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+from urllib.parse import urlparse
+# orjson decodes/encodes several times faster than the json module when it's installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def loads(data):
+    """
+    Arguments:
+        data - JSON document. Bytes or character.
+    Returns:
+        The decoded JSON, with orjson if it's installed
+    """
+    if orjson is not None:
+        return(orjson.loads(data))
+    return(json.loads(data))
+
+
+def dumps(data):
+    """
+    Returns:
+        data encoded as JSON bytes, with orjson if it's installed
+    """
+    if orjson is not None:
+        return(orjson.dumps(data))
+    return(json.dumps(data).encode("utf-8"))
+
+
+# raised by the fetcher in replay mode when a link isn't in the cache
+class CacheMissError(Exception):
+    pass
+
+
+# a game feed can never change again once the game is final, and neither can
+# a schedule once every game in it is final
+def is_final(data):
+    try:
+        if 'dates' in data:
+            games = [game for date in data['dates'] for game in date['games']]
+            return(len(games) > 0 and all(game['status']['abstractGameState'] == "Final" for game in games))
+        return(data['gameData']['status']['abstractGameState'] == "Final")
+    except (KeyError, TypeError):
+        return(False)
+
+
+# links for one season, e.g. a player's stats (season=20182019) or a team's
+# spotrac cap page (/cap/2018/), and the years to add to the matched year to get
+# the year the season ended in
+_season_links = [(re.compile(r"season=\d{4}(\d{4})"), 0), (re.compile(r"/cap/(\d{4})/?$"), 1)]
+
+
+def season_ended(link):
+    """
+    Returns:
+        True if link is for a season that ended before this year, so whatever
+        it returns can't change anymore
+    """
+    for pattern, years in _season_links:
+        match = pattern.search(link)
+        if match is not None:
+            return(int(match.group(1)) + years < datetime.date.today().year)
+    return(False)
+
+
+def is_immutable(link, data):
+    """
+    Arguments:
+        link - API link the response was downloaded from. Character.
+        data - The response, decoded JSON or text
+    Returns:
+        True if the response can never change again, a final game or schedule
+        or anything for a season that has ended
+    """
+    return(season_ended(link) or is_final(data))
+
+
+class FeedCache:
+    """
+    Arguments:
+        directory - Folder the cached responses are saved in. Created if needed.
+        ttl - Seconds a response that can still change (e.g. an in-progress
+              game) is kept before it is downloaded again. None to never expire.
+        immutable - Function taking a link and its response and returning True
+                    if it can never change. Those responses never expire.
+                    Defaults to is_immutable.
+    Returns:
+        gzip compressed, on disk cache of raw API responses keyed by the API
+        path, e.g. game/2019020001/feed/live.json.gz. Text responses (e.g. an
+        HTML page) are kept next to them as .txt.gz
+    Example:
+        cache = FeedCache("data/cache")
+        feed = cache.get("/api/v1/game/2019020001/feed/live/")
+    """
+    def __init__(self, directory, ttl=300, immutable=is_immutable):
+        self.directory = directory
+        self.ttl = ttl
+        self.immutable = immutable
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, link, text=False):
+        parsed = urlparse(link)
+        # dropping the /api/v1 prefix so the layout is endpoint/id/...
+        parts = [part for part in parsed.path.split("/") if part][2:] if parsed.path.startswith("/api/") \
+            else [part for part in parsed.path.split("/") if part]
+        parts = [re.sub(r"[^A-Za-z0-9_.-]", "_", part) for part in parts] or ["index"]
+        file_name = parts[-1]
+        # query strings (e.g. a season or stat type) get a short hash so they still map to one file
+        if parsed.query:
+            file_name += "_" + hashlib.sha1(parsed.query.encode()).hexdigest()[:12]
+        return(os.path.join(self.directory, *parts[:-1], file_name + (".txt.gz" if text else ".json.gz")))
+
+    def get(self, link, ignore_ttl=False, text=False):
+        """
+        Arguments:
+            link - API link the response was downloaded from. Character.
+            ignore_ttl - Return the response even if it has expired. Used in
+                         replay mode where there is nothing to refresh it from.
+            text - Whether the response was saved as text instead of JSON
+        Returns:
+            The cached response for link, or None if it isn't cached or has expired
+        """
+        file_path = self.path(link, text)
+        if not os.path.exists(file_path):
+            return(None)
+        with gzip.open(file_path, "rb") as f:
+            content = f.read()
+        data = content.decode("utf-8") if text else loads(content)
+        if not ignore_ttl and self.ttl is not None and not self.immutable(link, data) and time.time() - os.path.getmtime(file_path) > self.ttl:
+            return(None)
+        return(data)
+
+    def put(self, link, data, text=False):
+        file_path = self.path(link, text)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        # writing to a temporary file first so a crash never leaves half a feed behind.
+        # Each call gets its own, so threads saving the same link can't mix their writes
+        handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(file_path), suffix=".tmp")
+        try:
+            with os.fdopen(handle, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb") as f:
+                f.write(data.encode("utf-8") if text else dumps(data))
+            os.replace(temp_path, file_path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    def __contains__(self, link):
+        return(os.path.exists(self.path(link)))
@@ -0,0 +1,115 @@
+import glob
+import json
+import os
+import pandas as pd
+try:
+    from .telemetry import get_telemetry
+except ImportError:
+    from telemetry import get_telemetry
+
+
+class SeasonCheckpoint:
+    """
+    Arguments:
+        data_dir - Directory the checkpoint folder is kept in. Character.
+        season - Start of the season being scraped. Character. Example: "2019"
+        chunk_size - Number of games buffered before they are written out.
+    Returns:
+        Object that saves scraped game rows to append-only chunk CSVs and keeps
+        a manifest of finished game IDs, so a crashed or repeated run only has
+        to download the games that are missing or weren't final yet.
+    Example:
+        checkpoint = SeasonCheckpoint("data/", "2019")
+        for game_id, final, rows in get_game_tables(checkpoint.pending(season_game_ids("2019"))):
+            checkpoint.add(game_id, rows, final)
+        checkpoint.flush()
+        season_tables = checkpoint.compact()
+    """
+    def __init__(self, data_dir, season, chunk_size=50):
+        self.directory = os.path.join(data_dir, "checkpoints", str(season))
+        self.chunk_size = chunk_size
+        os.makedirs(self.directory, exist_ok=True)
+        self.manifest_path = os.path.join(self.directory, "manifest.json")
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                self.manifest = json.load(f)
+        else:
+            self.manifest = {"next_chunk": 0, "games": {}}
+        self._buffer = []
+
+    def is_done(self, game_id):
+        game = self.manifest["games"].get(str(game_id))
+        return(game is not None and game["final"])
+
+    def pending(self, game_ids):
+        """
+        Returns:
+            The game IDs that haven't been saved yet or weren't final when they were
+        """
+        return([game_id for game_id in game_ids if not self.is_done(game_id)])
+
+    def add(self, game_id, rows, final):
+        """
+        Arguments:
+            game_id - ID of the game. Character.
+            rows - Dictionary of table name to list of row dictionaries for the game
+            final - Whether the game was over when it was downloaded
+        """
+        self._buffer.append((str(game_id), rows, final))
+        if len(self._buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        with get_telemetry().stage("write"):
+            self._write_chunk()
+
+    def _write_chunk(self):
+        chunk = self.manifest["next_chunk"]
+        tables = {table for _, rows, _ in self._buffer for table in rows}
+        for table in tables:
+            table_rows = [row for _, rows, _ in self._buffer for row in rows.get(table, [])]
+            pd.DataFrame(table_rows).to_csv(self._chunk_path(table, chunk), index=False)
+        # the manifest is only updated once the chunk is fully on disk so a crash
+        # mid write just means those games get downloaded again
+        for game_id, _, final in self._buffer:
+            self.manifest["games"][game_id] = {"chunk": chunk, "final": final}
+        self.manifest["next_chunk"] = chunk + 1
+        temp_path = self.manifest_path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.manifest, f)
+        os.replace(temp_path, self.manifest_path)
+        self._buffer = []
+
+    def _chunk_path(self, table, chunk):
+        return(os.path.join(self.directory, "%s_%05d.csv" % (table, chunk)))
+
+    def compact(self, tables=None):
+        """
+        Arguments:
+            tables - Optional list of table names. Defaults to every table with chunks
+        Returns:
+            Dictionary of DataFrames with every saved game, keeping only the
+            latest download of games that were saved more than once
+        """
+        self.flush()
+        if tables is None:
+            tables = sorted({os.path.basename(path).rsplit("_", 1)[0]
+                             for path in glob.glob(os.path.join(self.directory, "*_*.csv"))})
+        latest_chunk = {int(game_id): game["chunk"] for game_id, game in self.manifest["games"].items()}
+        season_tables = {}
+        for table in tables:
+            chunks = []
+            for path in sorted(glob.glob(os.path.join(self.directory, table + "_*.csv"))):
+                chunk = int(os.path.basename(path).rsplit("_", 1)[1].split(".")[0])
+                try:
+                    chunk_df = pd.read_csv(path)
+                except pd.errors.EmptyDataError:
+                    continue
+                # dropping rows of games that were downloaded again in a later chunk
+                chunks.append(chunk_df[chunk_df.gameID.map(latest_chunk) == chunk])
+            season_tables[table] = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+            if len(season_tables[table]):
+                season_tables[table] = season_tables[table].sort_values("gameID", kind="stable", ignore_index=True)
+        return(season_tables)
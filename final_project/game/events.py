@@ -0,0 +1,246 @@
+import array
+import numpy as np
+import pandas as pd
+try:
+    from . import storage
+except ImportError:
+    import storage
+
+# play-by-play ingestion. Every play in liveData.plays.allPlays becomes one row of
+# small fixed width columns (int8 event codes, int16 rink coordinates, int32
+# seconds and player IDs) appended straight into array.array buffers, so a
+# season of ~400k plays is a few MB instead of a dictionary per row. Shot
+# attempt counts per team-game (Corsi and Fenwick) are derived from the columns
+# with numpy and merged into game_team_stats.
+
+# eventTypeId codes, stored as int8. Anything not listed is "OTHER"
+event_types = ["OTHER", "FACEOFF", "SHOT", "MISSED_SHOT", "BLOCKED_SHOT", "GOAL", "HIT", "GIVEAWAY",
+               "TAKEAWAY", "PENALTY", "STOP", "FIGHT", "CHALLENGE", "PERIOD_READY", "PERIOD_START",
+               "PERIOD_END", "PERIOD_OFFICIAL", "GAME_SCHEDULED", "GAME_END", "GAME_OFFICIAL",
+               "SHOOTOUT_COMPLETE", "EARLY_INT_START", "EARLY_INT_END", "EMERGENCY_GOALTENDER"]
+event_codes = {name: code for code, name in enumerate(event_types)}
+# about.periodType codes, -1 if it's something else
+period_types = ["REGULAR", "OVERTIME", "SHOOTOUT"]
+period_codes = {name: code for code, name in enumerate(period_types)}
+# playerType of the player1ID and player2ID columns. For a blocked shot the
+# shooter is player1 and the blocker player2, for a goal the scorer and goalie
+primary_roles = {"Shooter", "Scorer", "Hitter", "Winner", "PenaltyOn", "PlayerID"}
+secondary_roles = {"Goalie", "Blocker", "Hittee", "Loser", "DrewBy"}
+# shot attempts. Corsi counts every attempt, Fenwick only unblocked ones
+corsi_events = [event_codes[name] for name in ["SHOT", "GOAL", "MISSED_SHOT", "BLOCKED_SHOT"]]
+fenwick_events = [event_codes[name] for name in ["SHOT", "GOAL", "MISSED_SHOT"]]
+
+# column name -> (array typecode, numpy dtype, value stored for a missing value).
+# Columns with a missing value come out as nullable pandas integers
+event_columns = {
+    "gameID": ("i", "int32", None),
+    "eventIdx": ("h", "int16", None),
+    "period": ("b", "int8", None),
+    "periodType": ("b", "int8", None),
+    "periodSeconds": ("h", "int16", None),
+    "gameSeconds": ("i", "int32", None),
+    "eventType": ("b", "int8", None),
+    "teamID": ("h", "int16", 0),
+    # 1 for the home team, 0 for the away team, -1 for plays without a team
+    "isHome": ("b", "int8", None),
+    "x": ("h", "int16", -32768),
+    "y": ("h", "int16", -32768),
+    "player1ID": ("i", "int32", 0),
+    "player2ID": ("i", "int32", 0),
+}
+missing_coordinate = -32768
+table_name = "game_events"
+
+
+def _seconds(clock):
+    # "MM:SS" -> seconds, e.g. "12:34" -> 754
+    minutes, _, seconds = clock.partition(":")
+    return(int(minutes) * 60 + int(seconds))
+
+
+def extract_event_values(game):
+    """
+    Arguments:
+        game - /feed/live JSON for a game. Dictionary.
+    Returns:
+        List of lists, one per column of event_columns, with a value per play.
+        Raises if the feed has no play-by-play, e.g. a slim feed.
+    """
+    plays = game['liveData']['plays']['allPlays']
+    game_id = int(game['gamePk'])
+    home_id = game['gameData']['teams']['home']['id']
+    values = [[] for _ in event_columns]
+    (game_ids, indexes, periods, period_type_codes, period_seconds, game_seconds, codes, teams, home,
+     xs, ys, players1, players2) = values
+    for i, play in enumerate(plays):
+        about = play['about']
+        period = about['period']
+        seconds = _seconds(about['periodTime'])
+        game_ids.append(game_id)
+        indexes.append(about.get('eventIdx', i))
+        periods.append(period)
+        period_type_codes.append(period_codes.get(about.get('periodType'), -1))
+        period_seconds.append(seconds)
+        game_seconds.append((period - 1) * 1200 + seconds)
+        codes.append(event_codes.get(play['result']['eventTypeId'], 0))
+        team = play.get('team')
+        team_id = team['id'] if team else 0
+        teams.append(team_id)
+        home.append(-1 if not team_id else int(team_id == home_id))
+        coordinates = play.get('coordinates') or {}
+        x, y = coordinates.get('x'), coordinates.get('y')
+        xs.append(missing_coordinate if x is None else int(round(x)))
+        ys.append(missing_coordinate if y is None else int(round(y)))
+        player1 = player2 = 0
+        for player in play.get('players') or ():
+            role = player['playerType']
+            if role in primary_roles and not player1:
+                player1 = player['player']['id']
+            elif role in secondary_roles and not player2:
+                player2 = player['player']['id']
+        players1.append(player1)
+        players2.append(player2)
+    return(values)
+
+
+class EventBuilder:
+    """
+    Returns:
+        Object that appends every game's plays to typed array.array column
+        buffers and turns them into one compact DataFrame at the end
+    Example:
+        builder = EventBuilder()
+        for game_id, feed in get_game_feeds(game_ids):
+            builder.add(feed)
+        events = builder.to_frame()
+        write_events(events, "data/parquet")
+    """
+    def __init__(self):
+        self.buffers = [array.array(typecode) for typecode, _, _ in event_columns.values()]
+
+    def __len__(self):
+        return(len(self.buffers[0]))
+
+    def add(self, game):
+        """
+        Appends the game's plays. The whole game is extracted before anything is
+        appended, so a feed without play-by-play raises without leaving the
+        columns different lengths. Returns the number of plays added.
+        """
+        values = extract_event_values(game)
+        for buffer, column_values in zip(self.buffers, values):
+            buffer.extend(column_values)
+        return(len(values[0]))
+
+    def to_frame(self):
+        """
+        Returns:
+            DataFrame with one row per play and the dtypes of event_columns,
+            missing team, coordinate and player values as <NA>
+        """
+        frame = {}
+        for (name, (_, dtype, missing)), buffer in zip(event_columns.items(), self.buffers):
+            values = np.frombuffer(buffer, dtype=dtype).copy() if len(buffer) else np.array([], dtype=dtype)
+            if missing is None:
+                frame[name] = values
+            else:
+                frame[name] = pd.arrays.IntegerArray(values, values == missing)
+        return(pd.DataFrame(frame))
+
+
+def event_type_names(codes):
+    """
+    Arguments:
+        codes - eventType column of the events table
+    Returns:
+        Categorical of the eventTypeId names, e.g. for a value_counts
+    """
+    return(pd.Categorical.from_codes(np.asarray(codes), event_types))
+
+
+def shot_attempts(events):
+    """
+    Arguments:
+        events - Events table from EventBuilder.to_frame or read_events. DataFrame.
+    Returns:
+        DataFrame with one row per team per game (gameID, homeAway) and the team's
+        corsiFor/corsiAgainst (every shot attempt: shots, goals, misses and
+        blocked shots), fenwickFor/fenwickAgainst (unblocked attempts) and the
+        corsiForPercentage and fenwickForPercentage of all attempts in the game.
+        Shootout attempts aren't counted.
+    """
+    code = events["eventType"].to_numpy()
+    is_home = events["isHome"].to_numpy()
+    counted = (events["periodType"].to_numpy() != period_codes["SHOOTOUT"]) & (is_home >= 0)
+    corsi = counted & np.isin(code, corsi_events)
+    fenwick = counted & np.isin(code, fenwick_events)
+    # the feed credits a blocked shot to the blocking team, the attempt was the other side's
+    home_attempt = np.where(code == event_codes["BLOCKED_SHOT"], is_home == 0, is_home == 1)
+    game_ids, game_index = np.unique(events["gameID"].to_numpy(), return_inverse=True)
+
+    def count(mask):
+        return(np.bincount(game_index[mask], minlength=len(game_ids)).astype("int64"))
+
+    home_corsi, away_corsi = count(corsi & home_attempt), count(corsi & ~home_attempt)
+    home_fenwick, away_fenwick = count(fenwick & home_attempt), count(fenwick & ~home_attempt)
+    sides = []
+    for side, corsi_for, corsi_against, fenwick_for, fenwick_against in [
+            ("home", home_corsi, away_corsi, home_fenwick, away_fenwick),
+            ("away", away_corsi, home_corsi, away_fenwick, home_fenwick)]:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            sides.append(pd.DataFrame({
+                "gameID": game_ids.astype("int64"), "homeAway": side,
+                "corsiFor": corsi_for, "corsiAgainst": corsi_against,
+                "fenwickFor": fenwick_for, "fenwickAgainst": fenwick_against,
+                "corsiForPercentage": 100 * corsi_for / (corsi_for + corsi_against),
+                "fenwickForPercentage": 100 * fenwick_for / (fenwick_for + fenwick_against)}))
+    return(pd.concat(sides, ignore_index=True).sort_values(["gameID", "homeAway"], ascending=[True, False],
+                                                           kind="stable", ignore_index=True))
+
+
+def add_shot_attempts(team_stats, events):
+    """
+    Arguments:
+        team_stats - Team stats table (game_team_stats). DataFrame.
+        events - Events table for the same games. DataFrame.
+    Returns:
+        Copy of team_stats with the shot_attempts columns added. Games without
+        play-by-play get missing values, so lagged_team_stats drops them.
+    Example:
+        season_tables = get_season_tables("2019", events=True)
+        # game_team_stats already has them, this is for tables loaded separately
+        team_stats = add_shot_attempts(pd.read_csv("data/game_team_stats_full.csv"),
+                                       read_events("data/parquet"))
+    """
+    attempts = shot_attempts(events)
+    team_stats = team_stats.drop(columns=attempts.columns.difference(["gameID", "homeAway"]), errors="ignore")
+    attempts["gameID"] = attempts["gameID"].astype(team_stats["gameID"].dtype)
+    return(pd.merge(team_stats, attempts, on=["gameID", "homeAway"], how="left"))
+
+
+def write_events(events, root):
+    """
+    Arguments:
+        events - Events table. DataFrame.
+        root - Directory the Parquet datasets are kept in. Character.
+    Returns:
+        Nothing. Writes root/game_events/seasonStart=<year>/ partitions with the
+        compact column types, replacing the partitions of any seasons in events
+    """
+    events = events.assign(**{storage.partition_column: (events["gameID"] // 1000000).astype("int16")})
+    storage.write_partitioned(events, table_name, root)
+
+
+def read_events(root, columns=None, seasons=None):
+    """
+    Arguments:
+        root - Directory the Parquet datasets are kept in. Character.
+        columns - Optional list of columns to load
+        seasons - Optional list of season start years to load, e.g. [2019]
+    Returns:
+        Events table with the stored column types
+    Example:
+        # every shot attempt's coordinates from one season
+        events = read_events("data/parquet", columns=["gameID", "eventType", "x", "y"], seasons=[2019])
+    """
+    return(storage.read_table(table_name, root, columns, seasons))
@@ -0,0 +1,197 @@
+import pickle
+import pandas as pd
+try:
+    from .cache import is_final
+    from .game import extract_team_stats, extract_player_stats, extract_goalie_stats
+except ImportError:
+    from cache import is_final
+    from game import extract_team_stats, extract_player_stats, extract_goalie_stats
+
+# team stat columns that are averaged over games played instead of summed,
+# same as the "Percentage" columns in features.cumulative_team_stats
+def _is_percentage(key):
+    return("Percentage" in key)
+
+
+def _season(game_id):
+    year = int(str(game_id)[0:4])
+    return(str(year) + "/" + str(year + 1))
+
+
+# stats are summed as floats, missing values are skipped like pandas cumsum does
+def _number(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return(None)
+    return(None if value != value else value)
+
+
+class FeatureStore:
+    """
+    Arguments:
+        hot_threshold - Point streak length that makes a skater a hot player. Integer.
+    Returns:
+        Object keeping the running state needed for the pre-game features in
+        prediction_df (cumulative team stats, win/lose streaks, hot player
+        counts, skater point streaks and goalie consecutive games) keyed by
+        team or player and season. Each finished game is applied once with
+        update() instead of rebuilding everything from history.
+    Example:
+        store = FeatureStore.from_tables(team_stats_game, player_stats, goalie_stats)
+        store.update(get_game_feed("2019020500"))
+        store.pregame_features(home_team_id=10, away_team_id=8, season="2019/2020")
+        store.save("data/feature_store.pkl")
+    """
+    def __init__(self, hot_threshold=2):
+        self.hot_threshold = hot_threshold
+        # (teamID, season) -> running sums, games played/won/lost, streaks and hot players
+        self.teams = {}
+        # (playerID, season) -> current point streak
+        self.point_streaks = {}
+        # (teamID, season) -> last goalie to play and how many goalie rows in a row they have
+        self.goalies = {}
+        # game IDs already applied so a game can't be counted twice
+        self.games = set()
+
+    def update(self, game_feed):
+        """
+        Arguments:
+            game_feed - /feed/live JSON of a finished game. Dictionary.
+        Returns:
+            True if the game was applied, False if it had already been applied
+            or isn't final yet. A preview or in-progress feed changes nothing, so
+            the game is applied in full once its final feed comes in.
+        """
+        if not is_final(game_feed):
+            return(False)
+        return(self.update_rows(extract_team_stats(game_feed),
+                                extract_player_stats(game_feed),
+                                extract_goalie_stats(game_feed)))
+
+    def update_rows(self, team_rows, player_rows=(), goalie_rows=()):
+        """
+        Arguments:
+            team_rows - The two team stats rows (dictionaries) for one game
+            player_rows - The skater stats rows for the game
+            goalie_rows - The goalie stats rows for the game
+        Returns:
+            True if the game was applied, False if it had already been applied
+        """
+        game_id = str(team_rows[0]['gameID'])
+        if game_id in self.games:
+            return(False)
+        season = _season(game_id)
+
+        # skater point streaks and the number of hot players on each team after the game
+        hot_players = {}
+        for row in player_rows:
+            key = (str(row['playerID']), season)
+            scored = (row.get('assists') or 0) > 0 or (row.get('goals') or 0) > 0
+            self.point_streaks[key] = self.point_streaks.get(key, 0) + 1 if scored else 0
+            team_id = str(row['teamID'])
+            hot_players[team_id] = hot_players.get(team_id, 0) + int(self.point_streaks[key] >= self.hot_threshold)
+
+        for row in team_rows:
+            team_id = str(row['teamID'])
+            state = self.teams.setdefault((team_id, season), {
+                "sums": {}, "gamesPlayed": 0, "gamesWon": 0, "gamesLost": 0,
+                "winStreak": 0, "loseStreak": 0, "hotPlayer": 0})
+            for key, value in row.items():
+                if key in ('gameID', 'teamID', 'periodsPlayed', 'homeTeamWin'):
+                    continue
+                value = _number(value)
+                if value is not None:
+                    state["sums"][key] = state["sums"].get(key, 0) + value
+            won = (row['homeAway'] == "home") == bool(row['homeTeamWin'])
+            state["gamesPlayed"] += 1
+            state["gamesWon"] += int(won)
+            state["gamesLost"] += int(not won)
+            state["winStreak"] = state["winStreak"] + 1 if won else 0
+            state["loseStreak"] = 0 if won else state["loseStreak"] + 1
+            state["hotPlayer"] = hot_players.get(team_id, 0)
+
+        for row in goalie_rows:
+            key = (str(row['teamID']), season)
+            last = self.goalies.get(key)
+            player_id = str(row['playerID'])
+            consecutive = last["consecutive"] + 1 if last is not None and last["playerID"] == player_id else 0
+            self.goalies[key] = {"playerID": player_id, "consecutive": consecutive}
+
+        self.games.add(game_id)
+        return(True)
+
+    def team_features(self, team_id, season):
+        """
+        Returns:
+            Dictionary of the team's stats going into its next game, or None
+            if the team hasn't played yet this season
+        """
+        state = self.teams.get((str(team_id), season))
+        if state is None:
+            return(None)
+        features = {}
+        for key, value in state["sums"].items():
+            features[key] = value / state["gamesPlayed"] if _is_percentage(key) else value
+        for key in ("winStreak", "loseStreak", "gamesWon", "hotPlayer"):
+            features[key] = state[key]
+        return(features)
+
+    def pregame_features(self, home_team_id, away_team_id, season):
+        """
+        Arguments:
+            home_team_id - teamID of the home team
+            away_team_id - teamID of the away team
+            season - Season in the "2019/2020" format
+        Returns:
+            Dictionary of home minus away team stats going into the game, the
+            same features as a prediction_df row. None if either team hasn't
+            played yet this season.
+        """
+        home = self.team_features(home_team_id, season)
+        away = self.team_features(away_team_id, season)
+        if home is None or away is None:
+            return(None)
+        return({key: home[key] - away.get(key, 0) for key in home})
+
+    def goalie_state(self, team_id, season):
+        """
+        Returns:
+            Dictionary with the playerID of the team's last goalie and their
+            goalieConsecutiveGames, or None if the team hasn't played yet
+        """
+        return(self.goalies.get((str(team_id), season)))
+
+    # only the plain state is pickled so a snapshot loads the same whether this
+    # module was imported as game.feature_store or feature_store
+    def save(self, path):
+        with open(path, "wb") as f:
+            pickle.dump(self.__dict__, f)
+
+    @classmethod
+    def load(cls, path):
+        store = cls()
+        with open(path, "rb") as f:
+            store.__dict__.update(pickle.load(f))
+        return(store)
+
+    @classmethod
+    def from_tables(cls, team_stats_game, player_stats=None, goalie_stats=None, hot_threshold=2):
+        """
+        Arguments:
+            team_stats_game - Team stats table (game_team_stats)
+            player_stats - Optional skater stats table (game_player_stats)
+            goalie_stats - Optional goalie stats table (game_goalie_stats)
+        Returns:
+            FeatureStore with every game in the tables applied in gameID order.
+            Used once to bootstrap the store from the scraped history.
+        """
+        store = cls(hot_threshold=hot_threshold)
+        empty = pd.DataFrame(columns=["gameID"])
+        tables = [team_stats_game, player_stats if player_stats is not None else empty,
+                  goalie_stats if goalie_stats is not None else empty]
+        grouped = [{game_id: rows for game_id, rows in table.groupby("gameID", sort=False)} for table in tables]
+        for game_id in sorted(grouped[0]):
+            rows = [group[game_id].to_dict("records") if game_id in group else [] for group in grouped]
+            store.update_rows(*rows)
+        return(store)
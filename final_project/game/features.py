@@ -0,0 +1,201 @@
+import pandas as pd
+
+# vectorized versions of the feature engineering in analysis.ipynb. Every streak
+# is built from grouped cumsums (run-length encoding) instead of iterrows loops,
+# and the output columns match the notebook's.
+
+time_on_ice_cols = ['timeOnIce', 'powerPlayTimeOnIce', 'evenTimeOnIce', 'shortHandedTimeOnIce']
+save_percentages = ["savePercentage", "powerPlaySavePercentage", "shortHandedSavePercentage", "evenStrengthSavePercentage"]
+
+
+def add_season(df):
+    return df['gameID'].astype(str).str[0:4] + "/" + (df['gameID'].astype(str).str[0:4].astype(int) + 1).astype(str)
+
+
+# setting the ID columns to characters like the notebook does after reading the CSVs
+def ids_to_str(df):
+    df = df.copy()
+    ID_cols = df.filter(like="ID").columns.to_list()
+    df[ID_cols] = df[ID_cols].astype(str)
+    return(df)
+
+
+# function to clean the time on ice from minutes:seconds format to a decimal
+def clean_toi(x):
+    time = x.str.split(":")
+    minutes = time.str.get(0)
+    seconds = time.str.get(1).astype(int)*100/60
+    return minutes + "." + seconds.round().astype(int).astype(str)
+
+
+def _num_vars(df):
+    return(df.select_dtypes(include = ['float64', 'int64']).columns.to_list())
+
+
+def streak(flag, keys):
+    """
+    Arguments:
+        flag - Boolean Series, e.g. whether the team won each game
+        keys - List of Series to group by, e.g. [df.teamID, df.season]
+    Returns:
+        int64 Series with the number of True values in a row up to and
+        including each row within its group. 0 on rows where flag is False.
+    """
+    flag = flag.astype(bool)
+    # every False starts a new run, so the running count of Falses labels the runs
+    run = (~flag).astype("int64").groupby(keys).cumsum()
+    return(flag.astype("int64").groupby(keys + [run]).cumsum())
+
+
+def cumulative_team_stats(team_stats_game):
+    """
+    Arguments:
+        team_stats_game - Team stats table (game_team_stats), one row per team per game
+    Returns:
+        Cumulative team stats per team and season including winStreak,
+        loseStreak, gamesWon and gamesLost, like cum_team_stats in the notebook
+    """
+    team_stats_game = ids_to_str(team_stats_game)
+    if "periodsPlayed" in team_stats_game.columns:
+        team_stats_game = team_stats_game.drop(columns="periodsPlayed")
+    team_stats_game['season'] = add_season(team_stats_game)
+    team_stats_game['gamesPlayed'] = 1
+    team_num_vars = _num_vars(team_stats_game)
+
+    # creating cumulative totals for the team stats
+    cum_team_num_stats = team_stats_game \
+        .groupby(by=['teamID', 'season'])[team_num_vars] \
+        .cumsum()
+    cum_team_stats = pd.concat([team_stats_game.drop(columns=team_num_vars), cum_team_num_stats], axis="columns")
+    team_percent_cols = cum_team_stats.filter(like="Percentage").columns.to_list()
+    cum_team_stats[team_percent_cols] = cum_team_stats[team_percent_cols].apply(lambda x: x/cum_team_stats["gamesPlayed"])
+
+    # adding win/lose and streak columns
+    keys = [cum_team_stats.teamID, cum_team_stats.season]
+    home_win = cum_team_stats.homeTeamWin.astype(bool)
+    won = ((cum_team_stats.homeAway == "home") & home_win) | ((cum_team_stats.homeAway == "away") & ~home_win)
+    cum_team_stats["winStreak"] = streak(won, keys)
+    cum_team_stats["loseStreak"] = streak(~won, keys)
+    cum_team_stats["gamesWon"] = won.astype("int64").groupby(keys).cumsum()
+    cum_team_stats["gamesLost"] = (~won).astype("int64").groupby(keys).cumsum()
+    return(cum_team_stats)
+
+
+def cumulative_player_stats(player_stats):
+    """
+    Arguments:
+        player_stats - Skater stats table (game_player_stats), one row per skater per game
+    Returns:
+        Cumulative skater stats per player and season including pointStreak
+        and hotPlayer, like cum_player_stats in the notebook
+    """
+    player_stats = ids_to_str(player_stats)
+    player_stats["season"] = add_season(player_stats)
+    player_stats["gamesPlayed"] = 1
+    player_stats[['faceoffTaken', "faceOffWins", "faceOffPct"]] = player_stats[['faceoffTaken', "faceOffWins", "faceOffPct"]].fillna(value=0)
+    player_stats[time_on_ice_cols] = player_stats[time_on_ice_cols].apply(clean_toi).astype(float)
+    player_num_vars = _num_vars(player_stats)
+
+    # adding player point streak column
+    scored = (player_stats["assists"] > 0) | (player_stats["goals"] > 0)
+    player_stats["pointStreak"] = streak(scored, [player_stats.playerID, player_stats.season])
+
+    # creating cumulative totals for the player stats
+    cum_player_num_stats = player_stats \
+        .groupby(by=['playerID', 'season'])[player_num_vars] \
+        .cumsum()
+    cum_player_stats = pd.concat([player_stats.drop(columns=player_num_vars), cum_player_num_stats],
+                                 axis="columns")
+
+    # turning time on ice stats into season averages
+    cum_player_stats[time_on_ice_cols] = cum_player_stats[time_on_ice_cols].apply(lambda x: x/cum_player_stats['gamesPlayed'])
+    cum_player_stats["hotPlayer"] = (cum_player_stats.pointStreak >= 2).astype(int)
+    cum_player_stats["faceOffPct"] = cum_player_stats["faceOffWins"] / cum_player_stats['faceoffTaken']
+    cum_player_stats["faceOffPct"] = cum_player_stats["faceOffPct"].fillna(value=0)
+    return(cum_player_stats)
+
+
+def cumulative_goalie_stats(goalie_stats):
+    """
+    Arguments:
+        goalie_stats - Goalie stats table (game_goalie_stats), one row per goalie per game
+    Returns:
+        Cumulative goalie stats per player and season including
+        goalieConsecutiveGames, like cum_goalie_stats in the notebook
+    """
+    goalie_stats = ids_to_str(goalie_stats)
+    goalie_stats["season"] = add_season(goalie_stats)
+    goalie_stats["gamesPlayed"] = 1
+    goalie_num_vars = _num_vars(goalie_stats)
+
+    # creating cumulative totals for the goalie stats
+    cum_goalie_num_stats = goalie_stats \
+        .groupby(by=['playerID', 'season'])[goalie_num_vars] \
+        .cumsum()
+    cum_goalie_stats = pd.concat([goalie_stats.drop(columns=goalie_num_vars), cum_goalie_num_stats], axis="columns")
+    cum_goalie_stats[save_percentages] = cum_goalie_stats[save_percentages].fillna(value=0).apply(lambda x: x/cum_goalie_stats["gamesPlayed"])
+
+    # number of team goalie rows in a row with the same goalie as the one before, starting at 0
+    keys = [cum_goalie_stats.teamID, cum_goalie_stats.season]
+    same_goalie = cum_goalie_stats.playerID == cum_goalie_stats.groupby(['teamID', 'season']).playerID.shift(1)
+    cum_goalie_stats["goalieConsecutiveGames"] = streak(same_goalie, keys)
+    return(cum_goalie_stats)
+
+
+def lagged_team_stats(cum_team_stats, cum_player_stats=None):
+    """
+    Arguments:
+        cum_team_stats - Output of cumulative_team_stats
+        cum_player_stats - Optional output of cumulative_player_stats. Adds the
+                           number of hot players each team had after each game.
+    Returns:
+        Team stats going into each game, i.e. the cumulative stats shifted
+        back one game within each team and season. The first game of each
+        team's season is dropped. Like proper_team_stats in the notebook.
+    """
+    if cum_player_stats is not None:
+        # counting the number of hot players each team has after each game
+        game_hot_players = cum_player_stats \
+            .groupby(["gameID", "teamID", "season"])['hotPlayer'] \
+            .sum() \
+            .reset_index()
+        cum_team_stats = pd.merge(cum_team_stats, game_hot_players, on=["gameID", "teamID", "season"])
+    cum_team_num_vars = _num_vars(cum_team_stats)
+    shifted_team_stats = cum_team_stats.groupby(['teamID', "season"])[cum_team_num_vars].shift(1)
+    short_team_stats = cum_team_stats.drop(columns=cum_team_num_vars)
+    return(pd.concat([short_team_stats, shifted_team_stats], axis="columns").dropna())
+
+
+def build_prediction_df(game_results, team_stats_game, player_stats=None):
+    """
+    Arguments:
+        game_results - Game results table (game_results)
+        team_stats_game - Team stats table (game_team_stats)
+        player_stats - Optional skater stats table (game_player_stats) for the
+                       hotPlayer feature
+    Returns:
+        Modeling dataset with one row per game: gameID, season, homeTeamWin,
+        venue and the home minus away team stats going into the game. Same as
+        prediction_df in the notebook.
+    Example:
+        prediction_df = build_prediction_df(game_results, team_stats_game, player_stats)
+    """
+    cum_team_stats = cumulative_team_stats(team_stats_game)
+    cum_player_stats = cumulative_player_stats(player_stats) if player_stats is not None else None
+    proper_team_stats = lagged_team_stats(cum_team_stats, cum_player_stats)
+    cum_team_num_vars = _num_vars(proper_team_stats)
+
+    home_team = proper_team_stats.query("homeAway == 'home'").sort_values('gameID').reset_index(drop=True)
+    away_team = proper_team_stats.query("homeAway == 'away'").sort_values('gameID').reset_index(drop=True)
+    full_gameID_stats = pd.merge(home_team.gameID, away_team.gameID, how="inner")
+    full_gameID_stats['gameID'] = full_gameID_stats.gameID.astype(str)
+    home_team_clean = pd.merge(home_team, full_gameID_stats, how="inner", on="gameID")
+    away_team_clean = pd.merge(away_team, full_gameID_stats, how="inner", on="gameID")
+    prior_game_stats = pd.concat([full_gameID_stats, home_team_clean[cum_team_num_vars].subtract(away_team_clean[cum_team_num_vars])], axis="columns")
+
+    game_results = ids_to_str(game_results)
+    game_results["season"] = add_season(game_results)
+    prediction_df = pd.merge(game_results.filter(items=['gameID', 'season', "homeTeamWin", "venue"]), prior_game_stats, how = "inner", on="gameID")
+    prediction_df['homeTeamWin'] = prediction_df.homeTeamWin.astype(int)
+    prediction_df = prediction_df.drop(columns = ["gamesLost", "gamesPlayed"]).copy()
+    return(prediction_df)
@@ -0,0 +1,284 @@
+import collections
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+try:
+    from .cache import FeedCache, CacheMissError, loads
+    from .retry import RetryPolicy, AdaptiveConcurrency, RetryQueue, classify, overload_errors
+    from .telemetry import get_telemetry
+except ImportError:
+    from cache import FeedCache, CacheMissError, loads
+    from retry import RetryPolicy, AdaptiveConcurrency, RetryQueue, classify, overload_errors
+    from telemetry import get_telemetry
+
+# default API the scrapers talk to. Can be pointed at a local stub server
+base_api = "https://statsapi.web.nhl.com"
+
+
+# simple per-host rate limiter. Spaces requests to the same host at least
+# 1/requests_per_second apart across all of the worker threads, and holds every
+# request to a host back while it's paused, e.g. for a 429's Retry-After
+class RateLimiter:
+    def __init__(self, requests_per_second=None):
+        self.requests_per_second = requests_per_second
+        self._next_time = {}
+        self._lock = threading.Lock()
+
+    def wait(self, host):
+        """
+        Returns:
+            Seconds slept before the request could go out
+        """
+        with self._lock:
+            now = time.monotonic()
+            scheduled = max(now, self._next_time.get(host, now))
+            if self.requests_per_second:
+                self._next_time[host] = scheduled + 1.0 / self.requests_per_second
+        if scheduled > now:
+            time.sleep(scheduled - now)
+        return(max(0.0, scheduled - now))
+
+    def pause(self, host, seconds):
+        with self._lock:
+            resume = time.monotonic() + seconds
+            self._next_time[host] = max(resume, self._next_time.get(host, resume))
+
+
+class Fetcher:
+    """
+    Arguments:
+        base_api - Base url of the API. Character. Defaults to the NHL statsapi
+        max_workers - Maximum number of requests in flight at once. Integer.
+        requests_per_second - Optional cap on requests per second per host.
+        timeout - Seconds to wait on a single request before giving up.
+        cache - Optional FeedCache, or a directory to create one in. Responses
+                are read from it first and saved to it after downloading.
+        offline - Replay mode. If True only the cache is used and a link that
+                  isn't cached raises CacheMissError instead of hitting the API.
+        telemetry - Telemetry every request and cache lookup is recorded in.
+                    Defaults to the shared one from get_telemetry.
+        retry - RetryPolicy for failed requests. Defaults to RetryPolicy(), up
+                to 4 retries of 429s, 5xx, timeouts and connection errors.
+        adaptive - Whether to let an AdaptiveConcurrency controller cut the
+                   requests in flight below max_workers while the API throttles
+                   and grow them back once it's healthy again.
+    Returns:
+        Object holding a pooled keep-alive requests.Session and a thread pool
+        used to download many API links concurrently. Items that still failed
+        after every retry are kept in retry_queue.
+    Example:
+        fetcher = Fetcher(max_workers=16, requests_per_second=20)
+        for link, feed, error in fetcher.get_many(["/api/v1/game/2019020001/feed/live/"]):
+            print(link, error)
+    """
+    def __init__(self, base_api=base_api, max_workers=8, requests_per_second=None, timeout=30,
+                 cache=None, offline=False, telemetry=None, retry=None, adaptive=True):
+        self.base_api = base_api.rstrip("/")
+        self.telemetry = telemetry if telemetry is not None else get_telemetry()
+        self.cache = FeedCache(cache) if isinstance(cache, str) else cache
+        self.offline = offline
+        if offline and self.cache is None:
+            raise ValueError("A cache is needed to run in offline mode.")
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.rate_limiter = RateLimiter(requests_per_second)
+        self.retry = retry if retry is not None else RetryPolicy()
+        self.concurrency = AdaptiveConcurrency(max_workers) if adaptive else None
+        self.retry_queue = RetryQueue()
+        # one connection pool per host, sized so every worker can keep a connection alive
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._executor = None
+
+    def url(self, link):
+        if link.startswith("http://") or link.startswith("https://"):
+            return(link)
+        return(self.base_api + link)
+
+    def get_json(self, link, cache=True):
+        """
+        Arguments:
+            link - API link, relative to base_api, or a full url. Character.
+            cache - Whether to use the cache for this link. False for responses
+                    that are only used to build something else that is cached.
+        Returns:
+            The decoded JSON response, from the cache if possible. Retryable
+            failures are retried following the retry policy, after which an
+            exception from requests is raised for connection errors and bad
+            status codes, or CacheMissError in offline mode.
+        """
+        return(self._get(link, cache, text=False))
+
+    def get_text(self, link, cache=True):
+        """
+        Arguments:
+            link - Link relative to base_api, or a full url, e.g. an HTML page. Character.
+            cache - Whether to use the cache for this link.
+        Returns:
+            The response body as text, cached, retried and raising the same way
+            as get_json
+        Example:
+            html = fetcher.get_text("https://www.spotrac.com/nhl/san-jose-sharks/cap/2018/")
+        """
+        return(self._get(link, cache, text=True))
+
+    def _get(self, link, cache, text):
+        telemetry = self.telemetry
+        cache = self.cache if cache else None
+        if cache is not None:
+            with telemetry.stage("cache"):
+                data = cache.get(link, ignore_ttl=self.offline, text=text)
+            telemetry.record_cache(link, data is not None)
+            if data is not None:
+                return(data)
+        if self.offline:
+            raise CacheMissError(link)
+        url = self.url(link)
+        host = urlparse(url).netloc
+        attempt = 0
+        while True:
+            try:
+                content = self._request(link, url, host)
+                break
+            except requests.RequestException as error:
+                if not self.retry.should_retry(error, attempt):
+                    raise
+                wait = self.retry.retry_after(error)
+                if wait:
+                    # everyone backs off from the host, not just this thread
+                    self.rate_limiter.pause(host, wait)
+                delay = self.retry.delay(attempt, error)
+                telemetry.record_retry(link)
+                telemetry.add_stage("backoff", delay)
+                time.sleep(delay)
+                attempt += 1
+        with telemetry.stage("parse"):
+            data = content.decode("utf-8", errors="replace") if text else loads(content)
+        if cache is not None:
+            with telemetry.stage("cache"):
+                cache.put(link, data, text=text)
+        return(data)
+
+    def _request(self, link, url, host):
+        # one attempt at downloading the link. Returns the response body, raises
+        # for connection errors and bad status codes
+        telemetry = self.telemetry
+        throttled = self.rate_limiter.wait(host)
+        if throttled:
+            telemetry.add_stage("throttle", throttled)
+        if self.concurrency is not None:
+            self.concurrency.acquire()
+        healthy = False
+        start = time.perf_counter()
+        try:
+            try:
+                response = self.session.get(url, timeout=self.timeout)
+                content = response.content
+            except requests.RequestException as error:
+                seconds = time.perf_counter() - start
+                telemetry.add_stage("fetch", seconds)
+                telemetry.record_request(link, seconds, error=True)
+                healthy = classify(error) not in overload_errors
+                raise
+            seconds = time.perf_counter() - start
+            telemetry.add_stage("fetch", seconds)
+            telemetry.record_request(link, seconds, response.status_code, len(content), error=not response.ok)
+            try:
+                response.raise_for_status()
+            except requests.HTTPError as error:
+                healthy = classify(error) not in overload_errors
+                raise
+            healthy = True
+            return(content)
+        finally:
+            if self.concurrency is not None:
+                self.concurrency.release(healthy)
+                telemetry.set_gauge("concurrency_limit", int(self.concurrency.limit))
+
+    @staticmethod
+    def _safe_call(function, item):
+        try:
+            return(function(item), None)
+        except Exception as error:
+            return(None, error)
+
+    def get_many(self, links):
+        """
+        Arguments:
+            links - Iterable of API links. Characters.
+        Returns:
+            Generator of (link, json, error) tuples in the same order as links.
+            json is None and error holds the exception if a request failed.
+            Only about 2*max_workers responses are held in memory at a time.
+        """
+        return(self.map(self.get_json, links))
+
+    def map(self, function, items):
+        """
+        Arguments:
+            function - Function of one item that makes the requests, e.g. get_json
+            items - Iterable of arguments for function
+        Returns:
+            Generator of (item, result, error) tuples in the same order as items,
+            run on the fetcher's thread pool with at most about 2*max_workers
+            results held at a time. result is None and error holds the
+            exception if function raised.
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        pending = collections.deque()
+        for item in items:
+            pending.append((item, self._executor.submit(self._safe_call, function, item)))
+            if len(pending) >= 2 * self.max_workers:
+                item, future = pending.popleft()
+                yield((item,) + future.result())
+        while pending:
+            item, future = pending.popleft()
+            yield((item,) + future.result())
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        self.session.close()
+
+
+# module level fetcher shared by all of the scraping functions
+_fetcher = None
+
+
+def get_fetcher():
+    """
+    Returns:
+        The shared Fetcher, creating one with the default settings if needed
+    """
+    global _fetcher
+    if _fetcher is None:
+        _fetcher = Fetcher()
+    return(_fetcher)
+
+
+def configure(**kwargs):
+    """
+    Arguments:
+        **kwargs - Any of the Fetcher arguments, e.g. base_api, max_workers,
+                   requests_per_second, timeout, cache, offline, telemetry,
+                   retry, adaptive
+    Returns:
+        The new shared Fetcher used by all of the scraping functions
+    Example:
+        # point the scrapers at a local stub server with 4 workers
+        configure(base_api="http://localhost:8000", max_workers=4)
+        # rebuild tables only from previously downloaded feeds
+        configure(cache="data/cache", offline=True)
+    """
+    global _fetcher
+    if _fetcher is not None:
+        _fetcher.close()
+    _fetcher = Fetcher(**kwargs)
+    return(_fetcher)
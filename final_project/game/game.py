@@ -1,7 +1,39 @@
 import pandas as pd
-import functools
-import requests
+import os
+import time
+# relative import when used as part of the game package, plain import when the
+# scripts are run from inside this directory
+try:
+    from .fetch import get_fetcher, configure
+    from .cache import is_final, CacheMissError
+    from .retry import classify, is_retryable, NOT_FOUND
+    from .schedule import get_schedule, game_type_codes
+    from . import storage
+    from . import schema
+    from . import events as events_module
+except ImportError:
+    from fetch import get_fetcher, configure
+    from cache import is_final, CacheMissError
+    from retry import classify, is_retryable, NOT_FOUND
+    from schedule import get_schedule, game_type_codes
+    import storage
+    import schema
+    import events as events_module
 example_game_url = "http://statsapi.web.nhl.com/api/v1/game/2017020100/feed/live"
+# names of the tables that can be built from a single game feed
+table_names = ["game_results", "game_officials", "game_team_stats", "game_player_stats", "game_goalie_stats"]
+# columns of each table, in the order they are saved. The fields themselves are
+# declared in schema.py
+table_columns = schema.columns
+# descriptions used in the save messages for each table
+table_descriptions = {
+    "game_results": "Game results",
+    "game_officials": "Game officials",
+    "game_team_stats": "Team game statistics",
+    "game_player_stats": "Player game statistics",
+    "game_goalie_stats": "Goalie game statistics",
+    "game_events": "Play-by-play events"
+}
 
 # helper function to see the structure of the JSON in the different levels
 def print_game_keys(game, level=0):
@@ -13,6 +45,420 @@ def print_game_keys(game, level=0):
         else:
             print(" "* level, key)
 
+
+# helper function to get the list of game IDs to loop through for a season
+def season_game_ids(season, game_types=("02",)):
+    """
+    Arguments:
+        season - Start of a particular season. Character. Example: "2017"
+                 for the 2017/2018 season
+        game_types - Game ID type codes to include. "02" for the regular season,
+                     "03" for the playoffs. Defaults to the regular season.
+    Returns:
+        List of game IDs for the season from the season schedule. Example:
+        ["2017020001", ...]. Falls back to the usual regular season game
+        ranges if the schedule can't be downloaded.
+    """
+    try:
+        return(get_schedule(season, game_types).gameID.to_list())
+    except Exception:
+        if tuple(game_types) != ("02",):
+            raise
+        print(f"Schedule for %s not found, guessing the game IDs" % season)
+    if int(season) == 2012:
+        game_range = list(range(1, 721))
+    elif int(season) == 2019:
+        game_range = list(range(1, 1083))
+    elif int(season) == 2020:
+        game_range = list(range(1, 869))
+    elif int(season) >= 2017:
+        game_range = list(range(1, 1272))
+    else:
+        game_range = list(range(1, 1231))
+    return [str(season) + "02" + str(game).zfill(4) for game in game_range]
+
+
+# helper function to download the full live feed JSON for a single game
+def get_game_feed(game):
+    """
+    Arguments:
+        game - Game ID for a particular game. Character. Example: "2017020001"
+    Returns:
+        The /feed/live JSON for the game as a dictionary. Raises an exception
+        from requests if the game can't be downloaded.
+    """
+    return(get_fetcher().get_json(game_link(game)))
+
+
+def game_link(game):
+    return(f"/api/v1/game/%s/feed/live/" % game)
+
+
+# cache key of the slim feed built from the /boxscore and /linescore endpoints.
+# Not a real API link, it's only used in the cache
+def slim_link(game):
+    return(f"/api/v1/game/%s/feed/slim/" % game)
+
+
+def slim_feed(game, boxscore, linescore, schedule_game=None):
+    """
+    Arguments:
+        game - Game ID. Character.
+        boxscore - /api/v1/game/<id>/boxscore JSON. Dictionary.
+        linescore - /api/v1/game/<id>/linescore JSON. Dictionary.
+        schedule_game - Optional row of get_schedule for the game (Series or
+                        dictionary) for the season, date, game type and venue
+    Returns:
+        Dictionary shaped like the /feed/live JSON with only the parts the
+        extractors read (gameData teams/status/venue, liveData boxscore and
+        linescore), so every extract_* function works on it unchanged. There
+        is no play-by-play.
+    """
+    game = str(game)
+    schedule_game = schedule_game if schedule_game is not None else {}
+    # the linescore says when the game is over even if the schedule was downloaded before it ended
+    if linescore.get('currentPeriodTimeRemaining') == "Final":
+        state = "Final"
+    else:
+        state = schedule_game.get('state') or "Live"
+    teams = {team: {'id': boxscore['teams'][team]['team']['id'], 'name': boxscore['teams'][team]['team']['name']}
+             for team in ['home', 'away']}
+    return({
+        'gamePk': int(game),
+        'gameData': {
+            'game': {'pk': int(game),
+                     'season': schedule_game.get('season') or game[0:4] + str(int(game[0:4]) + 1),
+                     'type': schedule_game.get('gameType') or game_type_codes.get(game[4:6])},
+            'datetime': {'dateTime': schedule_game.get('dateTime')},
+            'status': {'abstractGameState': state},
+            'teams': teams,
+            'venue': {'name': schedule_game.get('venue')}
+        },
+        'liveData': {
+            'linescore': {key: value for key, value in linescore.items() if key != "copyright"},
+            'boxscore': {key: value for key, value in boxscore.items() if key != "copyright"}
+        }
+    })
+
+
+def get_slim_feed(game, schedule_game=None):
+    """
+    Arguments:
+        game - Game ID for a particular game. Character. Example: "2017020001"
+        schedule_game - Optional row of get_schedule for the game
+    Returns:
+        The slim_feed for the game built from the /boxscore and /linescore
+        endpoints, which are a small fraction of the size of /feed/live since
+        they leave out the play-by-play. The built feed is what's cached.
+    """
+    fetcher = get_fetcher()
+    if fetcher.cache is not None:
+        with fetcher.telemetry.stage("cache"):
+            feed = fetcher.cache.get(slim_link(game), ignore_ttl=fetcher.offline)
+        fetcher.telemetry.record_cache(slim_link(game), feed is not None)
+        if feed is not None:
+            return(feed)
+    if fetcher.offline:
+        raise CacheMissError(slim_link(game))
+    boxscore = fetcher.get_json(f"/api/v1/game/%s/boxscore" % game, cache=False)
+    linescore = fetcher.get_json(f"/api/v1/game/%s/linescore" % game, cache=False)
+    feed = slim_feed(game, boxscore, linescore, schedule_game)
+    if fetcher.cache is not None:
+        fetcher.cache.put(slim_link(game), feed)
+    return(feed)
+
+
+# the extractors below take an already downloaded game feed so one download
+# can be used to build every table. The fields of each table are declared once
+# in schema.py
+def extract_game_result(game):
+    """
+    Arguments:
+        game - /feed/live JSON for a game. Dictionary.
+    Returns:
+        List with a single dictionary of the game result
+    """
+    return(schema.extract_rows("game_results", game))
+
+
+def extract_game_officials(game):
+    """
+    Arguments:
+        game - /feed/live JSON for a game. Dictionary.
+    Returns:
+        List of dictionaries, one for each official in the game
+    """
+    return(schema.extract_rows("game_officials", game))
+
+
+def extract_team_stats(game):
+    """
+    Arguments:
+        game - /feed/live JSON for a game. Dictionary.
+    Returns:
+        List of dictionaries of team stats. One for home, one for away.
+    """
+    return(schema.extract_rows("game_team_stats", game))
+
+
+def extract_player_stats(game):
+    """
+    Arguments:
+        game - /feed/live JSON for a game. Dictionary.
+    Returns:
+        List of dictionaries of skater stats, one for each skater that played in the game
+    """
+    return(schema.extract_rows("game_player_stats", game))
+
+
+def extract_goalie_stats(game):
+    """
+    Arguments:
+        game - /feed/live JSON for a game. Dictionary.
+    Returns:
+        List of dictionaries of goalie stats, one for each goalie that played in the game
+    """
+    return(schema.extract_rows("game_goalie_stats", game))
+
+
+# which extractor builds which table
+extractors = {
+    "game_results": extract_game_result,
+    "game_officials": extract_game_officials,
+    "game_team_stats": extract_team_stats,
+    "game_player_stats": extract_player_stats,
+    "game_goalie_stats": extract_goalie_stats
+}
+
+
+# generator used by all of the season functions. Downloads each game once,
+# several at a time through the shared fetcher, and yields the rows from the
+# requested extractors in game order
+def _season_rows(season, tables, game_types=("02",), slim=False):
+    for game_id, game in _season_feeds(season, game_types, slim):
+        yield(extract_tables(game, tables))
+
+
+def _season_feeds(season, game_types=("02",), slim=False):
+    schedule = None
+    if slim:
+        try:
+            schedule = get_schedule(season, game_types)
+        except Exception:
+            pass
+    return(get_game_feeds(season_game_ids(season, game_types), slim, schedule))
+
+
+def _report_failure(game_id, error):
+    if classify(error) == NOT_FOUND:
+        print(f"Game %s not found" % game_id)
+    else:
+        print(f"Game %s failed (%s): %s" % (game_id, classify(error), error))
+
+
+def get_game_feeds(game_ids, slim=False, schedule=None, retry_rounds=1):
+    """
+    Arguments:
+        game_ids - List of game IDs to download. Characters.
+        slim - Download the /boxscore and /linescore endpoints instead of the
+               full /feed/live, see get_slim_feed
+        schedule - Optional get_schedule DataFrame. Used by the slim feeds for
+                   the game date, type and venue.
+        retry_rounds - Extra passes at the end over the games that still failed
+                       with a retryable error (429, 5xx, timeout) after the
+                       fetcher's own retries. Integer.
+    Returns:
+        Generator of (game_id, feed) tuples in game order, followed by the games
+        that only came through in a retry round. Games that don't exist are
+        skipped, and games that still can't be downloaded are left in the
+        fetcher's retry_queue with their last error.
+    """
+    fetcher = get_fetcher()
+    if slim:
+        schedule_games = {} if schedule is None else {
+            str(game['gameID']): game for game in schedule.to_dict("records")}
+
+        def fetch(game_id):
+            return(get_slim_feed(game_id, schedule_games.get(str(game_id))))
+    else:
+        def fetch(game_id):
+            return(fetcher.get_json(game_link(game_id)))
+    failed = []
+    for game_id, game, error in fetcher.map(fetch, game_ids):
+        if error is None:
+            fetcher.retry_queue.discard(game_id)
+            yield(game_id, game)
+            continue
+        _report_failure(game_id, error)
+        if classify(error) != NOT_FOUND:
+            fetcher.retry_queue.add(game_id, error)
+            failed.append((game_id, error))
+    # by now the API has had the rest of the season to recover from whatever
+    # throttling or outage these games ran into
+    for _ in range(retry_rounds):
+        retry_ids = [game_id for game_id, error in failed if is_retryable(error)]
+        if not retry_ids:
+            break
+        time.sleep(fetcher.retry.delay(fetcher.retry.max_retries))
+        print(len(retry_ids), "games being retried")
+        failed = []
+        for game_id, game, error in fetcher.map(fetch, retry_ids):
+            if error is None:
+                fetcher.retry_queue.discard(game_id)
+                yield(game_id, game)
+            elif classify(error) == NOT_FOUND:
+                # the game doesn't exist after all, there's nothing left to retry
+                _report_failure(game_id, error)
+                fetcher.retry_queue.discard(game_id)
+            else:
+                fetcher.retry_queue.add(game_id, error)
+                failed.append((game_id, error))
+    if len(fetcher.retry_queue):
+        print(len(fetcher.retry_queue), "games couldn't be downloaded and are in the retry queue")
+
+
+def get_game_tables(game_ids, tables=None, slim=False, schedule=None):
+    """
+    Arguments:
+        game_ids - List of game IDs to download. Characters.
+        tables - Optional list of table names to build. Defaults to all of
+                 the tables in table_names
+        slim - Download the /boxscore and /linescore endpoints instead of the
+               full /feed/live, see get_slim_feed
+        schedule - Optional get_schedule DataFrame. Used by the slim feeds for
+                   the game date, type and venue.
+    Returns:
+        Generator of (game_id, final, rows) tuples in game order, where final
+        says whether the game was over and rows maps each table name to the
+        list of rows for that game. Games that can't be downloaded are skipped,
+        see get_game_feeds for how failures are retried.
+    """
+    for game_id, game in get_game_feeds(game_ids, slim, schedule):
+        yield(game_id, is_final(game), extract_tables(game, tables))
+
+
+def extract_tables(game, tables=None):
+    """
+    Arguments:
+        game - /feed/live JSON for a game. Dictionary.
+        tables - Optional list of table names to build. Defaults to all of
+                 the tables in table_names
+    Returns:
+        Dictionary mapping each table name to the list of rows for the game.
+        A table that can't be built from the feed gets an empty list so the
+        other tables for the game are still kept.
+    """
+    rows = {}
+    with get_fetcher().telemetry.stage("flatten"):
+        for table in tables or table_names:
+            try:
+                rows[table] = extractors[table](game)
+            except Exception:
+                print(f"Game %s missing data for %s" % (game.get('gamePk'), table))
+                rows[table] = []
+    return(rows)
+
+
+def get_season_all(season, tables=None, game_types=("02",), slim=False):
+    """
+    Arguments:
+        season - Start of a particular season. Character. Example: "2017"
+                 for the 2017/2018 season
+        tables - Optional list of table names to build. Defaults to all of
+                 the tables in table_names
+        game_types - Game ID type codes to include. "02" for the regular season,
+                     "03" for the playoffs. Defaults to the regular season.
+        slim - Download the small /boxscore and /linescore endpoints instead of
+               the full /feed/live, see get_slim_feed
+    Returns:
+        Generator of dictionaries, one per game, mapping each table name to
+        the list of rows for that game. Every game feed is only downloaded once.
+    Example:
+        for rows in get_season_all("2019"):
+            rows["game_results"]
+    """
+    return _season_rows(season, tables or table_names, game_types, slim)
+
+
+def get_season_tables(season, tables=None, game_types=("02",), slim=False, events=False):
+    """
+    Arguments:
+        season - Start of a particular season. Character. Example: "2017"
+                 for the 2017/2018 season
+        tables - Optional list of table names to build. Defaults to all of
+                 the tables in table_names
+        game_types - Game ID type codes to include. "02" for the regular season,
+                     "03" for the playoffs. Defaults to the regular season.
+        slim - Download the small /boxscore and /linescore endpoints instead of
+               the full /feed/live, see get_slim_feed
+        events - Also build the play-by-play game_events table (see events.py)
+                 and add the Corsi and Fenwick shot attempt counts to
+                 game_team_stats. Needs the full feeds.
+    Returns:
+        Dictionary of DataFrames, one for each table, for all of the games of
+        the requested types in the season. Each game is downloaded once for all of the tables.
+    Example:
+        import pandas as pd
+        import requests
+        # takes a few minutes to run
+        season_tables = get_season_tables("2019")
+        season_tables["game_results"]
+    """
+    if events and slim:
+        raise ValueError("The play-by-play is only in the full feeds, events needs slim=False.")
+    # appending straight into typed columns instead of keeping a dictionary per row
+    builder = schema.TableBuilder(tables or table_names)
+    event_builder = events_module.EventBuilder() if events else None
+    telemetry = get_fetcher().telemetry
+    for game_id, game in _season_feeds(season, game_types, slim):
+        with telemetry.stage("flatten"):
+            failed = builder.add(game)
+            if event_builder is not None:
+                try:
+                    event_builder.add(game)
+                except Exception:
+                    failed.append("game_events")
+        for table in failed:
+            print(f"Game %s missing data for %s" % (game.get('gamePk'), table))
+    with telemetry.stage("flatten"):
+        season_tables = builder.to_frames()
+        if event_builder is not None:
+            season_tables["game_events"] = event_builder.to_frame()
+            if "game_team_stats" in season_tables:
+                season_tables["game_team_stats"] = events_module.add_shot_attempts(
+                    season_tables["game_team_stats"], season_tables["game_events"])
+    return(season_tables)
+
+
+def write_season_tables(season_tables, data_dir, year, parquet_dir=None):
+    """
+    Arguments:
+        season_tables - Dictionary of DataFrames from get_season_tables
+        data_dir - Directory to save the CSVs in. Character.
+        year - Start of the season the tables are for. Integer.
+        parquet_dir - Optional directory of the season partitioned Parquet
+                      datasets to also save the tables to (needs pyarrow).
+    Returns:
+        Nothing. Saves one CSV per table, e.g. game_results_2019.csv. The
+        play-by-play is only saved to Parquet when there is a parquet_dir.
+    """
+    for table in season_tables:
+        if table == "game_events" and parquet_dir is not None:
+            # a season of plays is ~400k rows, kept only in its compact column types
+            with get_fetcher().telemetry.stage("write"):
+                events_module.write_events(season_tables[table], parquet_dir)
+            print(table_descriptions[table] + " from the " + str(year) + "/" + str(year+1) + " season saved to the Parquet dataset in\n" + os.path.join(parquet_dir, table) + "\n", sep='')
+            continue
+        file_name = data_dir + table + "_" + str(year) + ".csv"
+        with get_fetcher().telemetry.stage("write"):
+            season_tables[table].to_csv(file_name, index=False)
+        print(table_descriptions[table] + " from the " + str(year) + "/" + str(year+1) + " season saved in the directory below\n" + file_name + "\n", sep='')
+        if parquet_dir is not None and len(season_tables[table]):
+            with get_fetcher().telemetry.stage("write"):
+                storage.write_table(season_tables[table], table, parquet_dir)
+            print(table_descriptions[table] + " also saved to the Parquet dataset in\n" + os.path.join(parquet_dir, table) + "\n", sep='')
+
+
 # function to pull player data/statistics. Collected from the NHL statsapi
 def get_game_result(game):
     """
@@ -21,36 +467,16 @@ def get_game_result(game):
                  for the 2017/2018 season
     Returns:
         Single game results based on input game_id
-    Example: 
+    Example:
         import pandas as pd
         import requests
-        
+
         pd.DataFrame(get_game_result("2019020300"))
     """
-    # setting the base API url for use throughout
-    base_api = "https://statsapi.web.nhl.com"
-    game_link = f"/api/v1/game/%s/feed/live"% game
-    # getting the full list of teams
     try:
-        game_url = requests.get(base_api + game_link)
-        game_url.raise_for_status()
-        game = game_url.json()
-        data = {}
-        data['gameID'] = game['gamePk']
-        data['season'] = game['gameData']['game']['season']
-        data['dateTime'] = game['gameData']["datetime"]["dateTime"]
-        data['gameType'] = game['gameData']['game']['type']
-        data['homeTeamID'] = game['gameData']['teams']['home']['id']
-        data['homeTeamName'] = game['gameData']['teams']['home']['name']
-        data['awayTeamID'] = game['gameData']['teams']['away']['id']
-        data['awayTeamName'] = game['gameData']['teams']['away']['name']
-        data['homeGoals'] = game['liveData']['linescore']['teams']['home']['goals']
-        data['awayGoals'] = game['liveData']['linescore']['teams']['away']['goals']
-        data['homeTeamWin'] = game['liveData']['linescore']['teams']['home']['goals'] > game['liveData']['linescore']['teams']['away']['goals']
-        data['venue'] = game['gameData']['venue']['name']
-        return(data)
-    except:
-        print(f"Game %s not found" % game_link)
+        return(extract_game_result(get_game_feed(game))[0])
+    except Exception as error:
+        _report_failure(game, error)
 
 
 def get_season_game_results(season):
@@ -60,49 +486,14 @@ def get_season_game_results(season):
                  for the 2017/2018 season
     Returns:
         All regular season game results for a specified season
-    Example: 
+    Example:
         import pandas as pd
         import requests
         # takes a few minutes to run
         pd.DataFrame(get_season_game_results("2019"))
     """
-    # setting the base API url for use throughout
-    if int(season) == 2012:
-        game_range = list(range(1, 721))
-    elif int(season) == 2019:
-        game_range = list(range(1, 1083))
-    elif int(season) == 2020:
-        game_range = list(range(1, 869))
-    elif int(season) >= 2017:
-        game_range = list(range(1, 1272))
-    else:
-        game_range = list(range(1, 1231))
-    for game in game_range:
-        game_id = str(game).zfill(4)
-        base_api = "https://statsapi.web.nhl.com"
-        game_link = f"/api/v1/game/%s/feed/live/"% (season + "02" + game_id)
-        # getting the full list of teams
-        try:
-            game_url = requests.get(base_api + game_link)
-            game_url.raise_for_status()
-            game = game_url.json()
-            data = {}
-            data['gameID'] = game['gamePk']
-            data['season'] = game['gameData']['game']['season']
-            data['dateTime'] = game['gameData']["datetime"]["dateTime"]
-            data['gameType'] = game['gameData']['game']['type']
-            data['homeTeamID'] = game['gameData']['teams']['home']['id']
-            data['homeTeamName'] = game['gameData']['teams']['home']['name']
-            data['awayTeamID'] = game['gameData']['teams']['away']['id']
-            data['awayTeamName'] = game['gameData']['teams']['away']['name']
-            data['homeGoals'] = game['liveData']['linescore']['teams']['home']['goals']
-            data['awayGoals'] = game['liveData']['linescore']['teams']['away']['goals']
-            data['homeTeamWin'] = game['liveData']['linescore']['teams']['home']['goals'] > game['liveData']['linescore']['teams']['away']['goals']
-            data['venue'] = game['gameData']['venue']['name']
-            yield(data)
-        except: 
-            print(f"Game %s not found" % (season + "02" + game_id))
-            continue
+    for rows in _season_rows(season, ["game_results"]):
+        yield from rows["game_results"]
 
 
 def get_game_officials(season):
@@ -112,43 +503,16 @@ def get_game_officials(season):
                  for the 2017/2018 season
     Returns:
         All regular season game officials for a specified season
-    Example: 
+    Example:
         import pandas as pd
         import requests
         # takes a few minutes to run
         pd.DataFrame(get_game_officials("2019"))
     """
-    # setting the base API url for use throughout
-    if int(season) == 2012:
-        game_range = list(range(1, 721))
-    elif int(season) == 2019:
-        game_range = list(range(1, 1083))
-    elif int(season) == 2020:
-        game_range = list(range(1, 869))
-    elif int(season) >= 2017:
-        game_range = list(range(1, 1272))
-    else:
-        game_range = list(range(1, 1231))
-    for game in game_range:
-        game_id = str(game).zfill(4)
-        base_api = "https://statsapi.web.nhl.com"
-        game_link = f"/api/v1/game/%s/feed/live/"% (season + "02" + game_id)
-        # getting the full list of teams
-        try:
-            game_url = requests.get(base_api + game_link)
-            game_url.raise_for_status()
-            game = game_url.json()
-            for i in range(len(game['liveData']['boxscore']['officials'])):
-                data = {}
-                data['gameID'] = game['gamePk']
-                data['officialName'] = game['liveData']['boxscore']['officials'][i]['official']['fullName']
-                data['officialType'] = game['liveData']['boxscore']['officials'][i]['officialType']
-                yield(data)
-        except:
-            print(f"Game %s not found" % (season + "02" + game_id))
-            continue
+    for rows in _season_rows(season, ["game_officials"]):
+        yield from rows["game_officials"]
+
 
-            
 def get_team_stats_season(season):
     """
     Arguments:
@@ -156,47 +520,14 @@ def get_team_stats_season(season):
                  for the 2017/2018 season
     Returns:
         All regular season team stats for a specified season. One row for home, one for away.
-    Example: 
+    Example:
         import pandas as pd
         import requests
         # takes a few minutes to run
         pd.DataFrame(get_team_stats_season("2019"))
     """
-    # setting the base API url for use throughout
-    if int(season) == 2012:
-        game_range = list(range(1, 721))
-    elif int(season) == 2019:
-        game_range = list(range(1, 1083))
-    elif int(season) == 2020:
-        game_range = list(range(1, 869))
-    elif int(season) >= 2017:
-        game_range = list(range(1, 1272))
-    else:
-        game_range = list(range(1, 1231))
-    for game in game_range:
-        game_id = str(game).zfill(4)
-        base_api = "https://statsapi.web.nhl.com"
-        game_link = f"/api/v1/game/%s/feed/live/"% (season + "02" + game_id)
-        # getting the full list of teams
-        try:
-            game_url = requests.get(base_api + game_link)
-            game_url.raise_for_status()
-            game = game_url.json()
-            for team in ['home', 'away']:
-                data = {}
-                data['gameID'] = game['gamePk']
-                data['homeAway'] = team
-                data['homeTeamWin'] = game['liveData']['linescore']['teams']['home']['goals'] > game['liveData']['linescore']['teams']['away']['goals']
-                data['periodsPlayed'] = game['liveData']['linescore']['currentPeriod']
-                data['headCoach'] = game['liveData']["boxscore"]['teams'][team]['coaches'][0]['person']['fullName']
-                data['teamID'] = game['gameData']['teams'][team]['id']
-                data['teamName'] = game['gameData']['teams'][team]['name']
-                for key in game['liveData']["boxscore"]['teams'][team]['teamStats']['teamSkaterStats'].keys():
-                    data[key] = game['liveData']["boxscore"]['teams'][team]['teamStats']['teamSkaterStats'][key]
-                yield(data)
-        except: 
-            print(f"Game %s not found" % (season + "02" + game_id))
-            continue
+    for rows in _season_rows(season, ["game_team_stats"]):
+        yield from rows["game_team_stats"]
 
 
 def get_team_stats_game(game):
@@ -205,35 +536,16 @@ def get_team_stats_game(game):
         game - Game ID for a particular game. Character. Example: "2017020001"
                  for the 2017/2018 season
         All regular season game results for a specified season
-    Example: 
+    Example:
         import pandas as pd
         import requests
         # takes a few minutes to run
         pd.DataFrame(get_team_stats_game("2017020001"))
     """
-    # setting the base API url for use throughout
-    
-    base_api = "https://statsapi.web.nhl.com"
-    game_link = f"/api/v1/game/%s/feed/live/"% game
-    # getting the full list of teams
     try:
-        game_url = requests.get(base_api + game_link)
-        game_url.raise_for_status()
-        game = game_url.json()
-        for team in ['home', 'away']:
-            data = {}
-            data['gameID'] = game['gamePk']
-            data['homeAway'] = team
-            data['homeTeamWin'] = game['liveData']['linescore']['teams']['home']['goals'] > game['liveData']['linescore']['teams']['away']['goals']
-            data['periodsPlayed'] = game['liveData']['linescore']['currentPeriod']
-            data['headCoach'] = game['liveData']["boxscore"]['teams'][team]['coaches'][0]['person']['fullName']
-            data['teamID'] = game['gameData']['teams'][team]['id']
-            data['teamName'] = game['gameData']['teams'][team]['name']
-            for key in game['liveData']["boxscore"]['teams'][team]['teamStats']['teamSkaterStats'].keys():
-                data[key] = game['liveData']["boxscore"]['teams'][team]['teamStats']['teamSkaterStats'][key]
-            yield(data)
-    except: 
-        print(f"Game %s not found" % game_link)
+        yield from extract_team_stats(get_game_feed(game))
+    except Exception as error:
+        _report_failure(game, error)
 
 
 def get_player_stats_game(game):
@@ -242,38 +554,16 @@ def get_player_stats_game(game):
         game - Game ID for a particular game. Character. Example: "2017020001"
                  for the 2017/2018 season
         All regular season game results for a specified season
-    Example: 
+    Example:
         import pandas as pd
         import requests
         # takes a few minutes to run
         pd.DataFrame(get_player_stats_game("2017020001"))
     """
-    base_api = "https://statsapi.web.nhl.com"
-    game_link = f"/api/v1/game/%s/feed/live/"% game
-    # getting the full list of teams
     try:
-        game_url = requests.get(base_api + game_link)
-        game_url.raise_for_status()
-        game = game_url.json()
-        for team in ['home', 'away']:
-            for player in game['liveData']["boxscore"]['teams'][team]['players']:
-                if game['liveData']["boxscore"]['teams'][team]['players'][player]['position']['code'] not in ("N/A", "G"):
-                    data = {}
-                    data['gameID'] = game['gamePk']
-                    data['playerID'] = game['liveData']["boxscore"]['teams'][team]['players'][player]['person']['id']
-                    data['fullName'] = game['liveData']["boxscore"]['teams'][team]['players'][player]['person']['fullName']
-                    data['position'] = game['liveData']["boxscore"]['teams'][team]['players'][player]['position']['code']
-                    data['homeAway'] = team
-                    data['teamID'] = game['gameData']['teams'][team]['id']
-                    data['teamName'] = game['gameData']['teams'][team]['name']
-                    if isinstance(game['liveData']["boxscore"]['teams'][team]['players'][player]['stats']['skaterStats'], dict):
-                        for key in game['liveData']["boxscore"]['teams'][team]['players'][player]['stats']['skaterStats'].keys():
-                            data[key] = game['liveData']["boxscore"]['teams'][team]['players'][player]['stats']['skaterStats'][key]
-                    yield(data)
-                else: 
-                    continue
-    except: 
-        print(f"Game %s not found" % (season + "02" + game_id))
+        yield from extract_player_stats(get_game_feed(game))
+    except Exception as error:
+        _report_failure(game, error)
 
 
 def get_player_stats_season(season):
@@ -283,51 +573,14 @@ def get_player_stats_season(season):
                  for the 2017/2018 season
     Returns:
         All regular season team stats for a specified season. One row for home, one for away.
-    Example: 
+    Example:
         import pandas as pd
         import requests
         # takes a few minutes to run
         pd.DataFrame(get_player_stats_season("2019"))
     """
-    # setting the base API url for use throughout
-    if int(season) == 2012:
-        game_range = list(range(1, 721))
-    elif int(season) == 2019:
-        game_range = list(range(1, 1083))
-    elif int(season) == 2020:
-        game_range = list(range(1, 869))
-    elif int(season) >= 2017:
-        game_range = list(range(1, 1272))
-    else:
-        game_range = list(range(1, 1231))
-    for game in game_range:
-        game_id = str(game).zfill(4)
-        base_api = "https://statsapi.web.nhl.com"
-        game_link = f"/api/v1/game/%s/feed/live/"% (season + "02" + game_id)
-        # getting the full list of teams
-        try:
-            game_url = requests.get(base_api + game_link)
-            game_url.raise_for_status()
-            game = game_url.json()
-            for team in ['home', 'away']:
-                for player in game['liveData']["boxscore"]['teams'][team]['players']:
-                    if game['liveData']["boxscore"]['teams'][team]['players'][player]['position']['code'] not in ("N/A", "G"):
-                        data = {}
-                        data['gameID'] = game['gamePk']
-                        data['playerID'] = game['liveData']["boxscore"]['teams'][team]['players'][player]['person']['id']
-                        data['fullName'] = game['liveData']["boxscore"]['teams'][team]['players'][player]['person']['fullName']
-                        data['position'] = game['liveData']["boxscore"]['teams'][team]['players'][player]['position']['code']
-                        data['homeAway'] = team
-                        data['teamID'] = game['gameData']['teams'][team]['id']
-                        data['teamName'] = game['gameData']['teams'][team]['name']
-                        if isinstance(game['liveData']["boxscore"]['teams'][team]['players'][player]['stats']['skaterStats'], dict):
-                            for key in game['liveData']["boxscore"]['teams'][team]['players'][player]['stats']['skaterStats'].keys():
-                                data[key] = game['liveData']["boxscore"]['teams'][team]['players'][player]['stats']['skaterStats'][key]
-                        yield(data)
-                    else: 
-                        continue
-        except: 
-            print(f"Game %s not found" % (season + "02" + game_id))
+    for rows in _season_rows(season, ["game_player_stats"]):
+        yield from rows["game_player_stats"]
 
 
 def get_goalie_stats_game(game):
@@ -336,38 +589,16 @@ def get_goalie_stats_game(game):
         game - Game ID for a particular game. Character. Example: "2017020001"
                  for the 2017/2018 season
         All regular season game results for a specified season
-    Example: 
+    Example:
         import pandas as pd
         import requests
         # takes a few minutes to run
         pd.DataFrame(get_goalie_stats_game("2017020001"))
     """
-    base_api = "https://statsapi.web.nhl.com"
-    game_link = f"/api/v1/game/%s/feed/live/"% game
-    # getting the full list of teams
     try:
-        game_url = requests.get(base_api + game_link)
-        game_url.raise_for_status()
-        game = game_url.json()
-        for team in ['home', 'away']:
-            for player in game['liveData']["boxscore"]['teams'][team]['players']:
-                if game['liveData']["boxscore"]['teams'][team]['players'][player]['position']['code'] == "G":
-                    data = {}
-                    data['gameID'] = game['gamePk']
-                    data['playerID'] = game['liveData']["boxscore"]['teams'][team]['players'][player]['person']['id']
-                    data['fullName'] = game['liveData']["boxscore"]['teams'][team]['players'][player]['person']['fullName']
-                    data['position'] = game['liveData']["boxscore"]['teams'][team]['players'][player]['position']['code']
-                    data['homeAway'] = team
-                    data['teamID'] = game['gameData']['teams'][team]['id']
-                    data['teamName'] = game['gameData']['teams'][team]['name']
-                    if isinstance(game['liveData']["boxscore"]['teams'][team]['players'][player]['stats']['goalieStats'], dict):
-                        for key in game['liveData']["boxscore"]['teams'][team]['players'][player]['stats']['goalieStats'].keys():
-                            data[key] = game['liveData']["boxscore"]['teams'][team]['players'][player]['stats']['goalieStats'][key]
-                    yield(data)
-                else: 
-                    continue
-    except: 
-        print("Game not found")
+        yield from extract_goalie_stats(get_game_feed(game))
+    except Exception as error:
+        _report_failure(game, error)
 
 
 def get_goalie_stats_season(season):
@@ -377,48 +608,11 @@ def get_goalie_stats_season(season):
                  for the 2017/2018 season
     Returns:
         All regular season team stats for a specified season. One row for home, one for away.
-    Example: 
+    Example:
         import pandas as pd
         import requests
         # takes a few minutes to run
         pd.DataFrame(get_goalie_stats_season("2019"))
     """
-    # setting the base API url for use throughout
-    if int(season) == 2012:
-        game_range = list(range(1, 721))
-    elif int(season) == 2019:
-        game_range = list(range(1, 1083))
-    elif int(season) == 2020:
-        game_range = list(range(1, 869))
-    elif int(season) >= 2017:
-        game_range = list(range(1, 1272))
-    else:
-        game_range = list(range(1, 1231))
-    for game in game_range:
-        game_id = str(game).zfill(4)
-        base_api = "https://statsapi.web.nhl.com"
-        game_link = f"/api/v1/game/%s/feed/live/"% (season + "02" + game_id)
-        # getting the full list of teams
-        try:
-            game_url = requests.get(base_api + game_link)
-            game_url.raise_for_status()
-            game = game_url.json()
-            for team in ['home', 'away']:
-                for player in game['liveData']["boxscore"]['teams'][team]['players']:
-                    if game['liveData']["boxscore"]['teams'][team]['players'][player]['position']['code'] == "G":
-                        data = {}
-                        data['gameID'] = game['gamePk']
-                        data['playerID'] = game['liveData']["boxscore"]['teams'][team]['players'][player]['person']['id']
-                        data['fullName'] = game['liveData']["boxscore"]['teams'][team]['players'][player]['person']['fullName']
-                        data['position'] = game['liveData']["boxscore"]['teams'][team]['players'][player]['position']['code']
-                        data['homeAway'] = team
-                        data['teamID'] = game['gameData']['teams'][team]['id']
-                        data['teamName'] = game['gameData']['teams'][team]['name']
-                        if isinstance(game['liveData']["boxscore"]['teams'][team]['players'][player]['stats']['goalieStats'], dict):
-                            for key in game['liveData']["boxscore"]['teams'][team]['players'][player]['stats']['goalieStats'].keys():
-                                data[key] = game['liveData']["boxscore"]['teams'][team]['players'][player]['stats']['goalieStats'][key]
-                        yield(data)
-                    else: 
-                        continue
-        except: 
-            print(f"Game %s not found" % (season + "02" + game_id))
+    for rows in _season_rows(season, ["game_goalie_stats"]):
+        yield from rows["game_goalie_stats"]
@@ -0,0 +1,371 @@
+import collections
+import copy
+import threading
+try:
+    from .fetch import get_fetcher
+    from .schedule import get_schedule
+    from .game import game_link, table_names
+    from . import schema
+except ImportError:
+    from fetch import get_fetcher
+    from schedule import get_schedule
+    from game import game_link, table_names
+    import schema
+
+# live mode for games in progress. Each game's /feed/live is downloaded once,
+# then only the feed/live/diffPatch JSON patches since the last timecode are
+# polled and applied to the game kept in memory, and only the tables whose part
+# of the feed was patched are extracted again. A poll with nothing new is a few
+# bytes instead of the whole feed. A night's slate is tracked with one thread per
+# game sharing the fetcher's rate limiting and retries, each polling on an
+# interval that depends on the game's state.
+
+# seconds between polls per game state. "Final" games stop being polled
+poll_intervals = {"Preview": 300, "Live": 10, "Intermission": 60}
+# parts of the feed each table is built from. "*" matches any key, and a patch
+# to a parent of one of these (e.g. all of /liveData) counts too
+table_paths = {
+    "game_results": ["/gameData/datetime", "/gameData/teams", "/gameData/venue", "/liveData/linescore/teams"],
+    "game_officials": ["/liveData/boxscore/officials"],
+    "game_team_stats": ["/liveData/boxscore/teams/*/teamStats", "/liveData/boxscore/teams/*/coaches",
+                        "/liveData/linescore/currentPeriod", "/liveData/linescore/teams"],
+    "game_player_stats": ["/liveData/boxscore/teams/*/players"],
+    "game_goalie_stats": ["/liveData/boxscore/teams/*/players"],
+}
+# columns identifying a row within a game, so changed rows can be matched up
+row_keys = {
+    "game_results": ["gameID"],
+    "game_officials": ["officialName", "officialType"],
+    "game_team_stats": ["homeAway"],
+    "game_player_stats": ["playerID"],
+    "game_goalie_stats": ["playerID"],
+}
+
+LiveUpdate = collections.namedtuple("LiveUpdate", ["game_id", "state", "timecode", "changes"])
+LiveUpdate.__doc__ = """
+    game_id - ID of the game
+    state - Preview, Live, Intermission or Final
+    timecode - metaData.timeStamp of the feed after the update
+    changes - Dictionary of table name to the list of rows that are new or
+              changed since the last update, only for tables that changed
+"""
+
+
+class PatchError(ValueError):
+    pass
+
+
+def diff_patch_link(game, timecode):
+    return("/api/v1/game/%s/feed/live/diffPatch?startTimecode=%s" % (game, timecode))
+
+
+def _pointer(path):
+    # JSON pointer -> list of keys, e.g. "/liveData/plays/allPlays/0" -> ["liveData", "plays", "allPlays", "0"]
+    if path == "":
+        return([])
+    return([part.replace("~1", "/").replace("~0", "~") for part in path.split("/")[1:]])
+
+
+def _child(node, key):
+    return(node[int(key)] if isinstance(node, list) else node[key])
+
+
+def _resolve(doc, parts):
+    node = doc
+    for key in parts:
+        node = _child(node, key)
+    return(node)
+
+
+def _add(doc, parts, value):
+    if not parts:
+        return(value)
+    parent = _resolve(doc, parts[:-1])
+    key = parts[-1]
+    if isinstance(parent, list):
+        if key == "-":
+            parent.append(value)
+        else:
+            parent.insert(int(key), value)
+    else:
+        parent[key] = value
+    return(doc)
+
+
+def _remove(doc, parts):
+    parent = _resolve(doc, parts[:-1])
+    key = parts[-1]
+    del parent[int(key) if isinstance(parent, list) else key]
+
+
+def apply_patch(doc, operations):
+    """
+    Arguments:
+        doc - JSON document to patch in place, e.g. a /feed/live. Dictionary.
+        operations - List of JSON patch (RFC 6902) operations, e.g.
+                     [{"op": "replace", "path": "/metaData/timeStamp", "value": "20191003_234535"}]
+    Returns:
+        The patched document. Usually doc itself, only a patch of the root ("")
+        returns a new document. Raises PatchError if an operation doesn't fit the
+        document, e.g. a path that doesn't exist or a failed "test".
+    """
+    for operation in operations:
+        op = operation.get("op")
+        parts = _pointer(operation.get("path", ""))
+        try:
+            if op == "add":
+                doc = _add(doc, parts, operation["value"])
+            elif op == "replace":
+                if not parts:
+                    doc = operation["value"]
+                else:
+                    parent = _resolve(doc, parts[:-1])
+                    key = int(parts[-1]) if isinstance(parent, list) else parts[-1]
+                    # replacing needs the value to be there already
+                    parent[key]
+                    parent[key] = operation["value"]
+            elif op == "remove":
+                _remove(doc, parts)
+            elif op in ("move", "copy"):
+                source = _pointer(operation["from"])
+                value = _resolve(doc, source)
+                if op == "move":
+                    _remove(doc, source)
+                else:
+                    value = copy.deepcopy(value)
+                doc = _add(doc, parts, value)
+            elif op == "test":
+                if _resolve(doc, parts) != operation["value"]:
+                    raise PatchError("Test failed at %s" % operation.get("path"))
+            else:
+                raise PatchError("Unknown patch operation %r" % op)
+        except (KeyError, IndexError, ValueError, TypeError) as error:
+            if isinstance(error, PatchError):
+                raise
+            raise PatchError("Can't %s %s: %r" % (op, operation.get("path"), error))
+    return(doc)
+
+
+def _overlaps(path, pattern):
+    # whether a patched path is one of the pattern's paths, inside one or a parent of one
+    parts, pattern_parts = _pointer(path), _pointer(pattern)
+    return(all(pattern_part in ("*", part) for part, pattern_part in zip(parts, pattern_parts)))
+
+
+def changed_tables(operations, tables=None):
+    """
+    Returns:
+        Set of the table names whose part of the feed the patch operations touch
+    """
+    paths = [path for operation in operations for path in (operation.get("path", ""), operation.get("from"))
+             if path is not None]
+    return({table for table in tables or table_paths
+            if any(_overlaps(path, pattern) for path in paths for pattern in table_paths[table])})
+
+
+def game_state(feed):
+    """
+    Returns:
+        The game's abstractGameState (Preview, Live or Final), or Intermission
+        for a live game between periods
+    """
+    state = feed['gameData']['status']['abstractGameState']
+    if state == "Live" and feed['liveData']['linescore'].get('intermissionInfo', {}).get('inIntermission'):
+        return("Intermission")
+    return(state)
+
+
+class LiveGame:
+    """
+    Arguments:
+        game_id - ID of the game. Character. Example: "2019020001"
+        tables - Tables to keep up to date. Defaults to every table in table_names.
+    Returns:
+        One game kept up to date from diff patches. poll downloads the full feed
+        the first time (and whenever a patch doesn't apply) and only the patches
+        since the last timecode after that.
+    Example:
+        live_game = LiveGame("2019020001")
+        update = live_game.poll()
+        update.changes["game_team_stats"]
+    """
+    def __init__(self, game_id, tables=None):
+        self.game_id = str(game_id)
+        self.tables = list(tables or table_names)
+        self.feed = None
+        self.rows = {table: {} for table in self.tables}
+
+    @property
+    def timecode(self):
+        return(None if self.feed is None else self.feed['metaData']['timeStamp'])
+
+    @property
+    def state(self):
+        return(None if self.feed is None else game_state(self.feed))
+
+    def _changes(self, tables):
+        # re-extracts the tables and keeps the rows that differ from the last extraction
+        changes = {}
+        for table in tables:
+            try:
+                rows = schema.extract_rows(table, self.feed)
+            except (KeyError, IndexError, TypeError):
+                # e.g. a pregame boxscore without stats yet. The last rows are kept so
+                # the next poll that extracts only reports what really changed
+                continue
+            keys = row_keys[table]
+            previous = self.rows[table]
+            current = {tuple(row[key] for key in keys): row for row in rows}
+            changed = [row for key, row in current.items() if previous.get(key) != row]
+            self.rows[table] = current
+            if changed:
+                changes[table] = changed
+        return(changes)
+
+    def load(self, feed, reset=True):
+        """
+        Replaces the game with a full feed. Returns the LiveUpdate with every
+        row, or with reset=False (a resync) only the rows that differ from
+        before and None if nothing does.
+        """
+        state = None if reset else self.state
+        self.feed = feed
+        if reset:
+            self.rows = {table: {} for table in self.tables}
+        changes = self._changes(self.tables)
+        return(LiveUpdate(self.game_id, self.state, self.timecode, changes) if changes or self.state != state
+               else None)
+
+    def apply(self, patches):
+        """
+        Arguments:
+            patches - diffPatch response, a list of {"diff": [operations]}
+        Returns:
+            LiveUpdate with the rows of the tables the patches changed. Raises
+            PatchError if a patch doesn't apply, leaving the feed half patched.
+        """
+        state = self.state
+        tables = set()
+        for patch in patches:
+            operations = patch.get("diff", []) if isinstance(patch, dict) else patch
+            self.feed = apply_patch(self.feed, operations)
+            tables |= changed_tables(operations, self.tables)
+        changes = self._changes([table for table in self.tables if table in tables])
+        return(LiveUpdate(self.game_id, self.state, self.timecode, changes) if changes or self.state != state
+               else None)
+
+    def poll(self, fetcher=None):
+        """
+        Returns:
+            LiveUpdate if anything changed since the last poll, otherwise None
+        """
+        fetcher = fetcher or get_fetcher()
+        if self.feed is None:
+            return(self.load(fetcher.get_json(game_link(self.game_id), cache=False)))
+        patches = fetcher.get_json(diff_patch_link(self.game_id, self.timecode), cache=False)
+        # the API sends the whole feed instead when the timecode is too far back
+        if isinstance(patches, dict):
+            return(self.load(patches, reset=False))
+        try:
+            return(self.apply(patches))
+        except PatchError as error:
+            print("Game %s patch didn't apply (%s), downloading the full feed again" % (self.game_id, error))
+            return(self.load(fetcher.get_json(game_link(self.game_id), cache=False), reset=False))
+
+
+def slate_game_ids(date):
+    """
+    Arguments:
+        date - Day of the games. Character. Example: "2019-10-02"
+    Returns:
+        IDs of the regular season and playoff games on the date that aren't final yet
+    """
+    season_start = int(date[0:4]) if int(date[5:7]) >= 8 else int(date[0:4]) - 1
+    schedule = get_schedule(str(season_start), game_types=("02", "03"))
+    return(schedule[(schedule.date == date) & ~schedule.final].gameID.to_list())
+
+
+class LiveTracker:
+    """
+    Arguments:
+        game_ids - IDs of the games to track, e.g. slate_game_ids("2019-10-02")
+        callback - Optional function called with every LiveUpdate, from the
+                   game's polling thread
+        queue - Optional queue.Queue every LiveUpdate is put on
+        tables - Tables to keep up to date. Defaults to every table in table_names.
+        intervals - Seconds between polls per game state, see poll_intervals
+        fetcher - Fetcher to poll with. Defaults to the shared one.
+    Returns:
+        Tracker polling every game in its own thread until the game is final
+        or the tracker is stopped. The latest LiveGame of each game is in games.
+    Example:
+        def show(update):
+            print(update.game_id, update.state, {table: len(rows) for table, rows in update.changes.items()})
+        # blocks until every game on the slate is final
+        LiveTracker(slate_game_ids("2019-10-02"), callback=show).run()
+    """
+    def __init__(self, game_ids, callback=None, queue=None, tables=None, intervals=None, fetcher=None):
+        self.games = {str(game_id): LiveGame(game_id, tables) for game_id in game_ids}
+        self.callback = callback
+        self.queue = queue
+        self.intervals = dict(poll_intervals, **(intervals or {}))
+        self.fetcher = fetcher
+        self._stop = threading.Event()
+        self._threads = []
+
+    def _emit(self, update):
+        if self.callback is not None:
+            self.callback(update)
+        if self.queue is not None:
+            self.queue.put(update)
+
+    def _track(self, live_game):
+        fetcher = self.fetcher or get_fetcher()
+        while not self._stop.is_set():
+            try:
+                update = live_game.poll(fetcher)
+            except Exception as error:
+                # the fetcher already retried, so just wait for the next poll
+                print("Game %s poll failed: %s" % (live_game.game_id, error))
+                update = None
+            if update is not None:
+                self._emit(update)
+            if live_game.state == "Final":
+                break
+            self._stop.wait(self.intervals.get(live_game.state, self.intervals["Live"]))
+
+    def start(self):
+        self._stop.clear()
+        self._threads = [threading.Thread(target=self._track, args=(live_game,), daemon=True,
+                                          name="live-%s" % game_id)
+                         for game_id, live_game in self.games.items()]
+        for thread in self._threads:
+            thread.start()
+        return(self)
+
+    def running(self):
+        return(any(thread.is_alive() for thread in self._threads))
+
+    def join(self, timeout=None):
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def stop(self):
+        self._stop.set()
+        self.join()
+
+    def run(self):
+        """
+        Tracks the games until they are all final, blocking until then
+        """
+        self.start()
+        try:
+            self.join()
+        finally:
+            self.stop()
+
+    def __enter__(self):
+        return(self.start())
+
+    def __exit__(self, *args):
+        self.stop()
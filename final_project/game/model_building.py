@@ -1,27 +1,59 @@
-from sklearn.model_selection import GridSearchCV
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401, needed to import HalvingGridSearchCV
+from sklearn.model_selection import GridSearchCV, HalvingGridSearchCV, ParameterGrid, check_cv
+from sklearn.base import BaseEstimator, ClassifierMixin, clone, is_classifier
+from sklearn.metrics import check_scoring
+from sklearn.exceptions import FitFailedWarning
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import HistGradientBoostingClassifier, HistGradientBoostingRegressor
+from sklearn.pipeline import Pipeline
+from joblib import Parallel, delayed, dump, load
+import copy
+import numpy as np
+import pandas as pd
+import os
+import shutil
+import tempfile
 import time
+import warnings
 
 # updated function to be flexible with regression and classification as well as other scoring functions
 # and to include the option for one of the voting models from sklearn
-def best_model(X_train, y_train, X_test, y_test, models, params, scoring_function, transformer=None, ensemble_model=None, cv_scoring_metric="accuracy", folds=5):
+# search="halving" uses successive halving instead of the exhaustive grid, and passing the
+# previous season's output as previous only searches the candidates that did best last season
+def best_model(X_train, y_train, X_test, y_test, models, params, scoring_function, transformer=None, ensemble_model=None, cv_scoring_metric="accuracy", folds=5,
+               search="grid", previous=None, factor=3, lean=False, prefit_ensemble=True):
+    if search not in ("grid", "halving"):
+        raise ValueError('search must be "grid" or "halving", got %r' % (search,))
     # initializing some variables to store models and predictions in
     best_mods, train_preds, test_preds, train_accs, test_accs, fit_times = [], [], [], [], [], []
-    # transforming the train and test datasets
+    candidate_fit_times = []
+    # transforming the train and test datasets. The transformer is cloned so every
+    # season's output keeps the transformer fit on its own training data
     if transformer:
+        transformer = clone(transformer)
         X_train_transformed = transformer.fit_transform(X_train)
         X_test_transformed = transformer.transform(X_test)
     else: 
         X_train_transformed = X_train
         X_test_transformed = X_test
     # looping through the models
-    for (name, clf), parms in zip(models.items(), params):
+    for i, ((name, clf), parms) in enumerate(zip(models.items(), params)):
+        # a previous result without the per candidate scores (e.g. an older one) searches the full grid
+        if previous is not None and previous.get("candidate_fit_times") is not None:
+            parms = _seed_grid(parms, previous["candidate_fit_times"][i], factor)
         start = time.time()
-        # using GridSearchCV to find the optimal parameters for the data
-        grid = GridSearchCV(estimator = clf, param_grid = parms, n_jobs = -1, cv = folds, verbose=True, scoring=cv_scoring_metric)
+        if search == "halving":
+            # successive halving, every candidate starts on a small sample and only the best
+            # 1/factor of them move on to factor times as many rows
+            grid = HalvingGridSearchCV(estimator = clf, param_grid = parms, factor = factor, n_jobs = -1, cv = folds, verbose=True, scoring=cv_scoring_metric)
+        else:
+            # using GridSearchCV to find the optimal parameters for the data
+            grid = GridSearchCV(estimator = clf, param_grid = parms, n_jobs = -1, cv = folds, verbose=True, scoring=cv_scoring_metric)
         # grid = RandomizedSearchCV(estimator = clf, param_distributions = parms, n_jobs = -1, cv = 5, verbose=True, n_iter=20, random_state=42)
         grid.fit(X_train_transformed, y_train)
         end = time.time()
         fit_times.append(end-start)
+        candidate_fit_times.append(_candidate_results(grid))
         best_mod = grid.best_estimator_
         # creating predictions
         train_pred = best_mod.predict(X_train_transformed)
@@ -37,118 +69,658 @@ def best_model(X_train, y_train, X_test, y_test, models, params, scoring_functio
         test_preds.append(test_pred)
         best_mods.append(best_mod)
     if ensemble_model:
-        if ensemble_model.__name__ == "VotingRegressor":
-            # fitting the soft voting classifier as the ensemble model but not including those way overfit, i.e. accuracy=1
-            voting = ensemble_model([
-                    (name, mod) for name, mod, acc in zip(models.keys(), best_mods, train_accs)
-                ], n_jobs=-1)
-            # hard voting
-            start = time.time()
-            voting.fit(X_train_transformed, y_train)
-            end = time.time()
-            fit_times.append(end-start)
-            train_pred = voting.predict(X_train_transformed)
-            test_pred = voting.predict(X_test_transformed)
-            train_acc = scoring_function(y_train, train_pred)
-            test_acc = scoring_function(y_test, test_pred)
-            print(f"%s Training Metric: %s, Test Metric: %s\n" % (ensemble_model.__name__, train_acc, test_acc), "\n", sep='')
-            train_accs.append(train_acc)
-            test_accs.append(test_acc)
-            train_preds.append(train_pred)
-            test_preds.append(test_pred)
-            best_mods.append(voting_hard)
-        elif ensemble_model.__name__ == "VotingClassifier":
-            # fitting the hard voting classifier as the ensemble model
-            voting_hard = ensemble_model([
-                    (name, mod) for name, mod in zip(models.keys(), best_mods) #if (hasattr(mod, "predict_proba") and voting == "soft") or voting == 'hard'
-                ], voting="hard", n_jobs=-1)
-            # fitting the soft voting classifier as the ensemble model but not including those way overfit, i.e. accuracy=1
-            voting_soft = ensemble_model([
-                    (name, mod) for name, mod, acc in zip(models.keys(), best_mods, train_accs) if hasattr(mod, "predict_proba") and acc < 1
-                ], voting="soft", n_jobs=-1)
-            # hard voting
-            start = time.time()
-            voting_hard.fit(X_train_transformed, y_train)
-            end = time.time()
-            fit_times.append(end-start)
-            train_pred = voting_hard.predict(X_train_transformed)
-            test_pred = voting_hard.predict(X_test_transformed)
-            train_acc = scoring_function(y_train, train_pred)
-            test_acc = scoring_function(y_test, test_pred)
-            print(f"VotingClassifier_Hard Training Metric: %s, Test Metric: %s" % (train_acc, test_acc), sep='')
-            train_accs.append(train_acc)
-            test_accs.append(test_acc)
-            train_preds.append(train_pred)
-            test_preds.append(test_pred)
-            best_mods.append(voting_hard)
-            # soft voting
-            start = time.time()
-            voting_soft.fit(X_train_transformed, y_train)
-            end = time.time()
-            fit_times.append(end-start)
-            train_pred = voting_soft.predict(X_train_transformed)
-            test_pred = voting_soft.predict(X_test_transformed)
-            train_acc = scoring_function(y_train, train_pred)
-            test_acc = scoring_function(y_test, test_pred)
-            print(f"VotingClassifier_Soft Training Metric: %s, Test Metric: %s\n" % (train_acc, test_acc), sep='')
-            train_accs.append(train_acc)
-            test_accs.append(test_acc)
-            train_preds.append(train_pred)
-            test_preds.append(test_pred)
-            best_mods.append(voting_soft)
+        _fit_ensemble(ensemble_model, models, best_mods, train_preds, test_preds, train_accs, test_accs, fit_times,
+                      X_train_transformed, y_train, X_test_transformed, y_test, scoring_function, prefit_ensemble)
     # storing all of the models/predictions/metrics/data in a dictionary
     out = {
         "best_models": best_mods,
         "train_accuracy": train_accs,
         "test_accuracy": test_accs,
         "fit_times": fit_times, 
+        "candidate_fit_times": candidate_fit_times,
         "train_preds": train_preds,
         "test_preds": test_preds,
         "X_train_transformed": X_train_transformed,
         "X_test_transformed": X_test_transformed,
         "transformer": transformer
     }
+    if lean:
+        out = lean_result(out)
     # return predictions, models, and transformed data
     return(out)
 
 
+# smallest dtype for a prediction array, int8 for small integer class labels and
+# float32 for other numbers. Anything else, e.g. string labels, keeps its dtype
+def _compact(pred):
+    pred = np.asarray(pred)
+    if pred.dtype.kind in "biu" and (pred.size == 0 or (pred.min() >= -128 and pred.max() <= 127)):
+        return(pred.astype(np.int8))
+    if pred.dtype.kind in "iuf":
+        return(pred.astype(np.float32))
+    return(pred)
+
+
+def lean_result(fit_mods, spill_dir=None, prefix="fit"):
+    """
+    Arguments:
+        fit_mods - Output of best_model or fit_optimize_season_model
+        spill_dir - Optional directory to save the prediction arrays in. They're
+                    memory mapped back so they stay on disk until they're used.
+        prefix - File name prefix for the spilled arrays, e.g. the season
+    Returns:
+        The same dictionary without the copies of the data (X_train, X_test,
+        X_train_transformed, X_test_transformed, y_train, y_test) and with the
+        predictions stored as int8 (class labels) or float32, non-numeric labels
+        as they were. Models, metrics, the transformer and any row slices are kept.
+    """
+    for key in ["X_train", "X_test", "X_train_transformed", "X_test_transformed", "y_train", "y_test"]:
+        fit_mods.pop(key, None)
+    for key in ["train_preds", "test_preds"]:
+        preds = [_compact(pred) for pred in fit_mods[key]]
+        if spill_dir is not None:
+            os.makedirs(spill_dir, exist_ok=True)
+            for i, pred in enumerate(preds):
+                # arrays of Python objects can't be memory mapped, they stay in memory
+                if pred.dtype.hasobject:
+                    continue
+                path = os.path.join(spill_dir, "%s_%s_%s.npy" % (prefix, key, i))
+                np.save(path, pred)
+                preds[i] = np.load(path, mmap_mode="r")
+        fit_mods[key] = preds
+    return(fit_mods)
+
+
+# row slice (or int32 positions when the rows aren't contiguous) into data
+def _rows(mask):
+    positions = np.flatnonzero(np.asarray(mask))
+    if len(positions) and positions[-1] - positions[0] + 1 == len(positions):
+        return(slice(int(positions[0]), int(positions[-1]) + 1))
+    return(positions.astype(np.int32))
+
+
+def season_split(data, fit_mods):
+    """
+    Arguments:
+        data - The modeling data the season was fit on, e.g. prediction_df
+        fit_mods - Lean output of fit_optimize_season_model
+    Returns:
+        X_train, X_test, y_train, y_test rebuilt from the row slices kept in
+        fit_mods. The transformed matrices are fit_mods["transformer"].transform(X).
+    """
+    train, test = data.iloc[fit_mods["train_rows"]], data.iloc[fit_mods["test_rows"]]
+    return(train.drop(columns=drop_columns), test.drop(columns=drop_columns), train['homeTeamWin'], test['homeTeamWin'])
+
+
+# one row per candidate the search tried with its mean fit time and CV score. For
+# successive halving there's a row per candidate per round, iter is the round and
+# n_resources the number of rows it was fit on
+def _candidate_results(grid):
+    results = pd.DataFrame(grid.cv_results_)
+    columns = [column for column in ["params", "iter", "n_resources", "mean_fit_time", "mean_score_time",
+                                     "mean_test_score", "rank_test_score"] if column in results.columns]
+    results = results[columns].copy()
+    # total time spent fitting the candidate over all the folds
+    results["fit_time"] = results["mean_fit_time"] * grid.n_splits_
+    return(results)
+
+
+# builds the parameter grid for a season from the previous season's search. The
+# best 1/factor of the full grid (at least factor candidates) is kept, ranked by how
+# far they got in the halving rounds and then by CV score, best one first so it wins
+# ties. Parameters in parms that weren't in the previous search use the full values
+# of the grid the candidate came from, so a list of grids doesn't mix keys across grids.
+def _seed_grid(parms, previous_results, factor):
+    keep = min(len(ParameterGrid(parms)), max(factor, int(np.ceil(len(ParameterGrid(parms)) / factor))))
+    results = previous_results.assign(
+        key=previous_results["params"].map(lambda candidate: repr(sorted(candidate.items()))),
+        round=previous_results["iter"] if "iter" in previous_results.columns else 0)
+    # the last round each candidate made it to
+    results = results.sort_values(["round", "mean_test_score"], ascending=False, kind="stable") \
+        .drop_duplicates("key")
+    param_grids = [parms] if isinstance(parms, dict) else parms
+    seeded = []
+    for candidate in results["params"].head(keep):
+        grid = {key: [value] for key, value in candidate.items()}
+        # the first grid that has all of the candidate's values
+        source = next((param_grid for param_grid in param_grids
+                       if all(key in param_grid and value in list(param_grid[key]) for key, value in candidate.items())),
+                      None)
+        for key, values in (source or {}).items():
+            grid.setdefault(key, list(values))
+        if grid not in seeded:
+            seeded.append(grid)
+    return(seeded)
+
+
+# combines the stored predictions of the ensemble's members the way the voting model
+# would: the average for VotingRegressor, the most common class for hard voting (ties
+# go to the first class like VotingClassifier) and the largest average probability
+# for soft voting
+def _vote(voting, mods, preds, X):
+    if not is_classifier(voting):
+        return(np.column_stack(preds).mean(axis=1))
+    if voting.voting == "soft":
+        probas = np.mean([mod.predict_proba(X) for mod in mods], axis=0)
+        return(voting.classes_[probas.argmax(axis=1)])
+    labels = np.searchsorted(voting.classes_, np.column_stack(preds))
+    counts = np.stack([(labels == i).sum(axis=1) for i in range(len(voting.classes_))], axis=1)
+    return(voting.classes_[counts.argmax(axis=1)])
+
+
+# a fitted classifier that predicts the position of its label in classes_ instead of
+# the label. VotingClassifier fits its members on the encoded labels and counts their
+# hard votes with bincount, so a prefit member has to answer in the same encoding for
+# labels that aren't 0..n-1, e.g. "home"/"away". Probabilities are already in
+# classes_ order
+class _EncodedLabels(ClassifierMixin, BaseEstimator):
+    def __init__(self, estimator):
+        self.estimator = estimator
+
+    # the wrapped classifier is already fit
+    def fit(self, X, y=None):
+        return(self)
+
+    def __sklearn_is_fitted__(self):
+        return(True)
+
+    @property
+    def classes_(self):
+        return(self.estimator.classes_)
+
+    def predict(self, X):
+        return(np.searchsorted(self.estimator.classes_, self.estimator.predict(X)))
+
+    def predict_proba(self, X):
+        return(self.estimator.predict_proba(X))
+
+
+# fits the voting ensemble on top of the tuned models and appends its models,
+# predictions, metrics and fit times to the lists from best_model. With prefit the
+# tuned models are wrapped in FrozenEstimator (scikit-learn 1.6 or newer) so fitting
+# the ensemble doesn't refit them, and its predictions come from the members'
+# predictions already made.
+def _fit_ensemble(ensemble_model, models, best_mods, train_preds, test_preds, train_accs, test_accs, fit_times,
+                  X_train_transformed, y_train, X_test_transformed, y_test, scoring_function, prefit=True):
+    names = list(models.keys())
+    if ensemble_model.__name__ == "VotingRegressor":
+        # every tuned model in the ensemble
+        variants = [(ensemble_model.__name__, {}, list(range(len(names))))]
+    elif ensemble_model.__name__ == "VotingClassifier":
+        variants = [
+            # hard voting with every tuned model
+            ("VotingClassifier_Hard", {"voting": "hard"}, list(range(len(names)))),
+            # soft voting but not including those way overfit, i.e. accuracy=1
+            ("VotingClassifier_Soft", {"voting": "soft"},
+             [i for i in range(len(names)) if hasattr(best_mods[i], "predict_proba") and train_accs[i] < 1])
+        ]
+    else:
+        return
+    for label, voting_params, members in variants:
+        start = time.time()
+        if prefit:
+            from sklearn.frozen import FrozenEstimator
+            frozen = [(names[i], FrozenEstimator(_EncodedLabels(best_mods[i]) if is_classifier(best_mods[i]) else best_mods[i]))
+                      for i in members]
+            voting = ensemble_model(frozen, **voting_params)
+            # only checks the data and encodes the labels, the frozen models aren't refit
+            voting.fit(X_train_transformed, y_train)
+            train_pred = _vote(voting, [best_mods[i] for i in members], [train_preds[i] for i in members], X_train_transformed)
+            test_pred = _vote(voting, [best_mods[i] for i in members], [test_preds[i] for i in members], X_test_transformed)
+        else:
+            voting = ensemble_model([(names[i], best_mods[i]) for i in members], n_jobs=-1, **voting_params)
+            voting.fit(X_train_transformed, y_train)
+            train_pred = voting.predict(X_train_transformed)
+            test_pred = voting.predict(X_test_transformed)
+        end = time.time()
+        fit_times.append(end-start)
+        train_acc = scoring_function(y_train, train_pred)
+        test_acc = scoring_function(y_test, test_pred)
+        print(f"%s Training Metric: %s, Test Metric: %s\n" % (label, train_acc, test_acc), sep='')
+        train_accs.append(train_acc)
+        test_accs.append(test_acc)
+        train_preds.append(train_pred)
+        test_preds.append(test_pred)
+        best_mods.append(voting)
+
+
+# whether every part of a fitted transformer has partial_fit, so it can be updated
+# without some steps moving and others not
+def _can_partial_fit(transformer):
+    if transformer in ("drop", "passthrough", None):
+        return(True)
+    if hasattr(transformer, "partial_fit"):
+        return(True)
+    if isinstance(transformer, Pipeline):
+        return(all(_can_partial_fit(step) for _, step in transformer.steps))
+    if isinstance(transformer, ColumnTransformer):
+        return(all(_can_partial_fit(sub_transformer) for _, sub_transformer, _ in transformer.transformers_))
+    return(False)
+
+
+# the columns of X a ColumnTransformer step was fit on, given as names (DataFrames
+# only), positions, a slice, a boolean mask or a callable returning one of those
+def _select_columns(X, columns):
+    if callable(columns):
+        columns = columns(X)
+    if not hasattr(X, "iloc"):
+        return(np.asarray(X)[:, columns])
+    names = [columns] if isinstance(columns, str) else columns
+    if not isinstance(names, slice) and len(names) and isinstance(list(names)[0], str):
+        return(X.loc[:, columns])
+    return(X.iloc[:, columns])
+
+
+# updates a fitted transformer's running statistics with new rows. Works for
+# transformers with partial_fit (StandardScaler, MinMaxScaler, MaxAbsScaler) and
+# Pipelines/ColumnTransformers made of them. Returns False without changing anything
+# if any part can't be updated
+def _partial_fit_transformer(transformer, X):
+    if not _can_partial_fit(transformer):
+        return(False)
+    if transformer in ("drop", "passthrough", None):
+        return(True)
+    if hasattr(transformer, "partial_fit"):
+        transformer.partial_fit(X)
+        return(True)
+    if isinstance(transformer, Pipeline):
+        for _, step in transformer.steps:
+            _partial_fit_transformer(step, X)
+            if step not in ("drop", "passthrough", None):
+                X = step.transform(X)
+        return(True)
+    for _, sub_transformer, columns in transformer.transformers_:
+        _partial_fit_transformer(sub_transformer, _select_columns(X, columns))
+    return(True)
+
+
+# updates a fitted estimator with new rows. partial_fit estimators (SGD, naive Bayes,
+# MLP) take a pass over the new rows, warm_start ensembles (forests, GBMs) grow by as
+# many trees/iterations per row as they already have and fit those on the new rows only,
+# anything else is refit on the whole training window with its tuned parameters
+def _update_estimator(estimator, X_new, y_new, X_train, y_train, n_seen):
+    if hasattr(estimator, "partial_fit"):
+        estimator.partial_fit(X_new, y_new)
+        return("partial_fit")
+    estimator_params = estimator.get_params()
+    # only ensembles grow, warm_start on e.g. LogisticRegression just reuses the old coefficients
+    if isinstance(estimator, (HistGradientBoostingClassifier, HistGradientBoostingRegressor)):
+        size_param = "max_iter"
+    else:
+        size_param = "n_estimators"
+    if "warm_start" in estimator_params and size_param in estimator_params:
+        size = estimator_params[size_param]
+        estimator.set_params(warm_start=True, **{size_param: size + max(1, int(round(size * len(y_new) / n_seen)))})
+        estimator.fit(X_new, y_new)
+        return("warm_start")
+    estimator.fit(X_train, y_train)
+    return("refit")
+
+
+def update_best_model(previous, X_new, y_new, X_train, y_train, X_test, y_test, models, scoring_function, ensemble_model=None):
+    """
+    Arguments:
+        previous - Output of best_model/fit_optimize_season_model for the previous training window
+        X_new, y_new - Rows added to the training window since previous
+        X_train, y_train - The whole new training window, used for the train metric and
+                           for estimators that can't be updated incrementally
+        X_test, y_test - Test data
+        models - Dictionary of model name to estimator, same as best_model
+        scoring_function - Scoring function used for the train/test metrics
+        ensemble_model - Optional VotingClassifier/VotingRegressor class. Built from the
+                         updated models without refitting them, see _fit_ensemble.
+    Returns:
+        Same dictionary as best_model with copies of the previous models and transformer
+        updated with X_new only, plus update_methods saying how each model was updated
+        ("partial_fit", "warm_start" or "refit"). The tuned parameters are kept, no new
+        search is done. The previous output isn't changed.
+    """
+    n_seen = len(previous["y_train"]) if "y_train" in previous else previous.get("n_train", len(X_train) - len(X_new))
+    transformer = copy.deepcopy(previous["transformer"])
+    if transformer:
+        # updating a copy so a step that fails part way can't leave the transformer half updated
+        updated = copy.deepcopy(transformer)
+        try:
+            updated_ok = _partial_fit_transformer(updated, X_new)
+        except Exception:
+            updated_ok = False
+        if updated_ok:
+            transformer = updated
+        else:
+            print("%s can't be updated incrementally, keeping it as fit on the previous window\n" % type(transformer).__name__)
+        X_new_transformed = transformer.transform(X_new)
+        X_train_transformed = transformer.transform(X_train)
+        X_test_transformed = transformer.transform(X_test)
+    else:
+        X_new_transformed, X_train_transformed, X_test_transformed = X_new, X_train, X_test
+    best_mods, train_preds, test_preds, train_accs, test_accs, fit_times, update_methods = [], [], [], [], [], [], []
+    # the ensemble models best_model appends come after the tuned models and are rebuilt below
+    for name, previous_mod in zip(models.keys(), previous["best_models"]):
+        best_mod = copy.deepcopy(previous_mod)
+        start = time.time()
+        update_methods.append(_update_estimator(best_mod, X_new_transformed, y_new, X_train_transformed, y_train, n_seen))
+        end = time.time()
+        fit_times.append(end-start)
+        train_pred = best_mod.predict(X_train_transformed)
+        test_pred = best_mod.predict(X_test_transformed)
+        train_acc = scoring_function(y_train, train_pred)
+        test_acc = scoring_function(y_test, test_pred)
+        print(f"%s (%s) Training Metric: %s, Test Metric: %s\n" % (name, update_methods[-1], train_acc, test_acc), sep='')
+        train_accs.append(train_acc)
+        test_accs.append(test_acc)
+        train_preds.append(train_pred)
+        test_preds.append(test_pred)
+        best_mods.append(best_mod)
+    if ensemble_model:
+        _fit_ensemble(ensemble_model, models, best_mods, train_preds, test_preds, train_accs, test_accs, fit_times,
+                      X_train_transformed, y_train, X_test_transformed, y_test, scoring_function)
+    out = {
+        "best_models": best_mods,
+        "train_accuracy": train_accs,
+        "test_accuracy": test_accs,
+        "fit_times": fit_times,
+        # kept so a later search can still be seeded from the last one
+        "candidate_fit_times": previous.get("candidate_fit_times"),
+        "update_methods": update_methods,
+        "train_preds": train_preds,
+        "test_preds": test_preds,
+        "X_train_transformed": X_train_transformed,
+        "X_test_transformed": X_test_transformed,
+        "transformer": transformer
+    }
+    return(out)
+
+
+# columns of the modeling data that aren't features
+drop_columns = ["gameID", "season", "homeTeamWin", "venue"]
+
+
 # more specific function designed to loop through the season in the data
 # to fit models for each. Used in a {key:function(year) for year in range()}
-# call
-def fit_optimize_season_model(data, year, models, transformer, params, accuracy_score, ensemble_model):
+# call. To carry the search over from one season to the next, loop instead:
+#   season_models = {}
+#   for year in range(2012, 2021):
+#       season_models[str(year)] = fit_optimize_season_model(prediction_df, year, mods, transformer, params, accuracy_score,
+#                                                            VotingClassifier, search="halving",
+#                                                            previous=season_models.get(str(year-1)))
+# With incremental=True and a previous season's output, the previous season's fitted
+# models and transformer are updated with only the games added to the training window
+# instead of searching and fitting from scratch (see update_best_model)
+# lean=True keeps only row slices into data, metrics and compact predictions instead of
+# copies of the season's data (see lean_result and season_split), spill_dir also moves
+# the predictions to disk
+def fit_optimize_season_model(data, year, models, transformer, params, accuracy_score, ensemble_model, search="grid", previous=None,
+                              incremental=False, lean=False, spill_dir=None):
     season = str(year)+'/'+str(year+1)
     print(f"Fitting models for the %s season\n" % season)
-    # data split specified season
-    X_train, X_test = data[data.season.str[0:4].astype(int) < year].drop(columns=["gameID", "season", "homeTeamWin", "venue"]), \
-                      data[data.season.str[0:4].astype(int) == year].drop(columns=["gameID", "season", "homeTeamWin", "venue"])
+    # data split specified season, parsing the season start year only once
+    season_start = data.season.str[0:4].astype(int)
+    train_rows, test_rows = season_start < year, season_start == year
+    X_train, X_test = data[train_rows].drop(columns=drop_columns), data[test_rows].drop(columns=drop_columns)
     
-    y_train, y_test = data[data.season.str[0:4].astype(int) < year]['homeTeamWin'], \
-                      data[data.season.str[0:4].astype(int) == year]['homeTeamWin']
+    y_train, y_test = data[train_rows]['homeTeamWin'], data[test_rows]['homeTeamWin']
     
     start = time.time()
     
-    fit_mods = best_model(
-        X_train = X_train, 
-        y_train = y_train, 
-        X_test = X_test, 
-        y_test = y_test, 
-        models = models, 
-        transformer = transformer, 
-        params = params,
-        scoring_function = accuracy_score,
-        cv_scoring_metric = "accuracy",
-        ensemble_model = ensemble_model,
-        folds = 5
-    )
+    if incremental and previous is not None:
+        # only the games that weren't in the previous season's training window
+        previous_index = previous['X_train'].index if 'X_train' in previous else data.index[previous['train_rows']]
+        new_rows = ~X_train.index.isin(previous_index)
+        fit_mods = update_best_model(
+            previous = previous,
+            X_new = X_train[new_rows],
+            y_new = y_train[new_rows],
+            X_train = X_train,
+            y_train = y_train,
+            X_test = X_test,
+            y_test = y_test,
+            models = models,
+            scoring_function = accuracy_score,
+            ensemble_model = ensemble_model
+        )
+    else:
+        fit_mods = best_model(
+            X_train = X_train, 
+            y_train = y_train, 
+            X_test = X_test, 
+            y_test = y_test, 
+            models = models, 
+            transformer = transformer, 
+            params = params,
+            scoring_function = accuracy_score,
+            cv_scoring_metric = "accuracy",
+            ensemble_model = ensemble_model,
+            folds = 5,
+            search = search,
+            previous = previous
+        )
     
     end = time.time()
     print("Model fitting for the ", season, " season took: ", end - start, " seconds\n", sep='')
     # adding a few more things to differentiate each season because of the different data
+    fit_mods['season'] = [str(year)+'/'+str(year+1) for i in fit_mods["best_models"]]
+    if lean:
+        fit_mods['train_rows'] = _rows(train_rows)
+        fit_mods['test_rows'] = _rows(test_rows)
+        fit_mods['n_train'] = len(y_train)
+        return(lean_result(fit_mods, spill_dir, prefix=str(year)))
     fit_mods['X_train'] = X_train
     fit_mods['X_test'] = X_test
     fit_mods['y_train'] = y_train
     fit_mods['y_test'] = y_test
-    fit_mods['season'] = [str(year)+'/'+str(year+1) for i in fit_mods["best_models"]]
     # return the dictionary of data/models
     return(fit_mods)
 
+
+
+# forcing single threaded estimators inside the job pool so the workers don't
+# each start their own n_jobs=-1 pool and oversubscribe the cores
+def _single_threaded(estimator):
+    if estimator.get_params().get("n_jobs") not in (None, 1):
+        estimator.set_params(n_jobs=1)
+    return(estimator)
+
+
+# one cross validation fold of one parameter candidate. X/y are loaded from the
+# shared memmap files so every worker reads the same pages instead of a copy, and
+# train_idx/test_idx are row positions in them. A fit that fails scores error_score
+# with a FitFailedWarning like GridSearchCV, unless error_score is "raise"
+def _score_fold(paths, estimator, candidate, train_idx, test_idx, scoring, error_score=np.nan):
+    X, y = load(paths[0], mmap_mode="r"), load(paths[1], mmap_mode="r")
+    estimator = _single_threaded(clone(estimator).set_params(**candidate))
+    start = time.time()
+    try:
+        estimator.fit(X[train_idx], y[train_idx])
+    except Exception as error:
+        if error_score == "raise":
+            raise
+        warnings.warn("Fitting %s with %s failed, scoring it %s: %r" % (type(estimator).__name__, candidate, error_score, error),
+                      FitFailedWarning)
+        return(error_score, time.time() - start, 0.0)
+    fit_time = time.time() - start
+    start = time.time()
+    score = check_scoring(estimator, scoring)(estimator, X[test_idx], y[test_idx])
+    return(score, fit_time, time.time() - start)
+
+
+# refits the winning candidate on the season's training rows and predicts its test rows
+def _refit(paths, estimator, candidate, scoring_function, train_idx, test_idx):
+    X, y = load(paths[0], mmap_mode="r"), load(paths[1], mmap_mode="r")
+    X_train, y_train, X_test, y_test = X[train_idx], y[train_idx], X[test_idx], y[test_idx]
+    estimator = clone(estimator).set_params(**candidate)
+    n_jobs = estimator.get_params().get("n_jobs")
+    start = time.time()
+    _single_threaded(estimator).fit(X_train, y_train)
+    fit_time = time.time() - start
+    # giving the refit model its original n_jobs back for later use
+    if n_jobs is not None:
+        estimator.set_params(n_jobs=n_jobs)
+    train_pred, test_pred = estimator.predict(X_train), estimator.predict(X_test)
+    return(estimator, train_pred, test_pred, scoring_function(y_train, train_pred), scoring_function(y_test, test_pred), fit_time)
+
+
+def _dump(array, path):
+    dump(np.ascontiguousarray(array), path)
+    return(path)
+
+
+# walk forward backtest over many seasons at once. Every season x model x
+# parameter candidate x fold is one job in a single pool
+def fit_optimize_seasons(data, years, models, transformer, params, accuracy_score, ensemble_model=None,
+                         cv_scoring_metric="accuracy", folds=5, n_jobs=-1, verbose=0, error_score=np.nan,
+                         lean=False, spill_dir=None):
+    """
+    Arguments:
+        data - Modeling data with gameID, season, homeTeamWin and venue columns
+               plus the features, e.g. prediction_df. DataFrame.
+        years - Seasons to fit, as season start years. Example: range(2012, 2021)
+        models - Dictionary of model name to estimator, same as best_model
+        transformer - Transformer fit on each season's training data, e.g. a ColumnTransformer.
+                      None to use the numeric features as they are.
+        params - List of parameter grids, one per model, same as best_model
+        accuracy_score - Scoring function used for the train/test metrics
+        ensemble_model - Optional VotingClassifier/VotingRegressor class, same as best_model
+        cv_scoring_metric - Scoring used to pick the best parameters
+        folds - Number of cross validation folds
+        n_jobs - Number of worker processes in the pool. -1 for all cores.
+        error_score - Score given to a candidate fold whose fit fails, like
+                      GridSearchCV. "raise" to stop everything on the first failure.
+        lean, spill_dir - Same as fit_optimize_season_model, keeps row slices
+                          instead of copies of every season's data
+    Returns:
+        Dictionary of season start year (character) to the same dictionary
+        fit_optimize_season_model returns for that season, including the
+        candidate_fit_times best_model can be seeded from
+    Example:
+        season_models = fit_optimize_seasons(prediction_df, range(2012, 2021), mods, transformer,
+                                             params, accuracy_score, VotingClassifier)
+    """
+    # parsing the season once for every season split
+    season_start = data.season.str[0:4].astype(int).to_numpy()
+    X_all = data.drop(columns=drop_columns)
+    y_all = data['homeTeamWin'].to_numpy()
+    memmap_dir = tempfile.mkdtemp(prefix="season_models_")
+    try:
+        seasons = {}
+        if transformer is None:
+            # without a transformer every season is a set of rows of the same matrix,
+            # so it's saved once and the jobs get row positions into it
+            shared_paths = [_dump(X_all.to_numpy(), os.path.join(memmap_dir, "X.pkl")),
+                            _dump(y_all, os.path.join(memmap_dir, "y.pkl"))]
+        for year in years:
+            train_rows, test_rows = season_start < year, season_start == year
+            if transformer is None:
+                seasons[year] = {"paths": shared_paths, "transformer": None,
+                                 "train_idx": np.flatnonzero(train_rows), "test_idx": np.flatnonzero(test_rows)}
+                continue
+            # the transformer is fit on each season's training rows, so each season gets
+            # its own matrix with the training rows first. Only the file is kept
+            season_transformer = clone(transformer)
+            X_season = np.concatenate([season_transformer.fit_transform(X_all[train_rows]),
+                                       season_transformer.transform(X_all[test_rows])])
+            y_season = np.concatenate([y_all[train_rows], y_all[test_rows]])
+            n_train = int(train_rows.sum())
+            seasons[year] = {"paths": [_dump(X_season, os.path.join(memmap_dir, "%s_X.pkl" % year)),
+                                       _dump(y_season, os.path.join(memmap_dir, "%s_y.pkl" % year))],
+                             "transformer": season_transformer,
+                             "train_idx": np.arange(n_train), "test_idx": np.arange(n_train, len(y_season))}
+            del X_season, y_season
+
+        # every season x model x candidate x fold in one pool
+        tasks = []
+        for year, season in seasons.items():
+            y_train = y_all[season_start < year]
+            for (name, clf), parms in zip(models.items(), params):
+                splits = list(check_cv(folds, y_train, classifier=is_classifier(clf)).split(np.zeros(len(y_train)), y_train))
+                for candidate_idx, candidate in enumerate(ParameterGrid(parms)):
+                    for train_idx, test_idx in splits:
+                        tasks.append(((year, name, candidate_idx), season["paths"], clf, candidate,
+                                      season["train_idx"][train_idx], season["train_idx"][test_idx]))
+        print("Fitting %s cross validation jobs for %s seasons\n" % (len(tasks), len(seasons)))
+        cv_results = Parallel(n_jobs=n_jobs, verbose=verbose)(
+            delayed(_score_fold)(paths, clf, candidate, train_idx, test_idx, cv_scoring_metric, error_score)
+            for key, paths, clf, candidate, train_idx, test_idx in tasks)
+
+        # averaging the folds and picking the best candidate for each season and model.
+        # Ties go to the first candidate and failed candidates (nan) lose, like GridSearchCV
+        folds_by_candidate, cv_times = {}, {}
+        for (key, *_), (score, fit_time, score_time) in zip(tasks, cv_results):
+            folds_by_candidate.setdefault(key, []).append((score, fit_time, score_time))
+            cv_times[key[:2]] = cv_times.get(key[:2], 0) + fit_time
+        best, candidate_rows = {}, {}
+        for (year, name, candidate_idx), fold_results in folds_by_candidate.items():
+            scores, fit_times, score_times = np.array(fold_results, dtype=float).T
+            score = np.mean(scores)
+            candidate_rows.setdefault((year, name), []).append({
+                "params": list(ParameterGrid(params[list(models).index(name)]))[candidate_idx],
+                "mean_fit_time": np.mean(fit_times), "mean_score_time": np.mean(score_times),
+                "mean_test_score": score, "fit_time": np.sum(fit_times)})
+            if not np.isnan(score) and ((year, name) not in best or score > best[(year, name)][1]):
+                best[(year, name)] = (candidate_idx, score)
+        failed = [key for key in candidate_rows if key not in best]
+        if failed:
+            raise ValueError("Every candidate failed to fit for %s" % ", ".join("%s %s" % key for key in failed))
+
+        # refitting the winners, again one pool over every season and model
+        refit_keys = [(year, name) for year in seasons for name in models]
+        refits = Parallel(n_jobs=n_jobs, verbose=verbose)(
+            delayed(_refit)(seasons[year]["paths"], models[name],
+                            list(ParameterGrid(params[list(models).index(name)]))[best[(year, name)][0]],
+                            accuracy_score, seasons[year]["train_idx"], seasons[year]["test_idx"])
+            for year, name in refit_keys)
+        refits = dict(zip(refit_keys, refits))
+
+        season_models = {}
+        for year, season in seasons.items():
+            best_mods, train_preds, test_preds, train_accs, test_accs, fit_times = [], [], [], [], [], []
+            candidate_fit_times = []
+            for name in models:
+                estimator, train_pred, test_pred, train_acc, test_acc, fit_time = refits[(year, name)]
+                print(f"%s %s Training Metric: %s, Test Metric: %s\n" % (year, name, train_acc, test_acc), sep='')
+                best_mods.append(estimator)
+                train_preds.append(train_pred)
+                test_preds.append(test_pred)
+                train_accs.append(train_acc)
+                test_accs.append(test_acc)
+                fit_times.append(cv_times.get((year, name), 0) + fit_time)
+                results = pd.DataFrame(candidate_rows[(year, name)])
+                results.insert(results.columns.get_loc("fit_time"), "rank_test_score",
+                               results["mean_test_score"].rank(ascending=False, method="min", na_option="bottom").astype(int))
+                candidate_fit_times.append(results)
+            # the season's data is only read back from the memmap for the ensemble and the output
+            X, y = load(season["paths"][0], mmap_mode="r"), load(season["paths"][1], mmap_mode="r")
+            X_train_transformed, X_test_transformed = np.array(X[season["train_idx"]]), np.array(X[season["test_idx"]])
+            train_rows, test_rows = season_start < year, season_start == year
+            if ensemble_model:
+                _fit_ensemble(ensemble_model, models, best_mods, train_preds, test_preds, train_accs, test_accs, fit_times,
+                              X_train_transformed, y[season["train_idx"]], X_test_transformed,
+                              y[season["test_idx"]], accuracy_score)
+            fit_mods = {
+                "best_models": best_mods,
+                "train_accuracy": train_accs,
+                "test_accuracy": test_accs,
+                "fit_times": fit_times,
+                "candidate_fit_times": candidate_fit_times,
+                "train_preds": train_preds,
+                "test_preds": test_preds,
+                "transformer": season["transformer"],
+                "season": [str(year)+'/'+str(year+1) for i in best_mods]
+            }
+            if lean:
+                fit_mods['train_rows'] = _rows(train_rows)
+                fit_mods['test_rows'] = _rows(test_rows)
+                fit_mods['n_train'] = int(train_rows.sum())
+                season_models[str(year)] = lean_result(fit_mods, spill_dir, prefix=str(year))
+                continue
+            fit_mods.update({
+                "X_train_transformed": X_train_transformed,
+                "X_test_transformed": X_test_transformed,
+                "X_train": X_all[train_rows],
+                "X_test": X_all[test_rows],
+                "y_train": data['homeTeamWin'][train_rows],
+                "y_test": data['homeTeamWin'][test_rows]
+            })
+            season_models[str(year)] = fit_mods
+    finally:
+        shutil.rmtree(memmap_dir, ignore_errors=True)
+    return(season_models)
@@ -0,0 +1,194 @@
+import datetime
+import hashlib
+import json
+import os
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.pipeline import Pipeline
+try:
+    from .model_building import season_split
+except ImportError:
+    from model_building import season_split
+
+# saved models live in <directory>/<name>/<data version>/ with the fitted
+# transformer + estimator pipeline in model.joblib and what it was trained on in
+# metadata.json. <directory>/<name>/latest holds the most recently saved version.
+
+
+def data_version(*frames):
+    """
+    Arguments:
+        frames - DataFrames/Series the model was trained on, e.g. X_train, y_train
+    Returns:
+        Short hash of the data's values. Changes whenever a row, column or value
+        changes, so a saved model can be matched to the data it was fit on.
+    """
+    digest = hashlib.sha1()
+    for frame in frames:
+        digest.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+        if isinstance(frame, pd.DataFrame):
+            digest.update(",".join(map(str, frame.columns)).encode())
+    return(digest.hexdigest()[:16])
+
+
+class ScoringModel:
+    """
+    Arguments:
+        pipeline - Fitted transformer + estimator Pipeline (or just an estimator)
+        metadata - Dictionary saved with the model. Needs feature_columns.
+    Returns:
+        Loaded model that scores many games in one vectorized call
+    """
+    def __init__(self, pipeline, metadata):
+        self.pipeline = pipeline
+        self.metadata = metadata
+        self.feature_columns = metadata["feature_columns"]
+        classes = list(getattr(pipeline, "classes_", []))
+        self._win_column = classes.index(1) if 1 in classes else None
+
+    def home_win_probability(self, games):
+        """
+        Arguments:
+            games - DataFrame with one row per game and (at least) the feature
+                    columns the model was trained on, e.g. rows of prediction_df
+        Returns:
+            float array of home win probabilities. Models without predict_proba
+            (hard voting, SVC without probability) give 0/1 predictions. Raises
+            ValueError if games is missing any of the feature columns.
+        """
+        missing = [column for column in self.feature_columns if column not in games.columns]
+        if missing:
+            raise ValueError("games is missing feature columns the model was trained on: %s" % ", ".join(missing))
+        X = games[self.feature_columns]
+        if self._win_column is not None and hasattr(self.pipeline, "predict_proba"):
+            return(self.pipeline.predict_proba(X)[:, self._win_column])
+        return(np.asarray(self.pipeline.predict(X), dtype=float))
+
+    def score_slate(self, store, schedule, season=None):
+        """
+        Arguments:
+            store - FeatureStore that's up to date with every finished game
+            schedule - DataFrame of the games to score with gameID, homeTeamID and
+                       awayTeamID, e.g. tonight's rows of get_schedule
+            season - Season in the "2019/2020" format. Defaults to the season of
+                     each gameID.
+        Returns:
+            DataFrame with gameID, homeTeamID, awayTeamID and homeWinProbability.
+            Games where a team hasn't played yet this season are left out.
+        Example:
+            model = ModelRegistry("models/").load("season_rf")
+            schedule = get_schedule("2019")
+            model.score_slate(store, schedule[schedule.date == "2019-11-30"])
+        """
+        rows, games = [], []
+        for game in schedule[["gameID", "homeTeamID", "awayTeamID"]].itertuples(index=False):
+            game_season = season
+            if game_season is None:
+                year = int(str(game.gameID)[0:4])
+                game_season = str(year) + "/" + str(year + 1)
+            features = store.pregame_features(game.homeTeamID, game.awayTeamID, game_season)
+            if features is not None:
+                rows.append(features)
+                games.append(game)
+        slate = pd.DataFrame(games, columns=["gameID", "homeTeamID", "awayTeamID"])
+        slate["homeWinProbability"] = self.home_win_probability(pd.DataFrame(rows)) if rows else []
+        return(slate)
+
+
+class ModelRegistry:
+    """
+    Arguments:
+        directory - Directory the models are saved in. Character.
+    Returns:
+        Object that saves fitted transformer + estimator pipelines with the hash
+        of the data they were trained on and loads them back for scoring, so
+        predicting a game doesn't need anything to be refit
+    Example:
+        registry = ModelRegistry("models/")
+        registry.save_fit("season_rf", season_models["2020"], model_index=3)
+        model = registry.load("season_rf")
+        model.home_win_probability(prediction_df[prediction_df.season == "2020/2021"])
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name, version, *parts):
+        return(os.path.join(self.directory, name, version, *parts))
+
+    def save(self, name, estimator, feature_columns, transformer=None, version=None, **metadata):
+        """
+        Arguments:
+            name - Name to save the model under. Character.
+            estimator - Fitted estimator
+            feature_columns - Columns of the data the transformer/estimator expects, in order
+            transformer - Optional fitted transformer applied before the estimator
+            version - Data version, see data_version. Defaults to the save time.
+            metadata - Anything else to keep with the model, e.g. test_accuracy
+        Returns:
+            The version the model was saved as
+        """
+        version = version or datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+        pipeline = Pipeline([("transformer", transformer), ("model", estimator)]) if transformer else estimator
+        os.makedirs(self._path(name, version), exist_ok=True)
+        # saved uncompressed so the arrays can be memory mapped when loading
+        joblib.dump(pipeline, self._path(name, version, "model.joblib"))
+        metadata = dict(metadata, name=name, version=version, feature_columns=list(feature_columns),
+                        estimator=type(estimator).__name__, saved=datetime.datetime.now().isoformat())
+        with open(self._path(name, version, "metadata.json"), "w") as f:
+            json.dump(metadata, f, indent=2, default=str)
+        with open(os.path.join(self.directory, name, "latest"), "w") as f:
+            f.write(version)
+        return(version)
+
+    def save_fit(self, name, fit_mods, model_index=0, data=None):
+        """
+        Arguments:
+            name - Name to save the model under. Character.
+            fit_mods - Output of fit_optimize_season_model (or best_model with X_train/y_train added)
+            model_index - Position of the model in fit_mods["best_models"]
+            data - The modeling data, only needed for lean fit_optimize_season_model output
+        Returns:
+            The version the model was saved as, the hash of its training data
+        """
+        if "X_train" in fit_mods:
+            X_train, y_train = fit_mods["X_train"], fit_mods["y_train"]
+        else:
+            X_train, _, y_train, _ = season_split(data, fit_mods)
+        return(self.save(name, fit_mods["best_models"][model_index], X_train.columns,
+                         transformer=fit_mods["transformer"],
+                         version=data_version(X_train, y_train),
+                         season=fit_mods["season"][model_index] if "season" in fit_mods else None,
+                         train_rows=len(X_train),
+                         train_accuracy=fit_mods["train_accuracy"][model_index],
+                         test_accuracy=fit_mods["test_accuracy"][model_index]))
+
+    def versions(self, name):
+        """
+        Returns:
+            Metadata dictionaries of every saved version of the model, oldest first
+        """
+        metadata = []
+        for version in os.listdir(os.path.join(self.directory, name)):
+            path = self._path(name, version, "metadata.json")
+            if os.path.exists(path):
+                with open(path) as f:
+                    metadata.append(json.load(f))
+        return(sorted(metadata, key=lambda version: version["saved"]))
+
+    def load(self, name, version=None, mmap_mode="r"):
+        """
+        Arguments:
+            name - Name the model was saved under. Character.
+            version - Version to load. Defaults to the latest one saved.
+            mmap_mode - Passed to joblib.load. "r" memory maps the model's arrays.
+        Returns:
+            ScoringModel
+        """
+        if version is None:
+            with open(os.path.join(self.directory, name, "latest")) as f:
+                version = f.read().strip()
+        with open(self._path(name, version, "metadata.json")) as f:
+            metadata = json.load(f)
+        return(ScoringModel(joblib.load(self._path(name, version, "model.joblib"), mmap_mode=mmap_mode), metadata))
@@ -0,0 +1,41 @@
+import pandas as pd
+from game import *
+import time
+import os
+import sys
+
+
+if __name__ == "__main__":
+    # rebuilds the season CSVs only from game feeds already saved in the cache
+    # by scrape_games_year.py. Nothing is downloaded.
+    # usage: python replay_games_year.py <year> <data_dir> <cache_dir> [events]
+    try:
+        year = int(sys.argv[1])
+    except ValueError:
+        raise ValueError("Value for year must be numeric.")
+    data_dir = str(sys.argv[2])
+    if not os.path.isdir(data_dir):
+        raise ValueError("The data directory must exist.")
+    cache_dir = str(sys.argv[3])
+    if not os.path.isdir(cache_dir):
+        raise ValueError("The cache directory must exist.")
+    configure(cache=cache_dir, offline=True)
+    # optional "events" to also build the play-by-play table and the shot attempt
+    # counts in the team stats
+    events = len(sys.argv) > 4 and sys.argv[4] == "events"
+    
+    start = time.time()
+    
+    # building every table from the cached feeds
+    season_tables = get_season_tables(str(year), events=events)
+    
+    end = time.time()
+    print("Rebuilding from the cache took:", round(end - start, 2), "seconds")
+    
+    # also saving typed, season partitioned Parquet copies if pyarrow is installed
+    try:
+        import pyarrow
+        parquet_dir = os.path.join(data_dir, "parquet")
+    except ImportError:
+        parquet_dir = None
+    write_season_tables(season_tables, data_dir, year, parquet_dir)
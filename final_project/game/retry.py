@@ -0,0 +1,214 @@
+import collections
+import datetime
+import email.utils
+import random
+import threading
+import time
+import requests
+
+# retry policy for the fetcher. Errors are classified so only the ones worth
+# retrying are, retries back off exponentially with jitter (longer if the API
+# sends Retry-After), and an AIMD controller keeps the number of requests in
+# flight near what the API will take: one more after every window of healthy
+# responses, half as many after it throttles. Links that still fail go into a
+# RetryQueue instead of being dropped.
+
+# error classes. throttled and server errors mean the API is overloaded, so the
+# concurrency is cut for them as well as retrying
+THROTTLED, SERVER, TIMEOUT, CONNECTION, NOT_FOUND, CLIENT, OTHER = \
+    "throttled", "server", "timeout", "connection", "not_found", "client", "other"
+retryable_errors = {THROTTLED, SERVER, TIMEOUT, CONNECTION}
+overload_errors = {THROTTLED, SERVER, TIMEOUT}
+
+
+def classify(error):
+    """
+    Arguments:
+        error - Exception raised while fetching a link
+    Returns:
+        "throttled" for 429s, "server" for 5xx, "timeout", "connection",
+        "not_found" for 404s (e.g. a guessed game ID that doesn't exist),
+        "client" for other 4xx and "other" for anything else
+    """
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        status = error.response.status_code
+        if status == 429:
+            return(THROTTLED)
+        if status >= 500:
+            return(SERVER)
+        if status == 404:
+            return(NOT_FOUND)
+        return(CLIENT)
+    if isinstance(error, requests.Timeout):
+        return(TIMEOUT)
+    if isinstance(error, requests.ConnectionError):
+        return(CONNECTION)
+    return(OTHER)
+
+
+def is_retryable(error):
+    return(classify(error) in retryable_errors)
+
+
+def retry_after(error):
+    """
+    Returns:
+        Seconds the response's Retry-After header asks to wait, in either the
+        seconds or the HTTP date form. None if there is no usable header.
+    """
+    response = getattr(error, "response", None)
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return(None)
+    try:
+        return(max(0.0, float(value)))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return(None)
+    return(max(0.0, (when - datetime.datetime.now(datetime.timezone.utc)).total_seconds()))
+
+
+class RetryPolicy:
+    """
+    Arguments:
+        max_retries - Retries after the first attempt. Integer.
+        base_delay - Seconds the backoff starts at. Float.
+        max_delay - Most seconds the exponential backoff waits before one retry. Float.
+        retry_on - Error classes to retry, see classify
+        max_retry_after - Most seconds a response's Retry-After is honored for,
+                          so a bad header can't stall the scrape. Float.
+    Returns:
+        Policy the fetcher uses to decide whether and how long to wait before
+        trying a link again. Delays are "full jitter" exponential backoff, a
+        uniform draw up to base_delay*2**attempt capped at max_delay, and never
+        shorter than the response's Retry-After (up to max_retry_after).
+    Example:
+        configure(retry=RetryPolicy(max_retries=6, max_delay=60))
+    """
+    def __init__(self, max_retries=4, base_delay=0.5, max_delay=30.0, retry_on=retryable_errors,
+                 max_retry_after=300.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self.retry_on = set(retry_on)
+
+    def should_retry(self, error, attempt):
+        return(attempt < self.max_retries and classify(error) in self.retry_on)
+
+    def delay(self, attempt, error=None):
+        """
+        Arguments:
+            attempt - Number of attempts that have failed so far minus one
+            error - The exception that failed the attempt
+        Returns:
+            Seconds to wait before the next attempt
+        """
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        wait = self.retry_after(error) if error is not None else None
+        return(max(backoff, wait) if wait is not None else backoff)
+
+    def retry_after(self, error):
+        """
+        Returns:
+            Seconds the error's Retry-After asks to wait, at most max_retry_after.
+            None if there is no usable header.
+        """
+        wait = retry_after(error)
+        return(min(wait, self.max_retry_after) if wait is not None else None)
+
+
+class AdaptiveConcurrency:
+    """
+    Arguments:
+        maximum - Most requests in flight. Usually the fetcher's max_workers.
+        minimum - Fewest requests in flight the limit can be cut to
+        initial - Limit to start at. Defaults to maximum.
+        decrease - Factor the limit is multiplied by when the API is overloaded
+        cooldown - Seconds after a cut before the limit can be cut again, so a
+                   burst of 429s from requests already in flight only counts once
+    Returns:
+        AIMD (additive increase, multiplicative decrease) limit on the requests
+        in flight. After limit healthy responses in a row the limit goes up by
+        one, and a throttled, 5xx or timed out response multiplies it by
+        decrease, so it settles just under what the API allows.
+    Example:
+        controller = AdaptiveConcurrency(maximum=32)
+        controller.acquire()
+        response = session.get(url)
+        controller.release(healthy=response.status_code not in (429, 503))
+    """
+    def __init__(self, maximum, minimum=1, initial=None, decrease=0.5, cooldown=1.0):
+        self.maximum = maximum
+        self.minimum = minimum
+        self.limit = float(initial if initial is not None else maximum)
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self._healthy = 0
+        self._last_cut = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, healthy):
+        """
+        Arguments:
+            healthy - False if the API was overloaded (throttled, 5xx, timeout)
+        """
+        with self._condition:
+            self.in_flight -= 1
+            if healthy:
+                self._healthy += 1
+                if self._healthy >= int(self.limit) and self.limit < self.maximum:
+                    self.limit = min(self.maximum, self.limit + 1)
+                    self._healthy = 0
+            else:
+                self._healthy = 0
+                now = time.monotonic()
+                if now - self._last_cut >= self.cooldown:
+                    self.limit = max(self.minimum, self.limit * self.decrease)
+                    self._last_cut = now
+            self._condition.notify_all()
+
+
+class RetryQueue:
+    """
+    Returns:
+        Thread safe, ordered collection of the items (e.g. game IDs) that still
+        failed after every retry, with their last error, so they can be tried
+        again at the end of a run or reported instead of silently disappearing
+    Example:
+        for game_id, error in get_fetcher().retry_queue.items():
+            print(game_id, classify(error))
+    """
+    def __init__(self):
+        self._items = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, item, error):
+        with self._lock:
+            self._items[item] = error
+
+    def discard(self, item):
+        with self._lock:
+            self._items.pop(item, None)
+
+    def items(self):
+        with self._lock:
+            return(list(self._items.items()))
+
+    def __contains__(self, item):
+        with self._lock:
+            return(item in self._items)
+
+    def __len__(self):
+        with self._lock:
+            return(len(self._items))
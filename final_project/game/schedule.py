@@ -0,0 +1,64 @@
+import pandas as pd
+try:
+    from .fetch import get_fetcher
+except ImportError:
+    from fetch import get_fetcher
+
+# game ID type codes and the matching schedule gameType values
+game_type_codes = {"01": "PR", "02": "R", "03": "P", "04": "A"}
+
+# schedules already built this session, keyed by (season, game types)
+_schedules = {}
+
+
+def schedule_link(season, game_types=("02",)):
+    season = str(season)
+    season = season if len(season) == 8 else season + str(int(season) + 1)
+    types = ",".join(game_type_codes[game_type] for game_type in game_types)
+    return(f"/api/v1/schedule?season=%s&gameType=%s" % (season, types))
+
+
+def get_schedule(season, game_types=("02",)):
+    """
+    Arguments:
+        season - Start of a particular season. Character. Example: "2017"
+                 for the 2017/2018 season
+        game_types - Game ID type codes to include. "02" for the regular season,
+                     "03" for the playoffs. Defaults to the regular season.
+    Returns:
+        DataFrame with one row per scheduled game: gameID, season, date,
+        dateTime, gameType, state (Preview, Live or Final), final, homeTeamID,
+        awayTeamID and venue.
+        Built from a single schedule request, which is saved in the fetcher's
+        cache when one is configured.
+    Example:
+        schedule = get_schedule("2019", game_types=("02", "03"))
+        schedule[schedule.final].gameID
+    """
+    key = (str(season), tuple(game_types))
+    if key not in _schedules:
+        schedule_json = get_fetcher().get_json(schedule_link(season, game_types))
+        rows = []
+        for date in schedule_json['dates']:
+            for game in date['games']:
+                data = {}
+                data['gameID'] = str(game['gamePk'])
+                data['season'] = game.get('season')
+                data['date'] = date['date']
+                data['dateTime'] = game.get('gameDate')
+                data['gameType'] = game['gameType']
+                data['state'] = game['status']['abstractGameState']
+                data['final'] = data['state'] == "Final"
+                data['homeTeamID'] = game['teams']['home']['team']['id']
+                data['awayTeamID'] = game['teams']['away']['team']['id']
+                data['venue'] = game.get('venue', {}).get('name')
+                rows.append(data)
+        schedule = pd.DataFrame(rows, columns=['gameID', 'season', 'date', 'dateTime', 'gameType', 'state', 'final',
+                                               'homeTeamID', 'awayTeamID', 'venue'])
+        # postponed games show up on more than one date, keeping the latest one
+        schedule = schedule.drop_duplicates("gameID", keep="last").sort_values("gameID", ignore_index=True)
+        # only keeping completed seasons around, the current one can still change
+        if len(schedule) and schedule.final.all():
+            _schedules[key] = schedule
+        return(schedule)
+    return(_schedules[key])
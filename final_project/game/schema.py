@@ -0,0 +1,297 @@
+import array
+import collections
+import numpy as np
+import pandas as pd
+
+# declarative definitions of the tables built from a game feed. Each table is a
+# row source (what one row is, e.g. one official or one skater) and a list of
+# fields, each with a path into the feed and a type. The paths are compiled into
+# accessor functions once, and season builds append straight into typed column
+# buffers instead of making a dictionary per row.
+#
+# A path is "<scope>:<key>.<key>...", where the scope is
+#   game - the whole /feed/live JSON
+#   row  - the current row's object, e.g. a boxscore player
+#   team - the gameData team of the row's side (home or away)
+#   side - the row's side itself, "home" or "away"
+# A field can also be a function of (game, row, side) for derived values.
+
+Field = collections.namedtuple("Field", ["name", "path", "dtype", "optional"])
+
+
+def field(name, path, dtype="str", optional=False):
+    """
+    Arguments:
+        name - Column name
+        path - "<scope>:<key>.<key>" path of the value, or a function of (game, row, side)
+        dtype - "int", "float", "bool" or "str"
+        optional - If True a missing last key gives a missing value instead of
+                   an error, e.g. a stat that isn't in every boxscore
+    """
+    return(Field(name, path, dtype, optional))
+
+
+def _home_win(game, row, side):
+    teams = game['liveData']['linescore']['teams']
+    return(teams['home']['goals'] > teams['away']['goals'])
+
+
+# row sources, each yields (row, side) pairs for a game
+def _game_rows(game):
+    yield(game, None)
+
+
+def _official_rows(game):
+    for official in game['liveData']['boxscore']['officials']:
+        yield(official, None)
+
+
+def _team_rows(game):
+    for side in ['home', 'away']:
+        yield(game['liveData']['boxscore']['teams'][side], side)
+
+
+# skaters and goalies only differ in the position filter and the stats key.
+# Players without that stats block (scratches, backup goalies that didn't play)
+# aren't rows
+def _player_rows(goalies):
+    stats_key = "goalieStats" if goalies else "skaterStats"
+
+    def rows(game):
+        for side in ['home', 'away']:
+            for player in game['liveData']['boxscore']['teams'][side]['players'].values():
+                position = player['position']['code']
+                if (position == "G") != goalies or position == "N/A":
+                    continue
+                if not isinstance(player['stats'].get(stats_key), dict):
+                    continue
+                yield(player, side)
+    return(rows)
+
+
+# stats copied from one block of the row, e.g. a skater's stats.skaterStats
+def _stats(prefix, fields):
+    return([field(name, "row:%s.%s" % (prefix, name), dtype, optional=True) for name, dtype in fields])
+
+
+_player_fields = [
+    field("gameID", "game:gamePk", "int"),
+    field("playerID", "row:person.id", "int"),
+    field("fullName", "row:person.fullName"),
+    field("position", "row:position.code"),
+    field("homeAway", "side:"),
+    field("teamID", "team:id", "int"),
+    field("teamName", "team:name"),
+]
+
+Table = collections.namedtuple("Table", ["rows", "fields"])
+
+tables = {
+    "game_results": Table(_game_rows, [
+        field("gameID", "game:gamePk", "int"),
+        field("season", "game:gameData.game.season"),
+        field("dateTime", "game:gameData.datetime.dateTime"),
+        field("gameType", "game:gameData.game.type"),
+        field("homeTeamID", "game:gameData.teams.home.id", "int"),
+        field("homeTeamName", "game:gameData.teams.home.name"),
+        field("awayTeamID", "game:gameData.teams.away.id", "int"),
+        field("awayTeamName", "game:gameData.teams.away.name"),
+        field("homeGoals", "game:liveData.linescore.teams.home.goals", "int"),
+        field("awayGoals", "game:liveData.linescore.teams.away.goals", "int"),
+        field("homeTeamWin", _home_win, "bool"),
+        field("venue", "game:gameData.venue.name"),
+    ]),
+    "game_officials": Table(_official_rows, [
+        field("gameID", "game:gamePk", "int"),
+        field("officialName", "row:official.fullName"),
+        field("officialType", "row:officialType"),
+    ]),
+    "game_team_stats": Table(_team_rows, [
+        field("gameID", "game:gamePk", "int"),
+        field("homeAway", "side:"),
+        field("homeTeamWin", _home_win, "bool"),
+        field("periodsPlayed", "game:liveData.linescore.currentPeriod", "int"),
+        field("headCoach", lambda game, row, side: row['coaches'][0]['person']['fullName']),
+        field("teamID", "team:id", "int"),
+        field("teamName", "team:name"),
+    ] + _stats("teamStats.teamSkaterStats", [
+        ("goals", "int"), ("pim", "int"), ("shots", "int"), ("powerPlayPercentage", "float"),
+        ("powerPlayGoals", "int"), ("powerPlayOpportunities", "int"), ("faceOffWinPercentage", "float"),
+        ("blocked", "int"), ("takeaways", "int"), ("giveaways", "int"), ("hits", "int")
+    ])),
+    "game_player_stats": Table(_player_rows(goalies=False), _player_fields + _stats("stats.skaterStats", [
+        ("timeOnIce", "str"), ("assists", "int"), ("goals", "int"), ("shots", "int"), ("hits", "int"),
+        ("powerPlayGoals", "int"), ("powerPlayAssists", "int"), ("penaltyMinutes", "int"), ("faceOffPct", "float"),
+        ("faceOffWins", "int"), ("faceoffTaken", "int"), ("takeaways", "int"), ("giveaways", "int"),
+        ("shortHandedGoals", "int"), ("shortHandedAssists", "int"), ("blocked", "int"), ("plusMinus", "int"),
+        ("evenTimeOnIce", "str"), ("powerPlayTimeOnIce", "str"), ("shortHandedTimeOnIce", "str")
+    ])),
+    "game_goalie_stats": Table(_player_rows(goalies=True), _player_fields + _stats("stats.goalieStats", [
+        ("timeOnIce", "str"), ("assists", "int"), ("goals", "int"), ("pim", "int"), ("shots", "int"),
+        ("saves", "int"), ("powerPlaySaves", "int"), ("shortHandedSaves", "int"), ("evenSaves", "int"),
+        ("shortHandedShotsAgainst", "int"), ("evenShotsAgainst", "int"), ("powerPlayShotsAgainst", "int"),
+        ("decision", "str"), ("savePercentage", "float"), ("powerPlaySavePercentage", "float"),
+        ("shortHandedSavePercentage", "float"), ("evenStrengthSavePercentage", "float")
+    ])),
+}
+
+
+_scopes = {"game": "game", "row": "row", "side": "side", "team": "game['gameData']['teams'][side]"}
+
+
+def compile_table(table_fields):
+    """
+    Arguments:
+        table_fields - List of Fields
+    Returns:
+        Function of (game, row, side) returning the tuple of every field's value,
+        compiled from generated source. Paths that share a prefix (e.g. all of a
+        skater's stats.skaterStats.* fields) look the prefix up once, e.g.
+            def values(game, row, side):
+                p0 = row['stats']['skaterStats']
+                return((game['gamePk'], row['person']['id'], ..., p0.get('goals'), ...))
+    """
+    namespace, prefixes, lines, values = {}, {}, [], []
+    for i, f in enumerate(table_fields):
+        if callable(f.path):
+            namespace["f%d" % i] = f.path
+            values.append("f%d(game, row, side)" % i)
+            continue
+        scope, _, keys = f.path.partition(":")
+        keys = keys.split(".") if keys else []
+        source = _scopes[scope]
+        if len(keys) > 1:
+            prefix = source + "".join("[%r]" % key for key in keys[:-1])
+            if prefix not in prefixes:
+                prefixes[prefix] = "p%d" % len(prefixes)
+                lines.append("    %s = %s" % (prefixes[prefix], prefix))
+            source = prefixes[prefix]
+        if keys:
+            source += ".get(%r)" % keys[-1] if f.optional else "[%r]" % keys[-1]
+        values.append(source)
+    source = "def values(game, row, side):\n%s\n    return((%s,))\n" % ("\n".join(lines), ", ".join(values))
+    exec(source, namespace)
+    return(namespace["values"])
+
+
+# row functions for every table, compiled once when the module is imported
+compiled = {name: compile_table(table.fields) for name, table in tables.items()}
+
+columns = {name: [f.name for f in table.fields] for name, table in tables.items()}
+
+
+def extract_values(table, game):
+    """
+    Returns:
+        List of tuples, one per row of table in the game, with the raw values in
+        the order of columns[table]. Raises if the feed is missing a required part.
+    """
+    values = compiled[table]
+    return([values(game, row, side) for row, side in tables[table].rows(game)])
+
+
+def extract_rows(table, game):
+    """
+    Returns:
+        List of dictionaries, one per row of table in the game. Used by the
+        extract_* functions in game.py.
+    """
+    names = columns[table]
+    return([dict(zip(names, values)) for values in extract_values(table, game)])
+
+
+# typed, growable column buffer. Numbers go into an array.array with the positions
+# of missing or unparseable values kept on the side
+class _Column:
+    typecodes = {"int": "q", "float": "d", "bool": "b"}
+    converters = {"int": int, "float": float, "bool": bool}
+
+    def __init__(self, dtype):
+        self.dtype = dtype
+        self.values = array.array(self.typecodes[dtype]) if dtype in self.typecodes else []
+        self.missing = []
+
+    def extend(self, values):
+        if self.dtype not in self.typecodes:
+            self.values.extend(values)
+            return
+        # a clean batch goes in with one C level extend, only batches with missing,
+        # text or float-as-int values are converted one at a time
+        start = len(self.values)
+        try:
+            self.values.extend(values)
+            return
+        except (TypeError, OverflowError):
+            # extend stops at the bad value, dropping what it already added
+            del self.values[start:]
+        convert = self.converters[self.dtype]
+        for i, value in enumerate(values):
+            try:
+                if value is None or value == "":
+                    raise ValueError
+                self.values.append(convert(value))
+            except (TypeError, ValueError):
+                self.values.append(0)
+                self.missing.append(start + i)
+
+    def to_series(self, name):
+        if self.dtype not in self.typecodes:
+            return(pd.Series(self.values, name=name, dtype=object))
+        values = np.array(self.values, dtype={"int": "int64", "float": "float64", "bool": "bool"}[self.dtype])
+        if not self.missing:
+            return(pd.Series(values, name=name))
+        mask = np.zeros(len(values), dtype=bool)
+        mask[self.missing] = True
+        if self.dtype == "float":
+            values[mask] = np.nan
+            return(pd.Series(values, name=name))
+        # nullable Int64/boolean instead of turning the whole column into floats
+        array_type = pd.arrays.IntegerArray if self.dtype == "int" else pd.arrays.BooleanArray
+        return(pd.Series(array_type(values, mask), name=name))
+
+
+class TableBuilder:
+    """
+    Arguments:
+        table_names - Tables to build. Defaults to every table in the schema.
+    Returns:
+        Object that appends each game's rows straight into typed column buffers
+        and turns them into DataFrames at the end, without a dictionary per row
+    Example:
+        builder = TableBuilder()
+        for game_id, feed in feeds:
+            builder.add(feed)
+        season_tables = builder.to_frames()
+    """
+    def __init__(self, table_names=None):
+        self.table_names = list(table_names or tables)
+        self.buffers = {table: [_Column(f.dtype) for f in tables[table].fields] for table in self.table_names}
+
+    def add(self, game):
+        """
+        Appends the game's rows to every table. A table that can't be built from
+        the feed is skipped for that game so the other tables are still kept.
+        Returns the names of the tables that failed.
+        """
+        failed = []
+        for table in self.table_names:
+            # the whole game is extracted before anything is appended so a failure
+            # can't leave the columns different lengths
+            try:
+                values = extract_values(table, game)
+            except Exception:
+                failed.append(table)
+                continue
+            if values:
+                for column, column_values in zip(self.buffers[table], zip(*values)):
+                    column.extend(column_values)
+        return(failed)
+
+    def to_frames(self):
+        """
+        Returns:
+            Dictionary of DataFrames, one for each table, with the schema's column order and types
+        """
+        return({table: pd.DataFrame({name: column.to_series(name)
+                                     for name, column in zip(columns[table], self.buffers[table])})
+                for table in self.table_names})
@@ -0,0 +1,39 @@
+import pandas as pd
+from game import *
+from feature_store import FeatureStore
+from registry import ModelRegistry
+import time
+import os
+import sys
+
+
+if __name__ == "__main__":
+    # scores every game on a date with a saved model and an up to date feature
+    # store. Nothing is refit.
+    # usage: python score_games_date.py <YYYY-MM-DD> <models_dir> <model_name> <feature_store.pkl> [output.csv]
+    game_date = str(sys.argv[1])
+    try:
+        pd.Timestamp(game_date)
+    except ValueError:
+        raise ValueError("Date must be in the YYYY-MM-DD format.")
+    models_dir = str(sys.argv[2])
+    if not os.path.isdir(models_dir):
+        raise ValueError("The models directory must exist.")
+    model_name = str(sys.argv[3])
+    store_path = str(sys.argv[4])
+    if not os.path.exists(store_path):
+        raise ValueError("The feature store file must exist.")
+    output = sys.argv[5] if len(sys.argv) > 5 else None
+
+    start = time.time()
+    model = ModelRegistry(models_dir).load(model_name)
+    store = FeatureStore.load(store_path)
+    # the season a date falls in starts in the fall
+    season_start = int(game_date[0:4]) if int(game_date[5:7]) >= 8 else int(game_date[0:4]) - 1
+    schedule = get_schedule(str(season_start), game_types=("02", "03"))
+    slate = model.score_slate(store, schedule[schedule.date == game_date])
+    end = time.time()
+    print(slate.to_string(index=False))
+    print("Scoring", len(slate), "games took:", round(end - start, 3), "seconds")
+    if output:
+        slate.to_csv(output, index=False)
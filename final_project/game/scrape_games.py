@@ -1,80 +1,30 @@
 import pandas as pd
-import functools
 from game import *
+from storage import CsvTableWriter
 import time
 
 data_dir = "/Users/sawyer/Desktop/data_science_denver/Spring_2021/capstone/homework/final_project/data/"
 
 
 if __name__ == "__main__":
-    # might as well time these for future reference. Each should take probably around 25 minutes
-    # give or take...
+    # downloading several games at once over a shared connection pool
+    configure(max_workers=8)
+    # might as well time these for future reference. Each game is downloaded once for
+    # all five tables so the whole thing should take around 25 minutes give or take...
     start = time.time()
     
-    # scraping game results from the past 10 seasons
-    all_game_results = [pd.DataFrame(get_season_game_results(str(year))) for year in range(2010, 2020)]
-    # reducing into a single dataframe
-    all_game_results_df = functools.reduce(lambda left, right: 
-                                 pd.concat([left, right], axis = 0, ignore_index=True),
-                    all_game_results)
-    all_game_results_df.to_csv(data_dir + "game_results.csv", index=False)
-    print("Game results saved in the directory below\n", data_dir + "game_results.csv\n")
+    # one streaming writer per table. Rows are appended to the CSVs in fixed size
+    # batches as the seasons are scraped so nothing builds up in memory
+    writers = {table: CsvTableWriter(data_dir + table + ".csv", columns=table_columns[table]) for table in table_names}
+    # scraping all of the tables from the past 10 seasons
+    for year in range(2010, 2020):
+        for rows in get_season_all(str(year)):
+            for table in table_names:
+                writers[table].write_rows(rows[table])
+        print("Finished the", str(year) + "/" + str(year+1), "season after", round((time.time() - start)/60, 2), "minutes")
+    for table in table_names:
+        writers[table].close()
+        print(table_descriptions[table] + " saved in the directory below\n", data_dir + table + ".csv\n")
     
     end = time.time()
     print("Scraping data took:", round((end - start)/60, 2), "minutes")
-    start = time.time()
-    
-    # scraping game results from the past 10 seasons
-    all_game_officials = [pd.DataFrame(get_game_officials(str(year))) for year in range(2010, 2020)]
-    # reducing into a single dataframe
-    all_game_officials_df = functools.reduce(lambda left, right: 
-                                 pd.concat([left, right], axis = 0, ignore_index=True),
-                    all_game_officials)
-    all_game_officials_df.to_csv(data_dir + "game_officials.csv", index=False)
-    print("Game officials saved in the directory below\n", data_dir + "game_officials.csv\n")
-    
-    end = time.time()
-    print("Scraping data took:", round((end - start)/60, 2), "minutes")
-    start = time.time()
-    
-    
-    # scraping game results from the past 10 seasons
-    all_team_stats = [pd.DataFrame(get_team_stats_season(str(year))) for year in range(2010, 2020)]
-    # reducing into a single dataframe
-    all_team_stats_df = functools.reduce(lambda left, right: 
-                                 pd.concat([left, right], axis = 0, ignore_index=True),
-                    all_team_stats)
-    all_team_stats_df.to_csv(data_dir + "game_team_stats.csv", index=False)
-    print("Team game statistics saved in the directory below\n", data_dir + "game_team_stats.csv\n")
-    
-    end = time.time()
-    print("Scraping data took:", round((end - start)/60, 2), "minutes")
-    start = time.time()
-    
-    
-    # scraping game results from the past 10 seasons
-    all_player_stats = [pd.DataFrame(get_player_stats_season(str(year))) for year in range(2010, 2020)]
-    # reducing into a single dataframe
-    all_player_stats_df = functools.reduce(lambda left, right: 
-                                 pd.concat([left, right], axis = 0, ignore_index=True),
-                    all_player_stats)
-    all_player_stats_df.to_csv(data_dir + "game_player_stats.csv", index=False)
-    print("Player game statistics saved in the directory below\n", data_dir + "game_player_stats.csv\n")
-    
-    end = time.time()
-    print("Scraping data took:", round((end - start)/60, 2), "minutes")
-    start = time.time()
-    
-    
-    # scraping game results from the past 10 seasons
-    all_goalie_stats = [pd.DataFrame(get_goalie_stats_season(str(year))) for year in range(2010, 2020)]
-    # reducing into a single dataframe
-    all_goalie_stats_df = functools.reduce(lambda left, right: 
-                                 pd.concat([left, right], axis = 0, ignore_index=True),
-                    all_goalie_stats)
-    all_goalie_stats_df.to_csv(data_dir + "game_goalie_stats.csv", index=False)
-    print("Goalie game statistics saved in the directory below\n", data_dir + "game_goalie_stats.csv\n")
-    
-    end = time.time()
-    print("Scraping data took:", round((end - start)/60, 2), "minutes")
-    
\ No newline at end of file
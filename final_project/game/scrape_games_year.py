@@ -1,6 +1,7 @@
 import pandas as pd
 import functools
 from game import *
+from checkpoint import SeasonCheckpoint
 import time
 from datetime import date 
 import os
@@ -23,55 +24,75 @@ if __name__ == "__main__":
         raise ValueError("Directory to save data in must be a string.")
     if not os.path.isdir(data_dir):
         raise ValueError("The data directory must exist.")
+    # optional number of games to download at the same time
+    try:
+        max_workers = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+    except ValueError:
+        raise ValueError("Number of workers must be numeric.")
+    # optional directory to cache the raw game feeds in so reruns don't download
+    # finished games again
+    cache_dir = sys.argv[4] if len(sys.argv) > 4 else None
+    configure(max_workers=max_workers, cache=cache_dir)
+    # optional comma separated game types, e.g. 02,03 for the regular season and playoffs
+    game_types = tuple(sys.argv[5].split(",")) if len(sys.argv) > 5 else ("02",)
+    # optional "slim" to download the small boxscore/linescore endpoints instead of
+    # the full live feeds with the play-by-play, or "events" to also build the
+    # play-by-play table and the shot attempt counts in the team stats
+    slim = len(sys.argv) > 6 and sys.argv[6] == "slim"
+    events = len(sys.argv) > 6 and sys.argv[6] == "events"
+    # optional file to save the request and stage telemetry in, Prometheus text
+    # if it ends in .prom and JSON otherwise
+    telemetry_path = sys.argv[7] if len(sys.argv) > 7 else None
     
-    # might as well time these for future reference. Each should take probably around 2-3 minutes
-    # give or take...
-    start = time.time()
-    
-    # scraping game results from the desired season
-    all_game_results = pd.DataFrame(get_season_game_results(str(year)))
-    all_game_results.to_csv(data_dir + "game_results_" + str(year) + ".csv", index=False)
-    print("Game results from the " + str(year) + "/" + str(year+1) + " season saved in the directory below\n" + data_dir + "game_results_" + str(year) + ".csv\n", sep='')
-    
-    end = time.time()
-    print("Scraping data took:", round((end - start)/60, 2), "minutes")
-    start = time.time()
-    
-    # scraping game results from the desired season
-    all_game_officials = pd.DataFrame(get_game_officials(str(year)))
-    all_game_officials.to_csv(data_dir + "game_officials_" + str(year) + ".csv", index=False)
-    print("Game officials from the " + str(year) + "/" + str(year+1) + " season saved in the directory below\n" + data_dir + "game_officials_" + str(year) + ".csv\n", sep='')
-    
-    end = time.time()
-    print("Scraping data took:", round((end - start)/60, 2), "minutes")
-    start = time.time()
-    
-    
-    # scraping game results from the desired season
-    all_team_stats = pd.DataFrame(get_team_stats_season(str(year)))
-    all_team_stats.to_csv(data_dir + "game_team_stats_" + str(year) + ".csv", index=False)
-    print("Team game statistics from the " + str(year) + "/" + str(year+1) + " season saved in the directory below\n" + data_dir + "game_team_stats_" + str(year) + ".csv\n", sep='')
-    
-    end = time.time()
-    print("Scraping data took:", round((end - start)/60, 2), "minutes")
-    start = time.time()
-    
-    
-    # scraping game results from the desired season
-    all_player_stats = pd.DataFrame(get_player_stats_season(str(year)))
-    all_player_stats.to_csv(data_dir + "game_player_stats_" + str(year) + ".csv", index=False)
-    print("Player game statistics from the " + str(year) + "/" + str(year+1) + " season saved in the directory below\n" + data_dir + "game_player_stats_" + str(year) + ".csv\n", sep='')
-    
-    end = time.time()
-    print("Scraping data took:", round((end - start)/60, 2), "minutes")
+    # might as well time these for future reference. Downloading each game once for
+    # all five tables should take around 2-3 minutes give or take...
     start = time.time()
     
-    
-    # scraping game results from the desired season
-    all_goalie_stats = pd.DataFrame(get_goalie_stats_season(str(year)))
-    all_goalie_stats.to_csv(data_dir + "game_goalie_stats_" + str(year) + ".csv", index=False)
-    print("Goalie game statistics from the " + str(year) + "/" + str(year+1) + " season saved in the directory below\n" + data_dir + "game_goalie_stats_" + str(year) + ".csv\n", sep='')
+    # only the games that haven't been saved yet, or weren't final last time, get
+    # downloaded. Finished games are written out in chunks as the scrape goes so a
+    # crash only loses the current chunk
+    if events:
+        # the play-by-play needs every game's feed, including the ones a checkpoint
+        # already has the rows of, so the whole season goes through get_season_tables.
+        # With a cache_dir only games that weren't final last time are downloaded again
+        season_tables = get_season_tables(str(year), game_types=game_types, events=True)
+    else:
+        checkpoint = SeasonCheckpoint(data_dir, str(year))
+        # the schedule says which games exist and which have started, so nothing is
+        # requested for game IDs that don't exist or games that haven't been played yet
+        try:
+            schedule = get_schedule(str(year), game_types)
+            game_ids = schedule[schedule.state != "Preview"].gameID.to_list()
+        except Exception:
+            schedule = None
+            game_ids = season_game_ids(str(year), game_types)
+        game_ids = checkpoint.pending(game_ids)
+        print(len(game_ids), "games left to download for the", str(year) + "/" + str(year+1), "season")
+        for game_id, final, rows in get_game_tables(game_ids, slim=slim, schedule=schedule):
+            checkpoint.add(game_id, rows, final)
+        season_tables = checkpoint.compact(table_names)
+    # games that failed every retry aren't in the checkpoint, so rerunning the
+    # script picks them up again
+    retry_queue = get_fetcher().retry_queue
+    if len(retry_queue):
+        print("Rerun to retry these games:", ", ".join(str(game_id) for game_id, _ in retry_queue.items()))
     
     end = time.time()
     print("Scraping data took:", round((end - start)/60, 2), "minutes")
     
+    # also saving typed, season partitioned Parquet copies if pyarrow is installed.
+    # The play-by-play only goes to Parquet, or to a CSV without pyarrow
+    try:
+        import pyarrow
+        parquet_dir = os.path.join(data_dir, "parquet")
+    except ImportError:
+        parquet_dir = None
+    write_season_tables(season_tables, data_dir, year, parquet_dir)
+
+    # where the time went, stage seconds are summed over the download threads
+    telemetry = get_fetcher().telemetry
+    for stage, timing in telemetry.summary()["stages"].items():
+        print(stage, "took", round(timing["seconds"], 2), "seconds over", timing["count"], "runs")
+    if telemetry_path:
+        telemetry.export(telemetry_path)
+        print("Scrape telemetry saved in", telemetry_path)
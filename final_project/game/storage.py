@@ -0,0 +1,186 @@
+import os
+import pandas as pd
+
+# typed, season partitioned Parquet storage for the scraped tables plus a
+# streaming CSV writer. pyarrow is only needed once a Parquet file is actually
+# read or written
+
+# ID columns stored as int64 instead of being reparsed from CSV
+id_columns = ["gameID", "homeTeamID", "awayTeamID", "teamID", "playerID"]
+# repeated names stored as categoricals
+category_columns = ["homeTeamName", "awayTeamName", "teamName", "venue", "officialName",
+                    "officialType", "headCoach", "fullName", "position", "homeAway",
+                    "gameType", "decision"]
+# minutes:seconds columns stored as a number of seconds
+time_on_ice_columns = ["timeOnIce", "evenTimeOnIce", "powerPlayTimeOnIce", "shortHandedTimeOnIce"]
+# column every table is partitioned on, the year the season started
+partition_column = "seasonStart"
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+        return(pyarrow)
+    except ImportError:
+        raise ImportError("pyarrow is needed for the Parquet storage. Install it with `pip install pyarrow`.")
+
+
+# function to turn a minutes:seconds time on ice into seconds, e.g. "58:49" -> 3529
+def toi_to_seconds(x):
+    time = x.astype("string").str.split(":", n=1)
+    minutes = pd.to_numeric(time.str.get(0), errors="coerce")
+    seconds = pd.to_numeric(time.str.get(1), errors="coerce")
+    return((minutes * 60 + seconds).round().astype("Int32"))
+
+
+def prepare_table(df):
+    """
+    Arguments:
+        df - Scraped table, e.g. from get_season_tables or a *_full.csv. DataFrame.
+    Returns:
+        Copy of df with int64 IDs, categorical names, time on ice in seconds
+        and a seasonStart partition column taken from the gameID
+    """
+    df = df.copy()
+    for column in df.columns.intersection(id_columns):
+        df[column] = pd.to_numeric(df[column]).astype("int64")
+    for column in df.columns.intersection(category_columns):
+        df[column] = df[column].astype("category")
+    for column in df.columns.intersection(time_on_ice_columns):
+        if not pd.api.types.is_numeric_dtype(df[column]):
+            df[column] = toi_to_seconds(df[column])
+    if "season" in df.columns:
+        df["season"] = df["season"].astype(str)
+    df[partition_column] = (df["gameID"] // 1000000).astype("int16")
+    return(df)
+
+
+def write_table(df, name, root):
+    """
+    Arguments:
+        df - Scraped table. DataFrame.
+        name - Table name, e.g. "game_player_stats". Character.
+        root - Directory the Parquet datasets are kept in. Character.
+    Returns:
+        Nothing. Writes root/name/seasonStart=<year>/ partitions, replacing
+        the partitions of any seasons that are in df
+    Example:
+        write_table(season_tables["game_results"], "game_results", "data/parquet")
+    """
+    write_partitioned(prepare_table(df), name, root)
+
+
+def write_partitioned(df, name, root):
+    """
+    Arguments:
+        df - Table that already has its final types and a seasonStart column. DataFrame.
+        name - Table name. Character.
+        root - Directory the Parquet datasets are kept in. Character.
+    Returns:
+        Nothing. Writes df as is to the root/name/seasonStart=<year>/ partitions,
+        replacing the partitions of any seasons that are in df
+    """
+    pyarrow = _pyarrow()
+    table = pyarrow.Table.from_pandas(df, preserve_index=False)
+    pyarrow.parquet.write_to_dataset(table, os.path.join(root, name), partition_cols=[partition_column],
+                                     existing_data_behavior="delete_matching")
+
+
+def read_table(name, root, columns=None, seasons=None):
+    """
+    Arguments:
+        name - Table name, e.g. "game_player_stats". Character.
+        root - Directory the Parquet datasets are kept in. Character.
+        columns - Optional list of columns to load. Only those columns are read.
+        seasons - Optional list of season start years to load, e.g. [2019].
+                  Only the matching partitions are read.
+    Returns:
+        DataFrame of the table with the stored types
+    Example:
+        # one season of skater goals and time on ice
+        read_table("game_player_stats", "data/parquet", columns=["playerID", "goals", "timeOnIce"], seasons=[2019])
+    """
+    pyarrow = _pyarrow()
+    filters = [(partition_column, "in", [int(season) for season in seasons])] if seasons is not None else None
+    table = pyarrow.parquet.read_table(os.path.join(root, name), columns=columns, filters=filters,
+                                       memory_map=True)
+    df = table.to_pandas()
+    if partition_column in df.columns:
+        df[partition_column] = df[partition_column].astype("int16")
+    return(df)
+
+
+def csv_to_parquet(csv_path, name, root):
+    """
+    Arguments:
+        csv_path - Path of an existing table CSV, e.g. "data/game_results_full.csv"
+        name - Table name to save it as. Character.
+        root - Directory the Parquet datasets are kept in. Character.
+    Returns:
+        Nothing. Converts the CSV into the season partitioned Parquet dataset
+    """
+    write_table(pd.read_csv(csv_path), name, root)
+
+
+class CsvTableWriter:
+    """
+    Arguments:
+        path - CSV file to write. Character.
+        columns - Optional list of columns. Defaults to the columns of the
+                  first batch. Keys not in columns are dropped with a warning.
+        batch_size - Number of rows buffered before they are appended to the file.
+    Returns:
+        Writer that streams rows (dictionaries) to a CSV in fixed size
+        batches, so memory stays flat no matter how many seasons are written
+    Example:
+        with CsvTableWriter("data/game_results.csv", columns=table_columns["game_results"]) as writer:
+            for year in range(2010, 2020):
+                writer.write_rows(get_season_game_results(str(year)))
+    """
+    def __init__(self, path, columns=None, batch_size=10000):
+        self.path = path
+        self.columns = list(columns) if columns is not None else None
+        self.batch_size = batch_size
+        self.rows_written = 0
+        self._buffer = []
+        self._header_written = False
+        self._dropped = set()
+
+    def write(self, row):
+        self._buffer.append(row)
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.write(row)
+
+    def flush(self):
+        if not self._buffer:
+            return
+        batch = pd.DataFrame(self._buffer)
+        if self.columns is None:
+            self.columns = batch.columns.to_list()
+        dropped = set(batch.columns).difference(self.columns).difference(self._dropped)
+        if dropped:
+            print("Columns %s are not in the %s header and were dropped" % (sorted(dropped), self.path))
+            self._dropped.update(dropped)
+        batch.reindex(columns=self.columns).to_csv(self.path, mode="a" if self._header_written else "w",
+                                                   header=not self._header_written, index=False)
+        self._header_written = True
+        self.rows_written += len(batch)
+        self._buffer = []
+
+    def close(self):
+        self.flush()
+        # writing just the header if nothing was ever written
+        if not self._header_written and self.columns is not None:
+            pd.DataFrame(columns=self.columns).to_csv(self.path, index=False)
+            self._header_written = True
+
+    def __enter__(self):
+        return(self)
+
+    def __exit__(self, *args):
+        self.close()
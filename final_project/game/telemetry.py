@@ -0,0 +1,268 @@
+import bisect
+import contextlib
+import json
+import re
+import threading
+import time
+from urllib.parse import urlparse
+
+# counters and timers for the scraping hot paths. The fetcher records every
+# request (latency, response size, status code, retries) and cache lookup per
+# endpoint, and the scrapers time their stages (fetch, parse, flatten, write),
+# so a slow run can be pinned on the network, JSON decoding or building the
+# tables. Everything can be exported as a JSON summary or Prometheus text.
+
+# upper bounds of the latency histogram buckets in seconds, like Prometheus' defaults
+latency_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+
+
+def endpoint(link):
+    """
+    Arguments:
+        link - API link or url. Character.
+    Returns:
+        The link's endpoint with IDs replaced, e.g.
+        "/api/v1/game/2019020001/feed/live/" -> "game/{id}/feed/live" and
+        "/api/v1/people/8471214/stats?stats=..." -> "people/{id}/stats"
+    """
+    parts = [part for part in urlparse(link).path.split("/") if part]
+    if parts[0:1] == ["api"]:
+        parts = parts[2:]
+    return("/".join(re.sub(r"^\d+$", "{id}", part) for part in parts) or "/")
+
+
+class Histogram:
+    """
+    Arguments:
+        buckets - Increasing bucket upper bounds, the last one inf
+    Returns:
+        Fixed bucket histogram with the count and sum of the observations
+    """
+    def __init__(self, buckets=latency_buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """
+        Returns:
+            Estimate of the q quantile, interpolated within its bucket like
+            Prometheus' histogram_quantile. None if nothing was observed.
+        """
+        if self.count == 0:
+            return(None)
+        rank, seen = q * self.count, 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if self.buckets[i] != float("inf") else lower
+                return(lower + (upper - lower) * (rank - seen) / count)
+            seen += count
+        return(self.buckets[-2])
+
+
+def _round(value):
+    return(None if value is None else round(value, 6))
+
+
+class _Endpoint:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.bytes = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.statuses = {}
+        self.latency = Histogram()
+
+
+class Telemetry:
+    """
+    Returns:
+        Thread safe collector of per endpoint request stats and per stage
+        timers. Stage seconds are summed over every thread, so concurrent
+        fetch stages add up to more than the wall time.
+    Example:
+        telemetry = get_telemetry()
+        with telemetry.stage("write"):
+            df.to_csv(path)
+        telemetry.summary()
+        telemetry.export("scrape_metrics.prom")
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.endpoints = {}
+            self.stages = {}
+            self.gauges = {}
+            self.started = time.time()
+
+    def _endpoint(self, link):
+        name = endpoint(link)
+        if name not in self.endpoints:
+            self.endpoints[name] = _Endpoint()
+        return(self.endpoints[name])
+
+    def record_request(self, link, seconds, status=None, size=0, error=False):
+        """
+        Arguments:
+            link - API link requested
+            seconds - Time from sending the request to having the whole body
+            status - HTTP status code, None if no response came back
+            size - Response body size in bytes, after any gzip decoding
+            error - Whether the request failed
+        """
+        with self._lock:
+            stats = self._endpoint(link)
+            stats.requests += 1
+            stats.errors += int(error)
+            stats.bytes += size
+            status = str(status) if status is not None else "none"
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+            stats.latency.observe(seconds)
+
+    def record_retry(self, link):
+        with self._lock:
+            self._endpoint(link).retries += 1
+
+    def record_cache(self, link, hit):
+        with self._lock:
+            stats = self._endpoint(link)
+            if hit:
+                stats.cache_hits += 1
+            else:
+                stats.cache_misses += 1
+
+    def set_gauge(self, name, value):
+        """
+        Records the latest value of something that goes up and down, e.g. the fetcher's concurrency limit
+        """
+        with self._lock:
+            self.gauges[name] = value
+
+    def add_stage(self, name, seconds, count=1):
+        with self._lock:
+            stage = self.stages.setdefault(name, {"count": 0, "seconds": 0.0})
+            stage["count"] += count
+            stage["seconds"] += seconds
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        Times the with block as one run of the stage, e.g. "fetch", "parse", "flatten" or "write"
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.perf_counter() - start)
+
+    def summary(self):
+        """
+        Returns:
+            Dictionary with the elapsed time, every endpoint's request, error,
+            retry, status, byte and cache counts, cache hit ratio and latency
+            mean/p50/p90/p99, every stage's count and total seconds and the
+            latest value of every gauge
+        """
+        with self._lock:
+            endpoints = {}
+            for name, stats in sorted(self.endpoints.items()):
+                lookups = stats.cache_hits + stats.cache_misses
+                latency = stats.latency
+                endpoints[name] = {
+                    "requests": stats.requests, "errors": stats.errors, "retries": stats.retries,
+                    "statuses": dict(stats.statuses), "bytes": stats.bytes,
+                    "cache_hits": stats.cache_hits, "cache_misses": stats.cache_misses,
+                    "cache_hit_ratio": round(stats.cache_hits / lookups, 4) if lookups else None,
+                    "latency_seconds": {
+                        "mean": round(latency.sum / latency.count, 6) if latency.count else None,
+                        "p50": _round(latency.quantile(0.5)), "p90": _round(latency.quantile(0.9)),
+                        "p99": _round(latency.quantile(0.99)),
+                        "buckets": {str(bound): count for bound, count in zip(latency.buckets, latency.counts)}}}
+            stages = {name: {"count": stage["count"], "seconds": round(stage["seconds"], 6)}
+                      for name, stage in self.stages.items()}
+            return({"elapsed_seconds": round(time.time() - self.started, 3), "endpoints": endpoints, "stages": stages,
+                    "gauges": dict(self.gauges)})
+
+    def to_json(self):
+        return(json.dumps(self.summary(), indent=2))
+
+    def to_prometheus(self, prefix="nhl_scrape"):
+        """
+        Returns:
+            The metrics in the Prometheus text exposition format, e.g. for the
+            node exporter's textfile collector
+        """
+        with self._lock:
+            lines = []
+
+            def metric(name, kind, help_text, samples):
+                lines.append("# HELP %s_%s %s" % (prefix, name, help_text))
+                lines.append("# TYPE %s_%s %s" % (prefix, name, kind))
+                for labels, value in samples:
+                    label_text = ",".join('%s="%s"' % (key, value) for key, value in labels.items())
+                    lines.append("%s_%s{%s} %s" % (prefix, name, label_text, value))
+
+            endpoints = sorted(self.endpoints.items())
+            metric("requests_total", "counter", "API requests sent.",
+                   [({"endpoint": name}, stats.requests) for name, stats in endpoints])
+            metric("responses_total", "counter", "API responses by status code.",
+                   [({"endpoint": name, "status": status}, count) for name, stats in endpoints
+                    for status, count in sorted(stats.statuses.items())])
+            metric("request_errors_total", "counter", "API requests that failed.",
+                   [({"endpoint": name}, stats.errors) for name, stats in endpoints])
+            metric("request_retries_total", "counter", "API requests that were retried.",
+                   [({"endpoint": name}, stats.retries) for name, stats in endpoints])
+            metric("response_bytes_total", "counter", "Response body bytes received.",
+                   [({"endpoint": name}, stats.bytes) for name, stats in endpoints])
+            metric("cache_lookups_total", "counter", "Response cache lookups by result.",
+                   [({"endpoint": name, "result": result}, count) for name, stats in endpoints
+                    for result, count in (("hit", stats.cache_hits), ("miss", stats.cache_misses))])
+            lines.append("# HELP %s_request_seconds API request latency." % prefix)
+            lines.append("# TYPE %s_request_seconds histogram" % prefix)
+            for name, stats in endpoints:
+                cumulative = 0
+                for bound, count in zip(stats.latency.buckets, stats.latency.counts):
+                    cumulative += count
+                    lines.append('%s_request_seconds_bucket{endpoint="%s",le="%s"} %d'
+                                 % (prefix, name, "+Inf" if bound == float("inf") else bound, cumulative))
+                lines.append('%s_request_seconds_sum{endpoint="%s"} %s' % (prefix, name, stats.latency.sum))
+                lines.append('%s_request_seconds_count{endpoint="%s"} %d' % (prefix, name, stats.latency.count))
+            stages = sorted(self.stages.items())
+            metric("stage_seconds_total", "counter", "Seconds spent per scrape stage, summed over threads.",
+                   [({"stage": name}, stage["seconds"]) for name, stage in stages])
+            metric("stage_runs_total", "counter", "Times each scrape stage ran.",
+                   [({"stage": name}, stage["count"]) for name, stage in stages])
+            for name, value in sorted(self.gauges.items()):
+                lines.append("# HELP %s_%s Latest %s." % (prefix, name, name.replace("_", " ")))
+                lines.append("# TYPE %s_%s gauge" % (prefix, name))
+                lines.append("%s_%s %s" % (prefix, name, value))
+            return("\n".join(lines) + "\n")
+
+    def export(self, path):
+        """
+        Arguments:
+            path - File to write. Prometheus text if it ends in .prom, JSON otherwise.
+        """
+        text = self.to_prometheus() if path.endswith(".prom") else self.to_json()
+        with open(path, "w") as f:
+            f.write(text)
+
+
+# telemetry shared by the fetcher and the scraping functions
+_telemetry = Telemetry()
+
+
+def get_telemetry():
+    return(_telemetry)
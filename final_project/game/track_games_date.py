@@ -0,0 +1,29 @@
+import pandas as pd
+from game import *
+from live import LiveTracker, slate_game_ids
+import os
+import sys
+
+
+if __name__ == "__main__":
+    # follows every game on a date until they are all final, printing the rows that
+    # change. Only the feed diff patches are downloaded after each game's first poll.
+    # usage: python track_games_date.py <YYYY-MM-DD> [changes.csv]
+    game_date = str(sys.argv[1])
+    try:
+        pd.Timestamp(game_date)
+    except ValueError:
+        raise ValueError("Date must be in the YYYY-MM-DD format.")
+    # optional CSV to append the changed team stats rows to as they come in
+    output = sys.argv[2] if len(sys.argv) > 2 else None
+
+    def show(update):
+        changed = {table: len(rows) for table, rows in update.changes.items()}
+        print(update.game_id, update.state, update.timecode, changed)
+        if output and "game_team_stats" in update.changes:
+            pd.DataFrame(update.changes["game_team_stats"]).to_csv(output, mode="a", index=False,
+                                                                   header=not os.path.exists(output))
+
+    game_ids = slate_game_ids(game_date)
+    print(len(game_ids), "games to track on", game_date)
+    LiveTracker(game_ids, callback=show).run()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the tests import the game package the same way the notebooks do, from final_project/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
@@ -0,0 +1,30 @@
+import copy
+import os
+import sys
+from game.cache import FeedCache
+from game.feature_store import FeatureStore
+from game.game import game_link
+
+# the synthetic feeds the benchmarks replay, built from the repo CSVs
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir, "benchmarks"))
+from fixtures import build_game_fixtures
+
+
+def _final_feed(tmp_path):
+    cache = FeedCache(str(tmp_path), ttl=None)
+    game_id = build_game_fixtures(cache, "2019", n_games=1)[0]
+    return(cache.get(game_link(game_id)))
+
+
+def test_update_skips_feeds_that_are_not_final(tmp_path):
+    final = _final_feed(tmp_path)
+    store = FeatureStore()
+    for state in ["Preview", "Live"]:
+        feed = copy.deepcopy(final)
+        feed["gameData"]["status"]["abstractGameState"] = state
+        assert store.update(feed) is False
+        assert store.games == set() and store.teams == {}
+    # the final feed is still applied once the game is over, and only once
+    assert store.update(final) is True
+    assert store.games == {str(final["gamePk"])}
+    assert store.update(final) is False
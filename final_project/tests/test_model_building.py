@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import VotingClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score
+from sklearn.tree import DecisionTreeClassifier
+from game.model_building import best_model, lean_result
+
+
+def _labelled_data(labels):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(200, 3))
+    y = np.where(X[:, 0] + rng.normal(scale=0.3, size=200) > 0, labels[1], labels[0])
+    return(X[:150], y[:150], X[150:], y[150:])
+
+
+@pytest.mark.parametrize("labels", [("away", "home"), (0, 1), (3, 7)])
+def test_prefit_voting_predicts_original_labels(labels):
+    X_train, y_train, X_test, y_test = _labelled_data(labels)
+    out = best_model(X_train, y_train, X_test, y_test,
+                     {"LR": LogisticRegression(), "DT": DecisionTreeClassifier(random_state=0)},
+                     [{"C": [1.0]}, {"max_depth": [2]}], accuracy_score,
+                     ensemble_model=VotingClassifier, folds=3)
+    for voting, test_pred in zip(out["best_models"][-2:], out["test_preds"][-2:]):
+        predicted = voting.predict(X_test)
+        # the stored ensemble predicts the same labels best_model recorded for it
+        np.testing.assert_array_equal(predicted, test_pred)
+        assert set(predicted) <= set(labels)
+
+
+@pytest.mark.parametrize("dtype", [str, object])
+@pytest.mark.parametrize("spill", [False, True])
+def test_lean_result_keeps_string_predictions(tmp_path, dtype, spill):
+    X_train, y_train, X_test, y_test = _labelled_data(("away", "home"))
+    y_train, y_test = y_train.astype(dtype), y_test.astype(dtype)
+    out = best_model(X_train, y_train, X_test, y_test, {"LR": LogisticRegression()}, [{"C": [1.0]}],
+                     accuracy_score, folds=3)
+    expected = [np.array(pred) for pred in out["test_preds"]]
+    lean = lean_result(out, spill_dir=str(tmp_path) if spill else None)
+    for pred, original in zip(lean["test_preds"], expected):
+        np.testing.assert_array_equal(pred, original)
+        assert pred.dtype == original.dtype
+
+
+def test_lean_result_compacts_numeric_predictions():
+    out = lean_result({"train_preds": [np.array([0, 1, 1]), np.array([0.5, 1.5])],
+                       "test_preds": [np.array([1, 0], dtype=np.int64), np.array([2.0])]})
+    assert [pred.dtype for pred in out["train_preds"]] == [np.int8, np.float32]
+    assert [pred.dtype for pred in out["test_preds"]] == [np.int8, np.float32]
@@ -0,0 +1,162 @@
+import pandas as pd
+import difflib
+import os
+import re
+import unicodedata
+# matching spotrac salary rows to statsapi players without a shared ID
+
+# common first name short forms mapped to one spelling so "Cam Atkinson" and
+# "Cameron Atkinson" normalize to the same name
+nicknames = {
+    "alex": "alexander", "andy": "andrew", "ben": "benjamin", "cam": "cameron",
+    "charlie": "charles", "chris": "christopher", "dan": "daniel", "danny": "daniel",
+    "dave": "david", "ed": "edward", "gabe": "gabriel", "greg": "gregory",
+    "jake": "jacob", "jeff": "jeffrey", "jim": "james", "joe": "joseph",
+    "jon": "jonathan", "josh": "joshua", "ken": "kenneth", "kenny": "kenneth",
+    "matt": "matthew", "mike": "michael", "mitch": "mitchell", "nic": "nicholas",
+    "nick": "nicholas", "nicolas": "nicholas", "pat": "patrick", "phil": "philip",
+    "phillip": "philip", "rob": "robert", "sam": "samuel", "sammy": "samuel",
+    "steve": "steven", "stephen": "steven", "teddy": "theodor", "theodore": "theodor",
+    "tim": "timothy", "tom": "thomas", "tony": "anthony", "vinnie": "vincent",
+    "will": "william", "zach": "zachary", "zack": "zachary",
+}
+
+# statsapi position codes and spotrac's both grouped into forwards, defense and goalies.
+# Forwards are one group because the two sites don't always agree on C/LW/RW
+position_groups = {"C": "F", "L": "F", "R": "F", "LW": "F", "RW": "F", "F": "F", "D": "D", "G": "G"}
+
+# lowest similarity accepted within a team and position block, and within the wider
+# blocks for players listed at another position or on another team (trades)
+min_score = 0.8
+min_season_score = 0.9
+
+mapping_columns = ["player", "team", "season", "playerID", "fullName", "score"]
+
+
+def _ascii(text):
+    return(unicodedata.normalize("NFKD", str(text)).encode("ascii", "ignore").decode())
+
+
+def normalize_name(name):
+    """
+    Arguments:
+        name - Player name. Character. Example: "Gaëtan Haas"
+    Returns:
+        Lowercase name without accents or punctuation and with the first name's
+        nickname expanded, e.g. "J.T. Brown" -> "jt brown", "Cam Atkinson" ->
+        "cameron atkinson"
+    """
+    tokens = re.sub(r"[^a-z ]", "", re.sub(r"[-\s]+", " ", _ascii(name).lower())).split()
+    if tokens:
+        tokens[0] = nicknames.get(tokens[0], tokens[0])
+    return(" ".join(tokens))
+
+
+def team_slug(team):
+    """
+    Returns:
+        The spotrac team name for a statsapi one, e.g. "St. Louis Blues" -> "st-louis-blues"
+    """
+    return(re.sub(r"[^a-z]+", "-", _ascii(team).lower()).strip("-"))
+
+
+def name_score(a, b):
+    """
+    Arguments:
+        a, b - Normalized names
+    Returns:
+        Similarity between 0 and 1. Names where one is the other with extra
+        last name parts (e.g. "mats zuccarello" and "mats zuccarello aasen")
+        score 0.95, everything else is difflib's ratio.
+    """
+    if a == b:
+        return(1.0)
+    a_tokens, b_tokens = a.split(), b.split()
+    shorter, longer = sorted([a_tokens, b_tokens], key=len)
+    if len(shorter) > 1 and longer[:len(shorter)] == shorter:
+        return(0.95)
+    return(difflib.SequenceMatcher(None, a, b).ratio())
+
+
+# best one to one pairs of a block's salary and player rows, highest score first
+def _match_block(salary_names, player_names, threshold):
+    scores = sorted(((name_score(s_name, p_name), s, p)
+                     for s, s_name in salary_names.items() for p, p_name in player_names.items()),
+                    key=lambda pair: pair[0], reverse=True)
+    matched, used_salary, used_player = [], set(), set()
+    for score, s, p in scores:
+        if score < threshold:
+            break
+        if s not in used_salary and p not in used_player:
+            matched.append((s, p, score))
+            used_salary.add(s)
+            used_player.add(p)
+    return(matched)
+
+
+def _blocks(df, keys):
+    return({key: dict(zip(rows.index, rows["name_key"])) for key, rows in df.groupby(keys, sort=False)})
+
+
+def match_salaries(players, salaries, path=None):
+    """
+    Arguments:
+        players - Player season DataFrame from get_players_seasons (id, fullName,
+                  team, season and position columns)
+        salaries - Salary DataFrame from get_salaries (player, team, season and
+                   position columns)
+        path - Optional CSV the mapping is saved to. Salary rows already in it
+               aren't matched again, so reruns and new seasons only match the new rows.
+    Returns:
+        DataFrame with one row per matched salary row: its player, team and
+        season, and the playerID, fullName and score of the player it matched.
+        Names are normalized first and only compared within the same season,
+        team and position group. Rows left over are compared within the season
+        and team (position changes), then the season and position group
+        (trades), both with the stricter min_season_score.
+    Example:
+        mapping = match_salaries(player_df, salary_df, "data/salary_player_map.csv")
+        salary_df.merge(mapping, on=["player", "team", "season"])
+    """
+    mapping = pd.DataFrame(columns=mapping_columns)
+    if path is not None and os.path.exists(path):
+        mapping = pd.read_csv(path, dtype={"playerID": str, "season": str})
+
+    salaries = salaries[["player", "team", "season", "position"]].drop_duplicates(["player", "team", "season"]).reset_index(drop=True)
+    done = set(zip(mapping.player, mapping.team, mapping.season))
+    salaries = salaries[[key not in done for key in zip(salaries.player, salaries.team, salaries.season)]]
+    salaries = salaries.assign(
+        name_key=salaries.player.map(normalize_name),
+        season_key=salaries.season.astype(str).str.replace("/", "", regex=False),
+        group=salaries.position.map(position_groups))
+    # one row per player, team and season, the stats are the same for every team
+    players = players.drop_duplicates(["id", "team", "season"]).reset_index(drop=True)
+    players = players.assign(
+        name_key=players.fullName.map(normalize_name),
+        season_key=players.season.astype(str),
+        team=players.team.map(team_slug),
+        group=players.position.map(position_groups))
+
+    matched = []
+    salary_left, players_left = salaries, players
+    # the blocks from narrowest to widest, each only sees the rows the ones before didn't match
+    passes = [(["season_key", "team", "group"], min_score),
+              (["season_key", "team"], min_season_score),
+              (["season_key", "group"], min_season_score)]
+    for keys, threshold in passes:
+        player_blocks = _blocks(players_left, keys)
+        for key, salary_names in _blocks(salary_left, keys).items():
+            matched.extend(_match_block(salary_names, player_blocks.get(key, {}), threshold))
+        # a player can be on several teams' pages in a season but each row is only matched once
+        salary_left = salaries.drop(index=[s for s, p, score in matched])
+        players_left = players.drop(index=[p for s, p, score in matched])
+
+    salary_rows = salaries.loc[[s for s, p, score in matched], ["player", "team", "season"]].reset_index(drop=True)
+    player_rows = players.loc[[p for s, p, score in matched], ["id", "fullName"]].reset_index(drop=True)
+    new_mapping = pd.concat([salary_rows, player_rows.rename(columns={"id": "playerID"})], axis="columns")
+    new_mapping["score"] = [round(score, 3) for s, p, score in matched]
+    new_mapping = new_mapping.astype({"playerID": str, "season": str})
+    mapping = pd.concat([mapping, new_mapping], ignore_index=True) if len(mapping) else new_mapping
+    if path is not None and len(new_mapping):
+        mapping.to_csv(path, index=False)
+    return(mapping)
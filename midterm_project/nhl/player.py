@@ -1,8 +1,77 @@
 import pandas as pd
-import functools
-import requests
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
 # doing it the old fashion way
 
+# requests go through the final project's Fetcher, so the player scraper gets the
+# same pooled session, rate limiting, retries, adaptive concurrency, on disk
+# cache and telemetry as the game scraper instead of its own copies. It's imported
+# as the final_project.game package from the repository root, so it can't be
+# mistaken for final_project/game/game.py, which the scripts import as game
+_repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir))
+if _repo_root not in sys.path:
+    sys.path.append(_repo_root)
+from final_project.game.cache import FeedCache
+from final_project.game.fetch import Fetcher
+
+# setting the base API url for use throughout
+base_api = "https://statsapi.web.nhl.com"
+# seconds before a cached response that can still change is downloaded again
+cache_ttl = 7 * 24 * 60 * 60
+# fetchers for the statsapi and spotrac, see configure
+_fetcher = None
+_salary_fetcher = None
+
+
+def configure(base_api=base_api, max_workers=8, requests_per_second=20, salary_requests_per_second=2,
+              cache_dir=None, cache_ttl=cache_ttl, offline=False, **kwargs):
+    """
+    Arguments:
+        base_api - Base url of the statsapi. Character.
+        max_workers - Number of players (or salary pages) downloaded at the same time. Integer.
+        requests_per_second - Most statsapi requests per second, None for no limit
+        salary_requests_per_second - Most spotrac requests per second. spotrac asks
+                                     for a slower crawl than the statsapi.
+        cache_dir - Optional directory to cache raw responses in (gzip). None turns caching off.
+        cache_ttl - Seconds before a cached response that can still change is
+                    downloaded again. Seasons that have ended never are.
+        offline - Replay mode, only read from the cache. A response that isn't
+                  cached raises CacheMissError.
+        **kwargs - Any other Fetcher arguments, e.g. timeout, telemetry, retry, adaptive
+    Returns:
+        The new statsapi Fetcher. Both fetchers share the cache.
+    Example:
+        configure(cache_dir="cache/", max_workers=16)
+        pd.DataFrame(get_players_seasons(["20182019", "20192020"]))
+    """
+    global _fetcher, _salary_fetcher
+    for fetcher in (_fetcher, _salary_fetcher):
+        if fetcher is not None:
+            fetcher.close()
+    cache = FeedCache(cache_dir, ttl=cache_ttl) if cache_dir is not None else None
+    _fetcher = Fetcher(base_api, max_workers, requests_per_second, cache=cache, offline=offline, **kwargs)
+    _salary_fetcher = Fetcher(base_api, max_workers, salary_requests_per_second, cache=cache,
+                              offline=offline, **kwargs)
+    return(_fetcher)
+
+
+def get_fetcher(salary=False):
+    """
+    Returns:
+        The statsapi Fetcher, or the spotrac one if salary is True, creating
+        them with the default settings if needed
+    """
+    if _fetcher is None:
+        configure()
+    return(_salary_fetcher if salary else _fetcher)
+
+
+# helper function to GET a statsapi link, from the cache if one is configured
+def get_json(link):
+    return(get_fetcher().get_json(link))
+
 
 # function to pull player data/statistics. Collected from the NHL statsapi
 def get_players(season):
@@ -23,91 +92,216 @@ def get_players(season):
         
         pd.DataFrame(get_players("20192020"))
     """
-    # setting the base API url for use throughout
-    base_api = "https://statsapi.web.nhl.com"
+    yield from get_players_seasons([season])
+
+
+# stat types requested together in one call per player and season
+stat_types = "statsSingleSeason,goalsByGameSituation"
+# player 'characteristics' already downloaded, keyed by person ID. They barely
+# change so they're only requested the first time a player is seen
+_bios = {}
+
+
+def get_players_seasons(seasons):
+    """
+    Arguments:
+        seasons - List of seasons. Characters. Example: ["20182019", "20192020"]
+    Returns:
+        Generator of the same player dictionaries as get_players for every
+        season, in season, team and roster order. Every roster is downloaded
+        at the same time, each player is only requested once per season even
+        if they were on several rosters after a trade, and their bio and both
+        stat types come back in a single request.
+    Example:
+        pd.DataFrame(get_players_seasons(["20182019", "20192020"]))
+    """
     # getting the full list of teams
-    teams = requests.get(base_api + "/api/v1/teams").json()
-    # expand needed for getting the roster for the season
-    roster_link = f"?expand=team.roster&season=%s" % season
-    # looping through each team
-    for team in range(len(teams['teams'])):
-        # progress check
-        print(f"%s for %s season" % (teams['teams'][team]['name'], season))
-        # this is the link specific to the team
-        team_api = teams['teams'][team]['link']
-        # getting the roster for the team on each passthrough
-        roster = requests.get(base_api + team_api + "/roster" + roster_link).json()
-        # looping through each player on the roster to get their data/stats
-        for player in range(len(roster['roster'])):
-            # skipping goalies because they have completely different stats
-            if roster['roster'][player]['position']['code'] == "G":
-                continue
-            # collecting the player data now
-            else:
-                # initializing dictionary to grab everything
-                player_dict = {}
-                # unique player ID
-                player_id = roster['roster'][player]['person']['id']
-                # print(player_id)
-                # the API link for each unique player
-                player_link = roster['roster'][player]['person']['link']
-                # collecting player position and team
-                player_dict['position'] = roster['roster'][player]['position']['code']
-                player_dict['team'] = teams['teams'][team]['name']
-                player_dict['team_id'] = teams['teams'][team]['id']
-                
-                # getting the player 'characteristics' so to speak
-                player_char_json = requests.get(base_api + player_link).json()
-                
-                # looping through to add these data to the dictionary
-                for key in list(player_char_json['people'][0].keys())[:-2]:
-                        player_dict[key] = player_char_json['people'][0][key]
-                # getting the more traditional player statistics
-                stat_json = requests.get(base_api + player_link + f"/stats?stats=statsSingleSeason&season=%s" % season).json()['stats'][0]
-                # more detailed goal statistics
-                goal_json = requests.get(base_api + player_link + f"/stats?stats=goalsByGameSituation&season=%s" % season).json()['stats'][0]
-                # adding the season type (i.e. Regular Season, Playoff)) and season
-                player_dict['season_type'] = stat_json['type']['gameType']['id']
-                # player has no stats for the regular season if 'splits' is empty so skip player
-                if len(stat_json['splits']) == 0:
-                    continue
-                player_dict['season'] = stat_json['splits'][0]['season']
-                # looping through to add these data to the dictionary
-                for stat in stat_json['splits'][0]['stat'].keys():
-                    player_dict[stat] = stat_json['splits'][0]['stat'][stat]
-                # some players have scored no goals so checking for that, skipping if so
-                if len(goal_json['splits']) > 0:
-                    for goal in goal_json['splits'][0]['stat'].keys():
-                        player_dict[goal] = goal_json['splits'][0]['stat'][goal]
-                # yield the player dictionary at this point, then the loop will repeat
-                yield(player_dict)
+    teams = get_json("/api/v1/teams")['teams']
+    with ThreadPoolExecutor(max_workers=get_fetcher().max_workers) as executor:
+        # every team's roster for every season at once. expand needed for getting the roster for the season
+        team_seasons = [(season, team) for season in seasons for team in teams]
+        rosters = executor.map(lambda team_season: get_json(team_season[1]['link'] + "/roster" +
+                                                            f"?expand=team.roster&season=%s" % team_season[0]), team_seasons)
+        # skipping goalies because they have completely different stats
+        entries = [(season, team, player) for (season, team), roster in zip(team_seasons, rosters)
+                   for player in roster['roster'] if player['position']['code'] != "G"]
+        # one request per unique player and season, no matter how many rosters they're on
+        people = {(player['person']['id'], season): player['person'] for season, team, player in entries}
+        print(f"%s roster spots, %s unique player seasons" % (len(entries), len(people)))
+        player_seasons = dict(zip(people, executor.map(lambda key: _get_player_season(people[key], key[1]), people)))
+    for season, team, player in entries:
+        player_dict = _player_dict(player, team, *player_seasons[(player['person']['id'], season)])
+        # player has no stats for the regular season if None so skip player
+        if player_dict is not None:
+            yield(player_dict)
+
+
+# downloads a player's bio (the first time they're seen) and their season stats.
+# Returns the bio and the statsSingleSeason and goalsByGameSituation stat blocks
+def _get_player_season(person, season):
+    stats_link = person['link'] + f"/stats?stats=%s&season=%s" % (stat_types, season)
+    if person['id'] in _bios:
+        stats = get_json(stats_link)['stats']
+    else:
+        # the bio with the stats expanded into it
+        person_json = get_json(person['link'] + f"?expand=person.stats&stats=%s&season=%s" % (stat_types, season))['people'][0]
+        stats = person_json.get('stats')
+        _bios[person['id']] = {key: value for key, value in person_json.items() if key != 'stats'}
+        if stats is None:
+            stats = get_json(stats_link)['stats']
+    stat_blocks = {stat['type']['displayName']: stat for stat in stats}
+    return(_bios[person['id']], stat_blocks['statsSingleSeason'], stat_blocks.get('goalsByGameSituation'))
+
+
+# builds the dictionary for a single roster entry. Returns None if the player
+# has no stats for the season
+def _player_dict(player, team, bio, stat_json, goal_json):
+    # initializing dictionary to grab everything
+    player_dict = {}
+    # collecting player position and team
+    player_dict['position'] = player['position']['code']
+    player_dict['team'] = team['name']
+    player_dict['team_id'] = team['id']
+    # looping through to add the player 'characteristics' to the dictionary
+    for key in list(bio.keys())[:-2]:
+            player_dict[key] = bio[key]
+    # adding the season type (i.e. Regular Season, Playoff)) and season
+    player_dict['season_type'] = stat_json['type']['gameType']['id']
+    # player has no stats for the regular season if 'splits' is empty so skip player
+    if len(stat_json['splits']) == 0:
+        return(None)
+    player_dict['season'] = stat_json['splits'][0]['season']
+    # looping through to add these data to the dictionary
+    for stat in stat_json['splits'][0]['stat'].keys():
+        player_dict[stat] = stat_json['splits'][0]['stat'][stat]
+    # some players have scored no goals so checking for that, skipping if so
+    if goal_json is not None and len(goal_json['splits']) > 0:
+        for goal in goal_json['splits'][0]['stat'].keys():
+            player_dict[goal] = goal_json['splits'][0]['stat'][goal]
+    return(player_dict)
+
+# salary pages are on spotrac, one page per team and season
+salary_link = "https://www.spotrac.com/nhl/%s/cap/%s/"
+salary_columns = ["player", "position", 'age', 'base_salary',
+                  'signing_bonus', 'perf_bonus', 'total_salary', 'na',
+                  'total_cap_hit', 'adjusted_cap_hit', 'cap_pct']
+# dollar columns, e.g. "$1,950,000", turned into integers. "-" (no money) is 0
+money_columns = ['base_salary', 'signing_bonus', 'perf_bonus', 'total_salary',
+                 'total_cap_hit', 'adjusted_cap_hit']
+
+
+# GETs a team's salary page through the spotrac fetcher, slower than statsapi
+# requests. The raw HTML is cached when a cache_dir is configured so a rerun only parses
+def get_salary_html(team, year):
+    return(get_fetcher(salary=True).get_text(salary_link % (team, year)))
+
+
+# collects the text of every body cell of a single table, one list per row
+class _TableParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.rows = []
+        self._section = "tbody"
+        self._row = None
+        self._cell = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ("thead", "tbody", "tfoot"):
+            self._section = tag
+        elif tag == "tr":
+            self._row = []
+        elif tag in ("td", "th") and self._row is not None:
+            self._cell = []
+
+    def handle_endtag(self, tag):
+        if tag in ("td", "th") and self._cell is not None:
+            self._row.append(" ".join("".join(self._cell).split()))
+            self._cell = None
+        elif tag == "tr" and self._row is not None:
+            if self._row and self._section != "thead":
+                self.rows.append(self._row)
+            self._row = None
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell.append(data)
+
+
+def _money(values):
+    return(pd.to_numeric(values.str.replace(r"[$,\s]", "", regex=True).replace("-", "0"),
+                         errors="coerce").fillna(0).astype("int64"))
+
+
+def parse_salary_html(html, team, year):
+    """
+    Arguments:
+        html - A spotrac team cap page. Character.
+        team - Team the page is for, e.g. "san-jose-sharks"
+        year - Year the season started in. Integer.
+    Returns:
+        DataFrame of the page's first table (the active roster) with the
+        salary_columns except 'na', the money columns as integers, team and
+        season. None if the page has no table. Only the first table's markup
+        is parsed so it's fast enough to rebuild every season from cached or
+        saved pages.
+    Example:
+        with open("fixtures/san-jose-sharks_2018.html") as f:
+            parse_salary_html(f.read(), "san-jose-sharks", 2018)
+    """
+    start = html.find("<table")
+    if start == -1:
+        return(None)
+    end = html.find("</table>", start)
+    parser = _TableParser()
+    parser.feed(html[start:end + len("</table>") if end != -1 else len(html)])
+    parser.close()
+    rows = [row for row in parser.rows if len(row) == len(salary_columns)]
+    if not rows:
+        return(None)
+    data = pd.DataFrame(rows, columns=salary_columns).drop(columns=['na'])
+    data['age'] = pd.to_numeric(data['age'], errors="coerce").fillna(0).astype("int64")
+    data[money_columns] = data[money_columns].apply(_money)
+    data['cap_pct'] = pd.to_numeric(data['cap_pct'], errors="coerce")
+    data['team'] = team
+    data['season'] = f'%s/%s' % (year, year + 1)
+    return(data)
+
 
 # function to pull salary data
 def get_salary(team, year):
-    link = f"https://www.spotrac.com/nhl/%s/cap/%s/" % (team, year)
     # try/except because there's been an expansion lately and the site requires a subscription...
-    try: 
-        data = pd.read_html(link)[0]
-        data['team'] = team
-        data['season'] = f'%s/%s' % (year, year+1)
-        data.columns = ["player", "position", 'age', 'base_salary', 
-                       'signing_bonus', 'perf_bonus', 'total_salary', 'na',
-                       'total_cap_hit', 'adjusted_cap_hit', 'cap_pct',
-                       'team', 'season']
-        data.drop(columns = ['na'], inplace = True)
+    try:
+        data = parse_salary_html(get_salary_html(team, year), team, year)
+        if data is None:
+            raise ValueError("no salary table")
         return(data)
-    except:
+    except Exception:
         print(f"Salary data not available for %s for %s/%s season" % (team, year, year + 1))
 
-        
+
+def get_salaries(teams, years):
+    """
+    Arguments:
+        teams - List of spotrac team names, e.g. ["san-jose-sharks", "st-louis-blues"]
+        years - List of years the seasons started in. Integers.
+    Returns:
+        DataFrame of every team's salaries for every season, in year and team
+        order. Pages are downloaded at the same time (still under
+        salary_requests_per_second) and teams without salary data are left out.
+    Example:
+        configure(cache_dir="cache/")
+        get_salaries(["san-jose-sharks", "st-louis-blues"], [2018, 2019])
+    """
+    team_years = [(team, year) for year in years for team in teams]
+    with ThreadPoolExecutor(max_workers=get_fetcher(salary=True).max_workers) as executor:
+        salary_list = list(executor.map(lambda team_year: get_salary(*team_year), team_years))
+    return(pd.concat(salary_list, axis=0, ignore_index=True))
+
+
 if __name__ == "__main__":
 
-    # scraping player stats from the past 2 seasons
-    player_list = [pd.DataFrame(get_players(year)) for year in ["20182019", '20192020']]
-    # reducing into a single dataframe
-    player_df = functools.reduce(lambda left, right: 
-                                 pd.concat([left, right], axis = 0, ignore_index=True),
-                    player_list)
+    # scraping player stats from the past 2 seasons, every player season only requested once
+    player_df = pd.DataFrame(get_players_seasons(["20182019", '20192020']))
     player_df.to_csv("/Users/sawyer/Desktop/data_science_denver/Spring_2021/capstone/homework/midterm_project/data/player_season.csv", index=False)
     print("Player season statistics saved in the directory below\
 /Users/sawyer/Desktop/data_science_denver/Spring_2021/capstone/homework/midterm_project/data/player_season.csv\n")
@@ -147,11 +341,7 @@ Washington Capitals
 Winnipeg Jets""".lower().replace(" ", "-").split("\n")
 
     # getting salaries from the last 2 years for all teams
-    salary_list = [get_salary(team, year) for year in (2018, 2019) for team in current_nhl_teams]
-
-    # reducing into a single dataframe
-    salary_df = functools.reduce(lambda left, right: pd.concat([left, right], axis = 0, ignore_index=True),
-                    salary_list)
+    salary_df = get_salaries(current_nhl_teams, (2018, 2019))
 
     salary_df.sort_values(by = ['player', 'season'], ignore_index=True, inplace=True)
     salary_df.to_csv("/Users/sawyer/Desktop/data_science_denver/Spring_2021/capstone/homework/midterm_project/data/player_salary.csv", index=False)